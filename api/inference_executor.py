@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Inference Executor
+推理执行器 - 将阻塞的模型推理从asyncio事件循环中移出，交给专用线程池/进程池执行
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import resource_tracker
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_MODES = ('thread', 'process')
+
+
+def read_process_rss(pid: int) -> Optional[int]:
+    """只读取进程RSS（字节），不读smaps，适合高频指标采集"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def read_process_memory(pid: int) -> dict:
+    """读取进程内存占用（MB）：RSS为常驻内存，PSS按共享页面比例分摊，更能反映fork共享后的真实占用"""
+    info = {"pid": pid, "rss_mb": None, "pss_mb": None, "shared_mb": None}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    info["rss_mb"] = round(int(line.split()[1]) / 1024, 1)
+                    break
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            shared_kb = 0
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key == "Pss":
+                    info["pss_mb"] = round(int(rest.split()[0]) / 1024, 1)
+                elif key in ("Shared_Clean", "Shared_Dirty"):
+                    shared_kb += int(rest.split()[0])
+            info["shared_mb"] = round(shared_kb / 1024, 1)
+    except (OSError, ValueError, IndexError):
+        pass
+    return info
+
+
+def _initialize_worker(pid_queue, initializer: Optional[Callable[..., Any]], initargs: tuple):
+    """进程池工作进程启动时上报自己的PID，再执行调用方的initializer"""
+    pid_queue.put(os.getpid())
+    if initializer is not None:
+        initializer(*initargs)
+
+
+class InferenceExecutor:
+    """推理执行器
+
+    - thread: 线程池，所有工作线程共享同一份常驻模型（PyTorch/OpenCV在计算时会释放GIL）
+    - process: 进程池；start_method=spawn时每个工作进程通过initializer加载自己的模型副本，
+      start_method=fork时工作进程在主进程加载模型后fork，以写时复制方式共享只读权重
+    """
+
+    def __init__(self, mode: str = 'thread', max_workers: int = 1,
+                 initializer: Optional[Callable[..., Any]] = None, start_method: str = 'spawn',
+                 initargs: tuple = ()):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"不支持的推理执行器模式: {mode} (可选: {', '.join(EXECUTOR_MODES)})")
+        self.mode = mode
+        self.max_workers = max(1, int(max_workers))
+        self._initializer = initializer
+        self._initargs = initargs
+        self.start_method = start_method
+        self._pool: Optional[Executor] = None
+        # process模式下工作进程启动时通过队列上报PID
+        self._pid_queue = None
+        self._worker_pids: List[int] = []
+        self._pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._inflight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+
+    def start(self):
+        """创建底层线程池/进程池（只执行一次）"""
+        with self._pool_lock:
+            if self._pool is not None:
+                return
+            if self.mode == 'process':
+                # 先启动resource_tracker，fork出的工作进程与主进程共用同一个，
+                # 共享内存缓冲区在哪个进程创建、在哪个进程释放，注册与注销都能配对
+                resource_tracker.ensure_running()
+                # 默认spawn，避免在已初始化CUDA的进程上fork
+                mp_context = multiprocessing.get_context(self.start_method)
+                self._pid_queue = mp_context.SimpleQueue()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=mp_context,
+                    initializer=_initialize_worker,
+                    initargs=(self._pid_queue, self._initializer, self._initargs)
+                )
+            else:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix='inference',
+                    initializer=self._initializer,
+                    initargs=self._initargs
+                )
+            logger.info(f"⚙️ 推理执行器已启动: mode={self.mode}, workers={self.max_workers}"
+                        + (f", start_method={self.start_method}" if self.mode == 'process' else ""))
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """提交任务到推理执行器并等待结果，事件循环在此期间保持响应
+
+        process模式下 fn 必须是可pickle的模块级函数
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        with self._stats_lock:
+            self._inflight += 1
+            self._submitted += 1
+        try:
+            result = await loop.run_in_executor(self._pool, fn, *args)
+        except Exception:
+            with self._stats_lock:
+                self._failed += 1
+            raise
+        else:
+            with self._stats_lock:
+                self._completed += 1
+            return result
+        finally:
+            with self._stats_lock:
+                self._inflight -= 1
+
+    def shutdown(self, wait: bool = True):
+        """关闭推理执行器"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=wait)
+                self._pool = None
+                self._pid_queue = None
+                self._worker_pids = []
+                logger.info("🛑 推理执行器已关闭")
+
+    def get_worker_pids(self) -> List[int]:
+        """工作进程PID列表（thread模式下为当前进程）"""
+        if self.mode != 'process':
+            return [os.getpid()]
+        with self._pool_lock:
+            pid_queue = self._pid_queue
+            if pid_queue is None:
+                return []
+            while not pid_queue.empty():
+                self._worker_pids.append(pid_queue.get())
+            # 去掉已退出的工作进程
+            self._worker_pids = [pid for pid in self._worker_pids if os.path.exists(f"/proc/{pid}")]
+            return sorted(self._worker_pids)
+
+    def get_worker_memory(self) -> List[dict]:
+        """获取每个工作进程的内存占用（thread模式下为当前进程）"""
+        return [read_process_memory(pid) for pid in self.get_worker_pids()]
+
+    def get_stats(self) -> dict:
+        """获取推理执行器状态"""
+        with self._stats_lock:
+            return {
+                "mode": self.mode,
+                "start_method": self.start_method if self.mode == 'process' else None,
+                "max_workers": self.max_workers,
+                "started": self._pool is not None,
+                "inflight": self._inflight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed
+            }
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Job Queue
+有界优先级任务队列：按通道(interactive单张 / bulk批量)排队，满载时拒绝新任务(HTTP 429)
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 通道按优先级从高到低排列
+LANES = ('interactive', 'bulk')
+
+
+class QueueFullError(Exception):
+    """队列已满，retry_after 为建议的重试等待秒数"""
+
+    def __init__(self, lane: str, retry_after: float):
+        super().__init__(f"{lane} 队列已满")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class Job:
+    __slots__ = ('job_id', 'lane', 'run', 'enqueued_at')
+
+    def __init__(self, job_id: str, lane: str, run: Callable[[], Awaitable[None]]):
+        self.job_id = job_id
+        self.lane = lane
+        self.run = run
+        self.enqueued_at = time.time()
+
+
+class JobQueue:
+    """有界优先级任务队列
+
+    - interactive 通道优先于 bulk 通道出队；bulk 连续让出 starvation_limit 次后会被调度一次，避免饿死
+    - 每个通道有独立的最大排队深度，超出时 submit 抛出 QueueFullError
+    - 根据平均处理耗时(EWMA)估计排队等待时间
+    - observer(lane, wait, service) 在每个任务结束后调用，用于上报排队与处理耗时指标
+    """
+
+    def __init__(self, workers: int, max_depth: Dict[str, int], starvation_limit: int = 4,
+                 default_service_time: float = 10.0,
+                 observer: Optional[Callable[[str, float, float], None]] = None):
+        self.workers = max(1, int(workers))
+        self.max_depth = dict(max_depth)
+        self.starvation_limit = starvation_limit
+        self._lanes: Dict[str, Deque[Job]] = {lane: deque() for lane in LANES}
+        self._running: Dict[str, Job] = {}
+        # 信号量计数 = 排队中的任务数，每次 acquire 对应一个可出队的任务
+        self._available = asyncio.Semaphore(0)
+        self._worker_tasks: List[asyncio.Task] = []
+        self._bulk_skipped = 0
+        # 单个任务处理耗时的指数滑动平均（秒）
+        self._service_time = default_service_time
+        self._alpha = 0.2
+        self._rejected = {lane: 0 for lane in LANES}
+        self._completed = 0
+        self._observer = observer
+
+    def start(self):
+        """在事件循环中启动消费协程"""
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"📥 任务队列已启动: workers={self.workers}, max_depth={self.max_depth}")
+
+    async def stop(self):
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def check_capacity(self, lane: str, count: int = 1):
+        """检查通道是否还能容纳 count 个任务，不能则抛出 QueueFullError"""
+        if len(self._lanes[lane]) + count > self.max_depth[lane]:
+            self._rejected[lane] += 1
+            raise QueueFullError(lane, self.estimate_wait(lane))
+
+    def submit(self, job_id: str, lane: str, run: Callable[[], Awaitable[None]], force: bool = False) -> float:
+        """提交任务，返回预计等待秒数；force=True 时跳过容量检查（用于重启恢复）"""
+        if lane not in self._lanes:
+            raise ValueError(f"未知的队列通道: {lane}")
+        if not force:
+            self.check_capacity(lane)
+        self._lanes[lane].append(Job(job_id, lane, run))
+        self._available.release()
+        return self.estimate_wait(lane, job_id)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """任务前方的排队任务数（含更高优先级通道），不在队列中返回None"""
+        ahead = 0
+        for lane in LANES:
+            for idx, job in enumerate(self._lanes[lane]):
+                if job.job_id == job_id:
+                    return ahead + idx
+            ahead += len(self._lanes[lane])
+        return None
+
+    def estimate_wait(self, lane: str, job_id: Optional[str] = None) -> float:
+        """估计等待时间：前方任务数 / 并发数 × 平均处理耗时"""
+        ahead = self.position(job_id) if job_id is not None else None
+        if ahead is None:
+            # 新任务排在本通道末尾，前方为所有更高优先级及同通道的任务
+            ahead = 0
+            for name in LANES:
+                ahead += len(self._lanes[name])
+                if name == lane:
+                    break
+        busy = len(self._running) / self.workers
+        return round((ahead / self.workers + busy) * self._service_time, 1)
+
+    def depth(self, lane: str) -> int:
+        return len(self._lanes[lane])
+
+    def retry_after(self, lane: str) -> int:
+        return max(1, math.ceil(self.estimate_wait(lane)))
+
+    def _pop_next(self) -> Optional[Job]:
+        interactive, bulk = self._lanes['interactive'], self._lanes['bulk']
+        if bulk and (not interactive or self._bulk_skipped >= self.starvation_limit):
+            self._bulk_skipped = 0
+            return bulk.popleft()
+        if interactive:
+            if bulk:
+                self._bulk_skipped += 1
+            return interactive.popleft()
+        return None
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            job = self._pop_next()
+            self._running[job.job_id] = job
+            started = time.time()
+            wait = started - job.enqueued_at
+            try:
+                await job.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ 队列任务执行失败 {job.job_id}: {e}")
+            finally:
+                self._running.pop(job.job_id, None)
+                service = time.time() - started
+                self._service_time += self._alpha * (service - self._service_time)
+                self._completed += 1
+                if self._observer is not None:
+                    self._observer(job.lane, wait, service)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "depth": {lane: len(jobs) for lane, jobs in self._lanes.items()},
+            "max_depth": self.max_depth,
+            "rejected": dict(self._rejected),
+            "completed": self._completed,
+            "avg_service_time": round(self._service_time, 2)
+        }
@@ -11,17 +11,15 @@ import asyncio
 import tempfile
 import shutil
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Union
+from functools import partial
 import time
-import zipfile
-import io
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks, Query
-from fastapi.responses import FileResponse, JSONResponse, Response
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from pydantic import BaseModel
-import aiofiles
 
 # Add project root to path
 PROJECT_ROOT = Path(__file__).parent.parent
@@ -33,6 +31,36 @@ from config.settings import APISettings
 # Import model manager
 from model_manager import model_manager
 
+# Import task store
+from task_store import ACTIVE_STATUSES, create_task_store
+
+# Import job queue
+from job_queue import JobQueue, QueueFullError
+
+# Import result cache
+from result_cache import ResultCache, link_or_copy
+
+# Import streaming upload reader
+from upload_reader import UploadTooLargeError, UploadedImage, persist_upload, receive_upload
+
+# Import output encoder and in-memory result store
+from output_encoder import OUTPUT_FORMATS, EncodedImage, EncoderStats, compute_etag
+from result_store import ResultStore, bytes_response
+
+# Import streaming ZIP writer
+from zip_stream import ZipStreamWriter
+
+# Import task event push channel
+from task_events import HEARTBEAT_INTERVAL, TaskEventBus, format_sse
+
+# Import pipeline stage progress
+from progress import STAGE_MESSAGES, overall_progress
+
+# Import Prometheus metrics
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from metrics import FACE_COUNT_BUCKETS, STAGE_BUCKETS, MetricsMiddleware, MetricsRegistry
+from inference_executor import read_process_rss
+
 # Initialize FastAPI app
 app = FastAPI(
     title="PhotoEnhanceAI API",
@@ -53,6 +81,23 @@ async def startup_event():
     except Exception as e:
         print(f"⚠️ 模型预热失败: {e}")
         print("💡 模型将在首次请求时自动加载")
+    
+    # 状态推送在事件循环中投递
+    event_bus.bind(asyncio.get_running_loop())
+    
+    # 启动任务队列，恢复重启前未完成的任务，并启动过期任务清理
+    job_queue.start()
+    recover_pending_tasks()
+    asyncio.create_task(cleanup_expired_tasks_loop())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """应用关闭时释放推理执行器"""
+    await job_queue.stop()
+    model_manager.shutdown()
+    await persist_before_shutdown()
+    task_store.close()
+    batch_task_store.close()
 
 # CORS middleware for web frontend
 app.add_middleware(
@@ -66,9 +111,231 @@ app.add_middleware(
 # Global settings
 settings = APISettings()
 
-# In-memory task storage (use Redis in production)
-tasks_storage: Dict[str, Dict[str, Any]] = {}
-batch_tasks_storage: Dict[str, Dict[str, Any]] = {}
+# In-process Prometheus metrics: event metrics are updated in O(1), gauges are read at scrape time
+metrics = MetricsRegistry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+tasks_total = metrics.counter('tasks_total', 'Inference tasks finished by lane and status', ('lane', 'status'))
+task_duration = metrics.histogram(
+    'task_processing_seconds', 'Inference time per image including decode and encode', ('lane',))
+stage_duration = metrics.histogram(
+    'stage_duration_seconds', 'Time spent in each pipeline stage', ('stage',), buckets=STAGE_BUCKETS)
+faces_per_image = metrics.histogram('faces_per_image', 'Faces detected per image', buckets=FACE_COUNT_BUCKETS)
+output_bytes_total = metrics.counter('output_bytes_total', 'Encoded result bytes produced', ('format',))
+processing_paths_total = metrics.counter(
+    'processing_paths_total', 'Images by processing path (full/portrait/face/aligned)', ('path',))
+queue_wait = metrics.histogram('queue_wait_seconds', 'Time jobs spend queued before a worker picks them up', ('lane',))
+queue_service = metrics.histogram(
+    'queue_service_seconds', 'Time a queue worker spends on a job, failed jobs included', ('lane',))
+
+# Persistent task storage (SQLite WAL by default, survives restarts)
+task_store = create_task_store(settings.TASK_STORE_BACKEND, settings.TASK_STORE_PATH, 'tasks')
+batch_task_store = create_task_store(
+    settings.TASK_STORE_BACKEND, settings.TASK_STORE_PATH, 'batch_tasks', id_field='batch_task_id'
+)
+
+# Content-addressed result cache (image hash + parameters + model version)
+result_cache = ResultCache(
+    settings.RESULT_CACHE_DIR, settings.RESULT_CACHE_MAX_MB * 1024 * 1024
+) if settings.RESULT_CACHE_ENABLED else None
+
+# Encoded results of recently finished tasks, served straight from memory
+result_store = ResultStore(settings.RESULT_MEMORY_MAX_MB * 1024 * 1024)
+encoder_stats = EncoderStats()
+
+# Unfinished tasks whose upload is only in memory: task_id -> (upload, file to persist it to)
+unpersisted_uploads: Dict[str, Tuple[UploadedImage, Path]] = {}
+
+# Push channel: every task/batch store write is published to its subscribers
+event_bus = TaskEventBus()
+
+# Task terminal states (no more events after these)
+TASK_FINAL_STATUSES = ('completed', 'failed')
+BATCH_FINAL_STATUSES = ('completed', 'partial_completed', 'failed')
+
+def task_event(task: Dict[str, Any]) -> Dict[str, Any]:
+    """推送给客户端的任务状态（不包含内部路径等字段）"""
+    return {
+        'task_id': task['task_id'],
+        'batch_task_id': task.get('batch_task_id'),
+        'filename': task.get('original_filename'),
+        'status': task['status'],
+        'message': task.get('message'),
+        'progress': task.get('progress'),
+        'stage': task.get('stage'),
+        'timings': task.get('timings'),
+        'processing_path': task.get('processing_path'),
+        'output_scale': task.get('output_scale'),
+        'output_size': task.get('output_size'),
+        'result_url': task.get('result_url'),
+        'error': task.get('error'),
+        'updated_at': task.get('updated_at'),
+        'processing_time': task.get('processing_time')
+    }
+
+def batch_event(batch: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'batch_task_id': batch['batch_task_id'],
+        'status': batch['status'],
+        'message': batch.get('message'),
+        'progress': batch.get('progress'),
+        'total_files': batch.get('total_files'),
+        'completed_files': batch.get('completed_files'),
+        'failed_files': batch.get('failed_files'),
+        'updated_at': batch.get('updated_at')
+    }
+
+def publish_task(task: Dict[str, Any]):
+    if task['status'] != 'processing':
+        live_progress.pop(task['task_id'], None)
+    event = task_event(task)
+    event_bus.publish(task['task_id'], 'task', event)
+    if task.get('batch_task_id'):
+        event_bus.publish(task['batch_task_id'], 'task', event)
+
+def publish_batch(batch: Dict[str, Any]):
+    event_bus.publish(batch['batch_task_id'], 'batch', batch_event(batch))
+
+task_store.add_listener(publish_task)
+batch_task_store.add_listener(publish_batch)
+
+# 阶段内进度推送的最小间隔（秒）；阶段切换总是立即推送
+PROGRESS_UPDATE_INTERVAL = 0.25
+# 排队与推理之间预留的进度区间：推理进度映射到 [0.05, 0.95]
+PROGRESS_START, PROGRESS_SPAN = 0.05, 0.9
+
+# 处理中任务的阶段内进度(stage/progress/message)：只保存在内存中并推送给订阅者，不写入任务存储
+live_progress: Dict[str, Dict[str, Any]] = {}
+
+def with_live_progress(task_data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """任务存储中的状态叠加内存中的最新进度"""
+    if task_data is not None and task_data['status'] == 'processing':
+        task_data.update(live_progress.get(task_data['task_id'], {}))
+    return task_data
+
+def stage_progress_listener(task_id: str):
+    """推理流水线的阶段进度 → 任务状态(stage/progress/message)
+
+    阶段切换写入任务存储；同一阶段内的进度（如背景分块）按间隔节流，只更新内存并推送事件
+    """
+    last = {'stage': None, 'time': 0.0, 'task': None}
+    
+    def on_progress(stage: str, fraction: float):
+        now = time.time()
+        if stage == last['stage'] and fraction < 1.0 and now - last['time'] < PROGRESS_UPDATE_INTERVAL:
+            return
+        message = STAGE_MESSAGES.get(stage, stage)
+        if stage == 'background' and 0.0 < fraction < 1.0:
+            message += f" {fraction * 100:.0f}%"
+        fields = {
+            'stage': stage,
+            'progress': round(PROGRESS_START + PROGRESS_SPAN * overall_progress(stage, fraction), 4),
+            'message': message,
+            'updated_at': now
+        }
+        if stage != last['stage']:
+            task_store.update(task_id, fields)
+            last['task'] = task_store.get(task_id)
+        elif last['task'] is not None:
+            live_progress[task_id] = fields
+            publish_task({**last['task'], **fields})
+        last['stage'], last['time'] = stage, now
+    
+    return on_progress
+
+def format_timings(timings: Dict[str, float]) -> Dict[str, float]:
+    """各阶段耗时（毫秒）"""
+    return {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()}
+
+def observe_job(lane: str, wait: float, service: float):
+    queue_wait.observe(wait, lane=lane)
+    queue_service.observe(service, lane=lane)
+
+def record_task_metrics(lane: str, result, processing_time: float, output_format: str):
+    """记录一次成功推理的指标"""
+    tasks_total.inc(lane=lane, status='completed')
+    task_duration.observe(processing_time, lane=lane)
+    for stage, seconds in result.timings.items():
+        stage_duration.observe(seconds, stage=stage)
+    faces_per_image.observe(result.num_faces)
+    processing_paths_total.inc(path=result.path)
+    output_bytes_total.inc(len(result.encoded), format=output_format)
+
+# Bounded priority job queue in front of the model manager
+# interactive: single-image requests, bulk: batch sub-tasks
+# one running job per executor worker (FACE_BATCH_CONCURRENCY images on the thread executor when set)
+job_queue = JobQueue(
+    workers=min(settings.MAX_CONCURRENT_TASKS, model_manager.executor.max_workers),
+    max_depth={
+        'interactive': settings.QUEUE_INTERACTIVE_MAX_DEPTH,
+        'bulk': settings.QUEUE_BULK_MAX_DEPTH
+    },
+    observer=observe_job
+)
+
+@metrics.collector
+def collect_queue_metrics():
+    stats = job_queue.get_stats()
+    yield ('queue_depth', 'gauge', 'Jobs waiting in each queue lane',
+           [({'lane': lane}, depth) for lane, depth in stats['depth'].items()])
+    yield ('queue_running', 'gauge', 'Jobs currently being processed', [({}, stats['running'])])
+    yield ('queue_rejected_total', 'counter', 'Submissions rejected with 429',
+           [({'lane': lane}, count) for lane, count in stats['rejected'].items()])
+    yield ('queue_avg_service_seconds', 'gauge', 'EWMA of job service time used for wait estimates',
+           [({}, stats['avg_service_time'])])
+    yield ('tasks', 'gauge', 'Stored tasks by status (counters kept up to date on write)',
+           [({'status': status}, count) for status, count in task_store.count_by_status().items()])
+    executor = model_manager.executor.get_stats()
+    yield ('inference_inflight', 'gauge', 'Inferences running in the executor', [({}, executor['inflight'])])
+    yield ('inference_jobs_total', 'counter', 'Executor jobs by outcome', [
+        ({'outcome': 'submitted'}, executor['submitted']),
+        ({'outcome': 'completed'}, executor['completed']),
+        ({'outcome': 'failed'}, executor['failed'])
+    ])
+
+@metrics.collector
+def collect_cache_metrics():
+    if result_cache is not None:
+        stats = result_cache.get_stats()
+        yield ('result_cache_lookups_total', 'counter', 'Result cache lookups by outcome', [
+            ({'result': 'hit'}, stats['hits']),
+            ({'result': 'miss'}, stats['misses']),
+            ({'result': 'dedup'}, stats['dedup_hits'])
+        ])
+        yield ('result_cache_entries', 'gauge', 'Results in the disk cache', [({}, stats['entries'])])
+        yield ('result_cache_bytes', 'gauge', 'Size of the disk result cache', [({}, result_cache.total_bytes)])
+        yield ('result_cache_evictions_total', 'counter', 'Results evicted from the disk cache',
+               [({}, stats['evictions'])])
+    stats = result_store.get_stats()
+    yield ('result_store_lookups_total', 'counter', 'In-memory result store lookups by outcome', [
+        ({'result': 'hit'}, stats['hits']),
+        ({'result': 'miss'}, stats['misses'])
+    ])
+    yield ('result_store_bytes', 'gauge', 'Encoded results kept in memory', [({}, result_store.total_bytes)])
+    # Only counted in this process on the thread executor (workers keep their own caches)
+    landmark_stats = model_manager.get_landmark_cache_stats()
+    if landmark_stats is not None:
+        yield ('landmark_cache_lookups_total', 'counter', 'Face landmark cache lookups by outcome', [
+            ({'result': 'hit'}, landmark_stats['hits']),
+            ({'result': 'miss'}, landmark_stats['misses'])
+        ])
+
+@metrics.collector
+def collect_process_metrics():
+    samples = [({'process': 'main', 'pid': str(os.getpid())}, read_process_rss(os.getpid()))]
+    if model_manager.executor.mode == 'process':
+        samples += [
+            ({'process': 'worker', 'pid': str(pid)}, read_process_rss(pid))
+            for pid in model_manager.executor.get_worker_pids()
+        ]
+    yield ('process_resident_memory_bytes', 'gauge', 'Resident memory of the API and inference worker processes',
+           [(labels, rss) for labels, rss in samples if rss is not None])
+    gpu_memory = model_manager.get_gpu_memory()
+    if gpu_memory:
+        yield ('gpu_memory_allocated_bytes', 'gauge', 'GPU memory allocated by tensors in this process',
+               [({'device': str(device)}, allocated) for device, allocated, _ in gpu_memory])
+        yield ('gpu_memory_reserved_bytes', 'gauge', 'GPU memory reserved by the caching allocator in this process',
+               [({'device': str(device)}, reserved) for device, _, reserved in gpu_memory])
+    yield ('sse_subscribers', 'gauge', 'Open task event streams', [({}, event_bus.get_stats()['subscribers'])])
 
 class TaskResponse(BaseModel):
     """Task response model"""
@@ -76,6 +343,7 @@ class TaskResponse(BaseModel):
     status: str
     message: str
     created_at: float
+    estimated_wait: Optional[float] = None  # 预计排队等待秒数
     
 class TaskStatus(BaseModel):
     """Task status model"""
@@ -83,11 +351,18 @@ class TaskStatus(BaseModel):
     status: str
     message: str
     progress: Optional[float] = None
+    stage: Optional[str] = None  # 当前流水线阶段: decode/detect/align/restore/background/paste/encode/write
+    timings: Optional[Dict[str, float]] = None  # 各阶段耗时（毫秒）
+    processing_path: Optional[str] = None  # 实际处理路径: full/portrait/face/aligned
+    output_scale: Optional[int] = None  # 实际放大倍数（受输出像素预算限制）
+    output_size: Optional[List[int]] = None  # 输出 [宽, 高]
     result_url: Optional[str] = None
     error: Optional[str] = None
     created_at: float
     updated_at: float
     processing_time: Optional[float] = None
+    queue_position: Optional[int] = None
+    estimated_wait: Optional[float] = None
 
 class EnhanceRequest(BaseModel):
     """Enhancement request parameters"""
@@ -102,6 +377,7 @@ class BatchTaskResponse(BaseModel):
     message: str
     created_at: float
     sub_tasks: List[str]  # 子任务ID列表
+    estimated_wait: Optional[float] = None  # 整批预计完成等待秒数
 
 class BatchTaskStatus(BaseModel):
     """批量任务状态模型"""
@@ -141,120 +417,375 @@ def validate_image_file(file: UploadFile) -> None:
                 detail=f"Unsupported file format. Supported: {', '.join(settings.SUPPORTED_FORMATS)}"
             )
 
-async def process_image_task(task_id: str, input_path: str, output_path: str, tile_size: int):
-    """Background task for image processing using resident model"""
+def validate_noise_mode(noise_mode: Optional[str]):
+    """Reject noise modes the loaded face restoration network cannot run"""
+    noise_mode = noise_mode or settings.NOISE_MODE
+    if not model_manager.supports_noise_mode(noise_mode):
+        raise HTTPException(
+            status_code=400,
+            detail=f"noise_mode={noise_mode} requires FACE_OPTIMIZED_ARCH=true on the torch backend"
+        )
+
+def enhance_options(task_data: Dict[str, Any]) -> Dict[str, Any]:
+    """任务中保存的处理参数 → model_manager.enhance_image 的参数"""
+    return {
+        'tile_size': task_data['tile_size'],
+        'output_format': task_data.get('output_format', 'jpeg'),
+        'output_quality': task_data.get('output_quality', settings.OUTPUT_QUALITY),
+        'quality_level': task_data.get('quality_level', 'high'),
+        'face_mode': task_data.get('face_mode', 'full'),
+        'only_center_face': task_data.get('only_center_face', False),
+        'has_aligned': task_data.get('has_aligned', False),
+        'scale': task_data.get('scale'),
+        'max_output_pixels': task_data.get('max_output_pixels'),
+        'noise_mode': task_data.get('noise_mode', settings.NOISE_MODE)
+    }
+
+def needs_result_file(task_data: Dict[str, Any]) -> bool:
+    """结果缓存需要结果文件；其余结果只保存在内存中，被内存结果存储淘汰（或服务关闭）时才写入磁盘"""
+    return bool(task_data.get('cache_key') and result_cache is not None)
+
+async def track_upload(task_id: str, task_data: Dict[str, Any], upload: UploadedImage, path: Path):
+    """记录只保存在内存中的上传；持久化任务存储下，重启恢复需要的输入文件延迟到服务关闭时写入"""
+    if not upload.in_memory:
+        return
+    if task_store.persistent and settings.UPLOAD_PERSIST_QUEUED:
+        await persist_upload(upload, path)
+        task_data['input_path'] = str(upload.path)
+        return
+    unpersisted_uploads[task_id] = (upload, path)
+
+async def persist_before_shutdown():
+    """服务关闭时写入重启后仍需要的数据：未完成任务的内存上传，以及只保存在内存中的结果"""
+    if not task_store.persistent:
+        return
+    persisted = 0
+    for task_id, (upload, path) in list(unpersisted_uploads.items()):
+        if task_store.get(task_id) is None:
+            continue
+        try:
+            await persist_upload(upload, path)
+            task_store.update(task_id, {'input_path': str(upload.path)})
+            persisted += 1
+        except OSError as e:
+            print(f"⚠️ 输入文件写入失败: {path}: {e}")
+    unpersisted_uploads.clear()
+    written = 0
+    for task_id, path, data in result_store.unwritten():
+        try:
+            await asyncio.to_thread(Path(path).write_bytes, data)
+            result_store.spilled(task_id)
+            written += 1
+        except OSError as e:
+            print(f"⚠️ 结果文件写入失败: {path}: {e}")
+    if persisted or written:
+        print(f"💾 已为重启保存 {persisted} 个排队任务的输入和 {written} 个内存中的结果")
+
+async def keep_result(task_id: str, encoded: EncodedImage, output_path: str, written: bool):
+    """把编码结果放入内存结果存储；未写入磁盘的结果被淘汰时写入各自的结果文件"""
+    for evicted_id, path, data in result_store.put(task_id, encoded, None if written else output_path):
+        try:
+            await asyncio.to_thread(Path(path).write_bytes, data)
+        except OSError as e:
+            # 任务已被删除（临时目录不存在）
+            print(f"⚠️ 结果文件写入失败: {path}: {e}")
+        finally:
+            result_store.spilled(evicted_id)
+
+async def publish_cached_result(cache_key: str, output_path: str, inflight: bool = True):
+    """把结果文件加入结果缓存（在线程中执行文件操作）；缓存写入失败只记录日志，不影响任务结果
+
+    inflight=True 时同时通知等待相同结果的请求；缓存写入失败时它们直接共享本任务的结果文件
+    """
+    try:
+        result_path = await asyncio.to_thread(result_cache.put, cache_key, Path(output_path))
+    except OSError as e:
+        print(f"⚠️ 结果缓存写入失败: {cache_key}: {e}")
+        result_path = Path(output_path)
+    if inflight:
+        result_cache.finish(cache_key, result_path)
+
+async def process_image_task(task_id: str, input_source: Union[str, bytearray]):
+    """Background task for image processing using resident model
+
+    input_source is the spilled input file path, or the uploaded bytes kept in memory;
+    the processing parameters are read from the stored task
+    """
+    task_data = task_store.get(task_id)
+    if task_data is None:  # deleted while queued
+        return
+    output_path = task_data['output_path']
+    options = enhance_options(task_data)
     try:
         # Update task status
-        tasks_storage[task_id].update({
+        task_store.update(task_id, {
             'status': 'processing',
             'message': '使用常驻模型处理中...',
             'updated_at': time.time(),
-            'progress': 0.1
-        })
-        
-        # Update progress
-        tasks_storage[task_id].update({
-            'progress': 0.3,
-            'message': 'GFPGAN常驻模型处理中 (人脸修复 + 超分辨率)...',
-            'updated_at': time.time()
+            'progress': PROGRESS_START
         })
         
-        # Execute processing using resident model
+        # Execute processing using resident model (runs in the inference executor)
+        # Stage progress is pushed back from the worker while it runs
         start_time = time.time()
-        await model_manager.enhance_image(input_path, output_path, tile_size)
+        write_file = needs_result_file(task_data)
+        result = await model_manager.enhance_image(
+            input_source, output_path if write_file else None, **options, image_key=task_data.get('image_digest'),
+            task_id=task_id, on_progress=stage_progress_listener(task_id)
+        )
         processing_time = time.time() - start_time
+        encoded, timings = result.encoded, result.timings
+        encoder_stats.record_encode(encoded)
+        record_task_metrics('interactive', result, processing_time, options['output_format'])
+        await keep_result(task_id, encoded, output_path, write_file)
+        
+        # Publish to the result cache and to identical in-flight requests
+        cache_key = task_data.get('cache_key')
+        if cache_key and result_cache is not None:
+            await publish_cached_result(cache_key, output_path)
         
         # Success
-        tasks_storage[task_id].update({
+        task_store.update(task_id, {
             'status': 'completed',
-            'message': 'GFPGAN图像增强完成 (人脸修复 + 4倍超分辨率)',
+            'message': (f'GFPGAN图像增强完成 (人脸修复 + {result.scale}倍超分辨率)' if result.scale
+                        else 'GFPGAN人脸修复完成'),
             'progress': 1.0,
             'result_url': f"/api/v1/download/{task_id}",
             'updated_at': time.time(),
-            'processing_time': processing_time
+            'processing_time': processing_time,
+            'stage': None,
+            'timings': format_timings(timings),
+            'processing_path': result.path,
+            'output_scale': result.scale,
+            'output_size': result.output_size,
+            'etag': encoded.etag,
+            'output_bytes': len(encoded),
+            'encode_time': encoded.encode_time
         })
+        unpersisted_uploads.pop(task_id, None)
             
     except Exception as e:
         # Unexpected error
-        tasks_storage[task_id].update({
+        task_store.update(task_id, {
             'status': 'failed',
             'message': 'GFPGAN处理异常',
             'error': str(e),
             'updated_at': time.time()
         })
+        unpersisted_uploads.pop(task_id, None)
+        tasks_total.inc(lane='interactive', status='failed')
+        cache_key = (task_store.get(task_id) or {}).get('cache_key')
+        if cache_key and result_cache is not None:
+            result_cache.finish(cache_key, error=str(e))
 
-async def process_batch_task(batch_task_id: str, sub_task_ids: List[str], tile_size: int):
-    """批量处理任务"""
+async def follow_inflight_result(task_id: str, output_path: str, future: asyncio.Future):
+    """相同图片和参数的请求正在处理中，等待并共享其结果，不重复推理"""
     try:
-        batch_data = batch_tasks_storage[batch_task_id]
-        batch_data.update({
+        result_path = await asyncio.shield(future)
+        await asyncio.to_thread(link_or_copy, result_path, Path(output_path))
+        task_store.update(task_id, {
+            'status': 'completed',
+            'message': 'GFPGAN图像增强完成 (与相同请求共享结果)',
+            'progress': 1.0,
+            'result_url': f"/api/v1/download/{task_id}",
+            'cache_hit': True,
+            'updated_at': time.time(),
+            'processing_time': 0.0
+        })
+    except Exception as e:
+        task_store.update(task_id, {
+            'status': 'failed',
+            'message': 'GFPGAN处理异常',
+            'error': str(e),
+            'updated_at': time.time()
+        })
+
+async def process_batch_subtask(batch_task_id: str, task_id: str, input_data: Optional[bytearray] = None):
+    """处理批量任务中的单张图片（bulk队列通道），input_data 为保留在内存中的上传字节"""
+    batch_data = batch_task_store.get(batch_task_id)
+    if batch_data is not None and batch_data['status'] == 'queued':
+        batch_task_store.update(batch_task_id, {
             'status': 'processing',
             'message': '开始批量处理',
             'updated_at': time.time()
         })
+    
+    task_data = task_store.get(task_id)
+    try:
+        # 更新子任务状态
+        task_store.update(task_id, {
+            'status': 'processing',
+            'message': '使用常驻模型处理中...',
+            'progress': PROGRESS_START,
+            'updated_at': time.time()
+        })
         
-        # 并发处理子任务（控制并发数）
-        semaphore = asyncio.Semaphore(3)  # 最多3个并发
-        
-        async def process_single_task(task_id: str):
-            async with semaphore:
-                task_data = tasks_storage[task_id]
-                try:
-                    # 更新子任务状态
-                    tasks_storage[task_id].update({
-                        'status': 'processing',
-                        'message': '使用常驻模型处理中...',
-                        'progress': 0.1,
-                        'updated_at': time.time()
-                    })
-                    
-                    # 使用常驻模型处理
-                    await model_manager.enhance_image(
-                        task_data['input_path'],
-                        task_data['output_path'],
-                        task_data['tile_size']
-                    )
-                    
-                    # 更新子任务状态
-                    tasks_storage[task_id].update({
-                        'status': 'completed',
-                        'message': '处理完成',
-                        'progress': 1.0,
-                        'updated_at': time.time()
-                    })
-                    
-                    return True
-                except Exception as e:
-                    tasks_storage[task_id].update({
-                        'status': 'failed',
-                        'message': '处理失败',
-                        'error': str(e),
-                        'updated_at': time.time()
-                    })
-                    return False
-        
-        # 并发处理所有子任务
-        results = await asyncio.gather(*[process_single_task(task_id) for task_id in sub_task_ids])
+        # 使用常驻模型处理
+        start_time = time.time()
+        options = enhance_options(task_data)
+        write_file = needs_result_file(task_data)
+        result = await model_manager.enhance_image(
+            input_data if input_data is not None else task_data['input_path'],
+            task_data['output_path'] if write_file else None,
+            **options,
+            image_key=task_data.get('image_digest'),
+            task_id=task_id,
+            on_progress=stage_progress_listener(task_id)
+        )
+        processing_time = time.time() - start_time
+        encoded, timings = result.encoded, result.timings
+        encoder_stats.record_encode(encoded)
+        record_task_metrics('bulk', result, processing_time, options['output_format'])
+        await keep_result(task_id, encoded, task_data['output_path'], write_file)
         
-        # 更新批量任务状态
-        completed_count = sum(results)
-        failed_count = len(results) - completed_count
+        if task_data.get('cache_key') and result_cache is not None:
+            await publish_cached_result(task_data['cache_key'], task_data['output_path'], inflight=False)
         
-        batch_tasks_storage[batch_task_id].update({
-            'status': 'completed' if failed_count == 0 else 'partial_completed',
-            'completed_files': completed_count,
-            'failed_files': failed_count,
+        # 更新子任务状态
+        task_store.update(task_id, {
+            'status': 'completed',
+            'message': '处理完成',
             'progress': 1.0,
-            'message': f'批量处理完成：成功{completed_count}张，失败{failed_count}张',
-            'updated_at': time.time()
+            'updated_at': time.time(),
+            'processing_time': processing_time,
+            'stage': None,
+            'timings': format_timings(timings),
+            'processing_path': result.path,
+            'output_scale': result.scale,
+            'output_size': result.output_size,
+            'etag': encoded.etag,
+            'output_bytes': len(encoded),
+            'encode_time': encoded.encode_time
         })
-        
+        unpersisted_uploads.pop(task_id, None)
     except Exception as e:
-        batch_tasks_storage[batch_task_id].update({
+        task_store.update(task_id, {
             'status': 'failed',
-            'message': f'批量处理失败: {str(e)}',
+            'message': '处理失败',
+            'error': str(e),
+            'updated_at': time.time()
+        })
+        unpersisted_uploads.pop(task_id, None)
+        tasks_total.inc(lane='bulk', status='failed')
+    finally:
+        update_batch_progress(batch_task_id)
+
+def update_batch_progress(batch_task_id: str):
+    """根据子任务状态更新批量任务进度，全部结束时标记批量任务完成"""
+    batch_data = batch_task_store.get(batch_task_id)
+    if batch_data is None:
+        return
+    statuses = [(task_store.get(task_id) or {}).get('status') for task_id in batch_data['sub_tasks']]
+    completed_count = statuses.count('completed')
+    finished_count = len([status for status in statuses if status not in ACTIVE_STATUSES])
+    failed_count = finished_count - completed_count
+    
+    if finished_count < len(statuses):
+        batch_task_store.update(batch_task_id, {
+            'completed_files': completed_count,
+            'failed_files': failed_count,
+            'progress': finished_count / len(statuses),
             'updated_at': time.time()
         })
+        return
+    
+    batch_task_store.update(batch_task_id, {
+        'status': 'completed' if failed_count == 0 else 'partial_completed',
+        'completed_files': completed_count,
+        'failed_files': failed_count,
+        'progress': 1.0,
+        'message': f'批量处理完成：成功{completed_count}张，失败{failed_count}张',
+        'updated_at': time.time()
+    })
+
+def raise_upload_too_large(error: UploadTooLargeError):
+    """流式接收过程中超过大小限制时返回 413"""
+    raise HTTPException(
+        status_code=413,
+        detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE_MB}MB"
+    )
+
+def raise_queue_full(error: QueueFullError):
+    """队列已满时返回 429，并通过 Retry-After 告知客户端重试时间"""
+    raise HTTPException(
+        status_code=429,
+        detail=f"服务繁忙，队列已满，请在约{error.retry_after:.0f}秒后重试",
+        headers={'Retry-After': str(job_queue.retry_after(error.lane))}
+    )
+
+def input_available(task_data: Dict[str, Any]) -> bool:
+    """输入文件仍在磁盘上时才能在重启后恢复（正常关闭时未完成任务的内存上传会落盘）"""
+    return bool(task_data.get('input_path')) and Path(task_data['input_path']).exists()
+
+def mark_input_lost(task_id: str, now: float):
+    task_store.update(task_id, {
+        'status': 'failed',
+        'message': '服务重启后输入文件已丢失',
+        'error': 'input file missing after restart',
+        'updated_at': now
+    })
+
+def recover_pending_tasks():
+    """重新排队服务重启（或崩溃）前处于 queued/processing 状态的任务"""
+    now = time.time()
+    requeued = 0
+    
+    # 批量任务：只重新处理未完成的子任务
+    for batch_data in batch_task_store.find_by_status(ACTIVE_STATUSES):
+        pending = [
+            task_data for task_data in (task_store.get(task_id) for task_id in batch_data['sub_tasks'])
+            if task_data is not None and task_data['status'] in ACTIVE_STATUSES
+        ]
+        batch_task_store.update(batch_data['batch_task_id'], {'status': 'queued', 'updated_at': now})
+        for task_data in pending:
+            if not input_available(task_data):
+                mark_input_lost(task_data['task_id'], now)
+                continue
+            task_store.update(task_data['task_id'], {'status': 'queued', 'message': '服务重启后重新排队', 'updated_at': now})
+            job_queue.submit(task_data['task_id'], 'bulk',
+                             partial(process_batch_subtask, batch_data['batch_task_id'], task_data['task_id']),
+                             force=True)
+        update_batch_progress(batch_data['batch_task_id'])
+        requeued += 1
+    
+    # 单张任务
+    for task_data in task_store.find_by_status(ACTIVE_STATUSES):
+        if task_data.get('batch_task_id'):
+            continue
+        if not input_available(task_data):
+            mark_input_lost(task_data['task_id'], now)
+            continue
+        task_store.update(task_data['task_id'], {'status': 'queued', 'message': '服务重启后重新排队', 'updated_at': now})
+        job_queue.submit(task_data['task_id'], 'interactive', partial(
+            process_image_task, task_data['task_id'], task_data['input_path']
+        ), force=True)
+        requeued += 1
+    
+    if requeued:
+        print(f"♻️ 已重新排队 {requeued} 个重启前未完成的任务")
+
+def cleanup_expired_tasks() -> int:
+    """删除超过 TASK_CLEANUP_HOURS 的已结束任务及其临时目录"""
+    ttl_seconds = settings.TASK_CLEANUP_HOURS * 3600
+    expired = task_store.expire(ttl_seconds) + batch_task_store.expire(ttl_seconds)
+    for task_data in expired:
+        if 'task_id' in task_data:
+            result_store.pop(task_data['task_id'])
+        temp_dir = task_data.get('temp_dir')
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+    return len(expired)
+
+async def cleanup_expired_tasks_loop():
+    """定期清理过期任务"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(cleanup_expired_tasks)
+            if removed:
+                print(f"🧹 已清理 {removed} 个过期任务")
+        except Exception as e:
+            print(f"⚠️ 过期任务清理失败: {e}")
+        await asyncio.sleep(settings.TASK_CLEANUP_INTERVAL_SECONDS)
 
 @app.get("/")
 async def root():
@@ -273,6 +804,7 @@ async def root():
         "endpoints": {
             "docs": "/docs",
             "health": "/health", 
+            "metrics": "/metrics",
             "enhance": "/api/v1/enhance",
             "enhance_batch": "/api/v1/enhance/batch",
             "status": "/api/v1/status/{task_id}",
@@ -289,27 +821,95 @@ async def health_check():
     return {
         "status": "healthy",
         "timestamp": time.time(),
-        "active_tasks": len([t for t in tasks_storage.values() if t['status'] == 'processing']),
+        "active_tasks": task_store.count_by_status().get('processing', 0),
         "model_status": {
             "initialized": model_info["initialized"],
             "cuda_available": model_info["cuda_available"],
             "device": model_info["device"]
-        }
+        },
+        "executor": model_info["executor"],
+        "queue": job_queue.get_stats(),
+        "result_cache": result_cache.get_stats() if result_cache is not None else None,
+        "result_store": result_store.get_stats(),
+        "events": event_bus.get_stats(),
+        "output_encoding": encoder_stats.get_stats(),
+        "face_batching": model_info["face_batching"],
+        "landmark_cache": model_info["landmark_cache"],
+        "warmup": model_info["warmup"],
+        "memory": model_info["memory"]
+    }
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus 指标（文本格式），抓取开销与任务数量无关"""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/api/v1/warmup")
+async def warmup_models():
+    """
+    预热模型：按 COMPILE_BATCH_BUCKETS 中的每个batch大小运行人脸修复网络，按 COMPILE_DETECTOR_SIZES 运行人脸检测
+
+    COMPILE_MODE 为 trace/compile 时返回各分桶的编译耗时、eager与编译后的稳态延迟及加速比。
+    预热经 bulk 队列通道执行，与图片任务一样受准入限制，队列已满时返回 429
+    """
+    done = asyncio.get_running_loop().create_future()
+    
+    async def run_warmup():
+        try:
+            done.set_result(await model_manager.warmup())
+        except Exception as e:
+            done.set_exception(e)
+            raise
+    
+    try:
+        job_queue.submit(f"warmup-{uuid.uuid4()}", 'bulk', run_warmup)
+    except QueueFullError as e:
+        raise_queue_full(e)
+    report = await done
+    return {
+        "compile_mode": settings.COMPILE_MODE,
+        "face_backend": settings.FACE_BACKEND,
+        "buckets": report
     }
 
 @app.post("/api/v1/enhance", response_model=TaskResponse)
 async def enhance_portrait(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     tile_size: int = Query(400, ge=256, le=512, description="Tile size for processing (256-512)"),
-    quality_level: str = Query("high", pattern="^(fast|medium|high)$", description="Quality level")
+    quality_level: str = Query("high", pattern="^(fast|medium|high)$", description="Quality level"),
+    output_format: Optional[str] = Query(None, pattern="^(jpeg|png|webp)$", description="Output format (jpeg/png/webp)"),
+    output_quality: Optional[int] = Query(None, ge=1, le=100, description="JPEG/WebP quality (1-100)"),
+    face_mode: str = Query("full", pattern="^(full|auto|face)$", description="Face processing mode (full/auto/face)"),
+    only_center_face: bool = Query(False, description="Only restore the face closest to the image center"),
+    has_aligned: bool = Query(False, description="Input is an aligned face crop; returns the restored 512x512 face"),
+    scale: Optional[int] = Query(None, ge=1, le=settings.MAX_UPSCALE, description="Requested upscale factor"),
+    max_output_pixels: Optional[int] = Query(None, ge=1, description="Output pixel budget (capped by the server)"),
+    noise_mode: Optional[str] = Query(None, pattern="^(random|fixed|zero)$", description="Face noise mode (random/fixed/zero)")
 ):
     """
     使用GFPGAN增强图像 (人脸修复 + 超分辨率)
     
     - **file**: 图像文件 (JPG, PNG, 等)
     - **tile_size**: 瓦片大小，影响显存使用 (256-512, 默认: 400)
-    - **quality_level**: 处理质量 (fast/medium/high, 默认: high)
+    - **quality_level**: 处理质量，决定背景处理方式 (默认: high)
+      - fast: 背景Lanczos插值放大，只做人脸修复
+      - medium: 轻量SRVGG网络(realesr-general-x4v3)背景超分
+      - high: RealESRGAN x2plus背景超分
+    - **output_format**: 输出格式 (jpeg/png/webp, 默认: OUTPUT_FORMAT 配置)
+    - **output_quality**: JPEG/WebP 编码质量 (1-100, 默认: OUTPUT_QUALITY 配置)
+    - **face_mode**: 人脸处理模式 (默认: full)
+      - full: 完整流程（人脸修复 + 背景超分 + 贴回）
+      - auto: 单人像特写（人脸占画面比例 ≥ PORTRAIT_FACE_RATIO）时背景改用插值放大，跳过背景模型
+      - face: 只输出画面中心人脸修复后的512x512图像，跳过背景处理与贴回
+    - **only_center_face**: 只修复最靠近画面中心的人脸
+    - **has_aligned**: 输入已是对齐的人脸裁剪图，直接输出修复后的512x512人脸
+    - **scale**: 放大倍数 (1-MAX_UPSCALE, 默认: DEFAULT_UPSCALE)
+    - **max_output_pixels**: 输出像素上限 (不超过服务端 MAX_OUTPUT_PIXELS)；超出时自动降低放大倍数，
+      1倍仍超出时先缩小输入
+    - **noise_mode**: 人脸修复的StyleGAN2噪声 (默认: NOISE_MODE 配置)
+      - fixed: 使用模型自带的固定噪声，相同请求结果完全一致
+      - zero: 不注入噪声，结果完全一致（需要 FACE_OPTIMIZED_ARCH=true）
+      - random: 每次请求重新生成随机噪声
     
     GFPGAN功能:
     - ✅ AI人脸修复和美化
@@ -317,10 +917,20 @@ async def enhance_portrait(
     - ✅ 4倍分辨率提升
     - ✅ 一体化处理，比传统流水线快7倍
     
-    返回任务ID用于状态跟踪
+    返回任务ID用于状态跟踪；队列已满时返回 429 并附带 Retry-After
     """
     # Validate input
     validate_image_file(file)
+    validate_noise_mode(noise_mode)
+    
+    # Admission control before reading the upload
+    try:
+        job_queue.check_capacity('interactive')
+    except QueueFullError as e:
+        raise_queue_full(e)
+    
+    output_format = output_format or settings.OUTPUT_FORMAT
+    output_quality = output_quality or settings.OUTPUT_QUALITY
     
     # Generate task ID
     task_id = str(uuid.uuid4())
@@ -328,13 +938,14 @@ async def enhance_portrait(
     # Create temporary directories
     temp_dir = Path(tempfile.mkdtemp(prefix="photoenhanceai_"))
     input_path = temp_dir / f"input_{file.filename}"
-    output_path = temp_dir / f"output_{task_id}.jpg"
+    output_path = temp_dir / f"output_{task_id}{OUTPUT_FORMATS[output_format]['extension']}"
+    inflight_key = None  # set once identical requests may be waiting on this one
     
     try:
-        # Save uploaded file
-        async with aiofiles.open(input_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
+        # Receive the upload in chunks; small files stay in memory, large ones are spilled to disk
+        upload = await receive_upload(
+            file, input_path, settings.UPLOAD_SPILL_THRESHOLD_BYTES, settings.MAX_FILE_SIZE_BYTES
+        )
         
         # Adjust tile size based on quality level
         if quality_level == "fast":
@@ -343,61 +954,172 @@ async def enhance_portrait(
             tile_size = min(tile_size, 400)
         # high quality uses the provided tile_size
         
-        # Initialize task
         current_time = time.time()
-        tasks_storage[task_id] = {
+        task_data = {
             'task_id': task_id,
             'status': 'queued',
             'message': 'GFPGAN任务排队中 (使用常驻模型)',
             'progress': 0.0,
             'created_at': current_time,
             'updated_at': current_time,
-            'input_path': str(input_path),
+            'input_path': str(upload.path) if upload.path else None,
             'output_path': str(output_path),
             'temp_dir': str(temp_dir),
             'original_filename': file.filename,
             'quality_level': quality_level,
-            'tile_size': tile_size
+            'tile_size': tile_size,
+            'output_format': output_format,
+            'output_quality': output_quality,
+            'face_mode': face_mode,
+            'only_center_face': only_center_face,
+            'has_aligned': has_aligned,
+            'scale': scale,
+            'max_output_pixels': max_output_pixels,
+            'noise_mode': noise_mode or settings.NOISE_MODE,
+            'lane': 'interactive',
+            'image_digest': upload.digest
         }
         
-        # Start background processing
-        background_tasks.add_task(
+        # Content-addressed cache: identical image + parameters + model version
+        # (random noise gives a different result every time, so those requests are never cached or shared)
+        if result_cache is not None and task_data['noise_mode'] != 'random':
+            cache_key = result_cache.make_key(
+                upload.digest,
+                **enhance_options(task_data),
+                weight=0.5,
+                model=model_manager.model_version
+            )
+            task_data['cache_key'] = cache_key
+            
+            cached_path = result_cache.get(cache_key)
+            if cached_path is not None:
+                # Cache hit: complete immediately without inference
+                await asyncio.to_thread(link_or_copy, cached_path, output_path)
+                task_data.update({
+                    'status': 'completed',
+                    'message': 'GFPGAN图像增强完成 (命中结果缓存)',
+                    'progress': 1.0,
+                    'result_url': f"/api/v1/download/{task_id}",
+                    'cache_hit': True,
+                    'processing_time': 0.0
+                })
+                task_store.create(task_data)
+                return TaskResponse(
+                    task_id=task_id,
+                    status="completed",
+                    message=task_data['message'],
+                    created_at=current_time
+                )
+            
+            inflight = result_cache.inflight(cache_key)
+            if inflight is not None:
+                # Identical request already in flight: share its inference
+                task_data['message'] = '相同图片正在处理中，等待共享结果'
+                task_store.create(task_data)
+                asyncio.create_task(follow_inflight_result(task_id, str(output_path), inflight))
+                return TaskResponse(
+                    task_id=task_id,
+                    status="queued",
+                    message=task_data['message'],
+                    created_at=current_time
+                )
+            result_cache.begin(cache_key)
+            inflight_key = cache_key
+        
+        # A persistent store re-queues the task after a restart, which needs the input on disk
+        await track_upload(task_id, task_data, upload, input_path)
+        
+        # Initialize task
+        task_store.create(task_data)
+        
+        # Enqueue for processing in the interactive lane
+        estimated_wait = job_queue.submit(task_id, 'interactive', partial(
             process_image_task,
             task_id,
-            str(input_path),
-            str(output_path),
-            tile_size
-        )
+            upload.source
+        ))
         
         return TaskResponse(
             task_id=task_id,
             status="queued",
             message="GFPGAN任务排队中 (使用常驻模型)",
-            created_at=current_time
+            created_at=current_time,
+            estimated_wait=estimated_wait
         )
         
+    except QueueFullError as e:
+        # Queue filled up while the upload was being received
+        abandon_task(task_id, temp_dir, inflight_key, str(e))
+        raise_queue_full(e)
+    except UploadTooLargeError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise_upload_too_large(e)
     except Exception as e:
         # Cleanup on error
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir)
+        abandon_task(task_id, temp_dir, inflight_key, str(e))
         raise HTTPException(status_code=500, detail=f"Failed to process request: {str(e)}")
 
+def abandon_task(task_id: str, temp_dir: Path, inflight_key: Optional[str], error: str):
+    """Drop a task that failed before it was queued, failing the identical requests waiting on its result"""
+    task_store.delete(task_id)
+    if inflight_key is not None:
+        result_cache.finish(inflight_key, error=error)
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
 @app.get("/api/v1/status/{task_id}", response_model=TaskStatus)
 async def get_task_status(task_id: str):
     """Get task processing status"""
-    if task_id not in tasks_storage:
+    task_data = with_live_progress(task_store.get(task_id))
+    if task_data is None:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    task_data = tasks_storage[task_id]
+    if task_data['status'] == 'queued':
+        task_data['queue_position'] = job_queue.position(task_id)
+        # 按任务所在的队列通道估算（批量子任务在bulk通道）
+        lane = task_data.get('lane') or ('bulk' if task_data.get('batch_task_id') else 'interactive')
+        task_data['estimated_wait'] = job_queue.estimate_wait(lane, task_id)
     return TaskStatus(**task_data)
 
-@app.get("/api/v1/download/{task_id}")
-async def download_result(task_id: str):
-    """Download processed image"""
-    if task_id not in tasks_storage:
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+@app.get("/api/v1/events/{task_id}")
+async def task_events(task_id: str):
+    """
+    订阅单个任务的状态推送 (Server-Sent Events)
+    
+    先推送一次当前状态，之后每次状态变化推送 `task` 事件，任务完成或失败后关闭连接；
+    空闲时每隔15秒发送心跳注释行
+    """
+    if task_id not in task_store:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task_data = tasks_storage[task_id]
+    async def stream():
+        # 先订阅再读取快照，避免丢失两者之间的状态变化
+        queue = event_bus.subscribe(task_id)
+        try:
+            task_data = with_live_progress(task_store.get(task_id))
+            if task_data is None:
+                return
+            yield format_sse('task', task_event(task_data))
+            status = task_data['status']
+            while status not in TASK_FINAL_STATUSES:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event, data)
+                status = data['status']
+        finally:
+            event_bus.unsubscribe(task_id, queue)
+    
+    return StreamingResponse(stream(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+@app.get("/api/v1/download/{task_id}")
+async def download_result(task_id: str, request: Request):
+    """Download processed image (supports ETag/If-None-Match and Range requests)"""
+    task_data = task_store.get(task_id)
+    if task_data is None:
+        raise HTTPException(status_code=404, detail="Task not found")
     
     if task_data['status'] != 'completed':
         raise HTTPException(
@@ -405,36 +1127,52 @@ async def download_result(task_id: str):
             detail=f"Task not completed. Current status: {task_data['status']}"
         )
     
-    output_path = Path(task_data['output_path'])
-    if not output_path.exists():
-        raise HTTPException(status_code=404, detail="Result file not found")
+    output_format = task_data.get('output_format', 'jpeg')
+    
+    # Serve the encoded bytes from memory; fall back to the result file after eviction or restart
+    encoded = result_store.get(task_id)
+    if encoded is not None:
+        data, etag = encoded.data, encoded.etag
+    else:
+        output_path = Path(task_data['output_path'])
+        if not output_path.exists():
+            raise HTTPException(status_code=404, detail="Result file not found")
+        data = await asyncio.to_thread(output_path.read_bytes)
+        etag = task_data.get('etag') or compute_etag(data)
     
     # Get original filename for response
     original_name = task_data.get('original_filename', 'image.jpg')
-    name_parts = Path(original_name).stem, Path(original_name).suffix
-    enhanced_filename = f"{name_parts[0]}_enhanced{name_parts[1]}"
+    enhanced_filename = f"{Path(original_name).stem}_enhanced{OUTPUT_FORMATS[output_format]['extension']}"
     
-    return FileResponse(
-        path=output_path,
-        filename=enhanced_filename,
-        media_type='image/jpeg'
+    response = bytes_response(
+        data,
+        OUTPUT_FORMATS[output_format]['media_type'],
+        etag,
+        enhanced_filename,
+        range_header=request.headers.get('range'),
+        if_none_match=request.headers.get('if-none-match'),
+        if_range=request.headers.get('if-range')
     )
+    encoder_stats.record_served(output_format, len(response.body))
+    return response
 
 @app.delete("/api/v1/tasks/{task_id}")
 async def delete_task(task_id: str):
     """Delete task and cleanup files"""
-    if task_id not in tasks_storage:
+    task_data = task_store.get(task_id)
+    if task_data is None:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    task_data = tasks_storage[task_id]
-    
     # Cleanup files
     temp_dir = Path(task_data.get('temp_dir', ''))
     if temp_dir.exists():
         shutil.rmtree(temp_dir)
     
     # Remove from storage
-    del tasks_storage[task_id]
+    task_store.delete(task_id)
+    result_store.pop(task_id)
+    unpersisted_uploads.pop(task_id, None)
+    live_progress.pop(task_id, None)
     
     return {"message": "Task deleted successfully"}
 
@@ -442,24 +1180,31 @@ async def delete_task(task_id: str):
 async def list_tasks():
     """List all tasks (for debugging)"""
     return {
-        "total_tasks": len(tasks_storage),
+        "total_tasks": len(task_store),
         "tasks": [
             {
-                "task_id": task_id,
+                "task_id": task_data["task_id"],
                 "status": task_data["status"],
                 "created_at": task_data["created_at"],
                 "updated_at": task_data["updated_at"]
             }
-            for task_id, task_data in tasks_storage.items()
+            for task_data in task_store.list()
         ]
     }
 
 @app.post("/api/v1/enhance/batch", response_model=BatchTaskResponse)
 async def enhance_batch_portraits(
-    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     tile_size: int = Query(400, ge=256, le=512),
-    quality_level: str = Query("high", pattern="^(fast|medium|high)$")
+    quality_level: str = Query("high", pattern="^(fast|medium|high)$"),
+    output_format: Optional[str] = Query(None, pattern="^(jpeg|png|webp)$"),
+    output_quality: Optional[int] = Query(None, ge=1, le=100),
+    face_mode: str = Query("full", pattern="^(full|auto|face)$"),
+    only_center_face: bool = Query(False),
+    has_aligned: bool = Query(False),
+    scale: Optional[int] = Query(None, ge=1, le=settings.MAX_UPSCALE),
+    max_output_pixels: Optional[int] = Query(None, ge=1),
+    noise_mode: Optional[str] = Query(None, pattern="^(random|fixed|zero)$")
 ):
     """
     批量处理多张图片
@@ -467,6 +1212,12 @@ async def enhance_batch_portraits(
     - **files**: 多张图像文件（最多20张）
     - **tile_size**: 瓦片大小 (256-512, 默认: 400)
     - **quality_level**: 处理质量 (fast/medium/high, 默认: high)
+    - **output_format**: 输出格式 (jpeg/png/webp, 默认: OUTPUT_FORMAT 配置)
+    - **output_quality**: JPEG/WebP 编码质量 (1-100, 默认: OUTPUT_QUALITY 配置)
+    - **face_mode** / **only_center_face** / **has_aligned**: 同 /api/v1/enhance
+    - **scale** / **max_output_pixels** / **noise_mode**: 同 /api/v1/enhance
+    
+    子任务进入bulk队列通道，优先级低于单张请求；队列容纳不下整批时返回 429
     """
     # 验证文件数量
     if len(files) > 20:  # 限制最大20张
@@ -475,6 +1226,16 @@ async def enhance_batch_portraits(
     # 验证所有文件
     for file in files:
         validate_image_file(file)
+    validate_noise_mode(noise_mode)
+    
+    # 准入控制：整批一起接收或拒绝
+    try:
+        job_queue.check_capacity('bulk', len(files))
+    except QueueFullError as e:
+        raise_queue_full(e)
+    
+    output_format = output_format or settings.OUTPUT_FORMAT
+    output_quality = output_quality or settings.OUTPUT_QUALITY
     
     # 创建批量任务
     batch_task_id = str(uuid.uuid4())
@@ -487,23 +1248,34 @@ async def enhance_batch_portraits(
     temp_input_dir.mkdir()
     temp_output_dir.mkdir()
     
-    # 保存所有文件并创建子任务
+    # 分块接收所有文件：小文件保留在内存中，大文件落盘
+    uploads: List[UploadedImage] = []
+    try:
+        for i, file in enumerate(files):
+            input_path = temp_input_dir / f"img_{i:03d}_{file.filename}"
+            uploads.append(await receive_upload(
+                file, input_path, settings.UPLOAD_SPILL_THRESHOLD_BYTES, settings.MAX_FILE_SIZE_BYTES
+            ))
+    except UploadTooLargeError as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise_upload_too_large(e)
+    except BaseException:
+        # 客户端断开、磁盘写入失败等：同样删除已接收的文件
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    
+    # 创建子任务
     sub_task_ids = []
-    for i, file in enumerate(files):
-        # 保存文件
-        input_path = temp_input_dir / f"img_{i:03d}_{file.filename}"
-        async with aiofiles.open(input_path, 'wb') as f:
-            content = await file.read()
-            await f.write(content)
-        
+    pending_uploads: Dict[str, UploadedImage] = {}
+    for i, (file, upload) in enumerate(zip(files, uploads)):
         # 创建子任务
         sub_task_id = str(uuid.uuid4())
         sub_task_ids.append(sub_task_id)
         
-        output_path = temp_output_dir / f"enhanced_{i:03d}_{file.filename}"
+        output_path = temp_output_dir / f"enhanced_{i:03d}_{Path(file.filename).stem}{OUTPUT_FORMATS[output_format]['extension']}"
         
         # 初始化子任务
-        tasks_storage[sub_task_id] = {
+        sub_task = {
             'task_id': sub_task_id,
             'batch_task_id': batch_task_id,
             'status': 'queued',
@@ -511,16 +1283,52 @@ async def enhance_batch_portraits(
             'progress': 0.0,
             'created_at': current_time,
             'updated_at': current_time,
-            'input_path': str(input_path),
+            'input_path': str(upload.path) if upload.path else None,
             'output_path': str(output_path),
             'original_filename': file.filename,
             'file_index': i,
             'quality_level': quality_level,
-            'tile_size': tile_size
+            'tile_size': tile_size,
+            'output_format': output_format,
+            'output_quality': output_quality,
+            'face_mode': face_mode,
+            'only_center_face': only_center_face,
+            'has_aligned': has_aligned,
+            'scale': scale,
+            'max_output_pixels': max_output_pixels,
+            'noise_mode': noise_mode or settings.NOISE_MODE,
+            'lane': 'bulk',
+            'image_digest': upload.digest
         }
+        
+        # 命中结果缓存的图片直接完成，不进入队列（random噪声每次结果不同，不使用缓存）
+        if result_cache is not None and sub_task['noise_mode'] != 'random':
+            sub_task['cache_key'] = result_cache.make_key(
+                upload.digest,
+                **enhance_options(sub_task),
+                weight=0.5,
+                model=model_manager.model_version
+            )
+            cached_path = result_cache.get(sub_task['cache_key'])
+            if cached_path is not None:
+                await asyncio.to_thread(link_or_copy, cached_path, output_path)
+                sub_task.update({
+                    'status': 'completed',
+                    'message': '处理完成 (命中结果缓存)',
+                    'progress': 1.0,
+                    'cache_hit': True
+                })
+            else:
+                pending_uploads[sub_task_id] = upload
+        else:
+            pending_uploads[sub_task_id] = upload
+        if sub_task_id in pending_uploads:
+            # 持久化存储重启后会重新排队该子任务，需要输入文件
+            await track_upload(sub_task_id, sub_task, upload, temp_input_dir / f"img_{i:03d}_{file.filename}")
+        task_store.create(sub_task)
     
     # 初始化批量任务
-    batch_tasks_storage[batch_task_id] = {
+    batch_task_store.create({
         'batch_task_id': batch_task_id,
         'status': 'queued',
         'total_files': len(files),
@@ -532,43 +1340,48 @@ async def enhance_batch_portraits(
         'updated_at': current_time,
         'temp_dir': str(temp_dir),
         'message': f'批量任务已创建，共{len(files)}张图片'
-    }
+    })
     
-    # 启动批量处理
-    background_tasks.add_task(
-        process_batch_task,
-        batch_task_id,
-        sub_task_ids,
-        tile_size
-    )
+    # 子任务进入bulk队列通道（已整批通过准入检查）
+    estimated_wait = 0.0
+    for sub_task_id, upload in pending_uploads.items():
+        estimated_wait = job_queue.submit(
+            sub_task_id, 'bulk', partial(process_batch_subtask, batch_task_id, sub_task_id, upload.data), force=True
+        )
+    
+    # 部分或全部子任务可能已命中缓存
+    if len(pending_uploads) < len(sub_task_ids):
+        update_batch_progress(batch_task_id)
+    batch_data = batch_task_store.get(batch_task_id)
     
     return BatchTaskResponse(
         batch_task_id=batch_task_id,
         total_files=len(files),
-        status="queued",
+        status=batch_data['status'],
         message=f"批量任务已创建，共{len(files)}张图片",
         created_at=current_time,
-        sub_tasks=sub_task_ids
+        sub_tasks=sub_task_ids,
+        estimated_wait=estimated_wait
     )
 
 @app.get("/api/v1/batch/status/{batch_task_id}", response_model=BatchTaskStatus)
 async def get_batch_task_status(batch_task_id: str):
     """获取批量任务状态"""
-    if batch_task_id not in batch_tasks_storage:
+    batch_data = batch_task_store.get(batch_task_id)
+    if batch_data is None:
         raise HTTPException(status_code=404, detail="批量任务不存在")
     
-    batch_data = batch_tasks_storage[batch_task_id]
-    
     # 获取子任务状态
     sub_tasks_status = []
     for task_id in batch_data['sub_tasks']:
-        if task_id in tasks_storage:
-            task_data = tasks_storage[task_id]
+        task_data = with_live_progress(task_store.get(task_id))
+        if task_data is not None:
             sub_tasks_status.append({
                 'task_id': task_id,
                 'status': task_data['status'],
                 'filename': task_data['original_filename'],
                 'progress': task_data.get('progress', 0),
+                'stage': task_data.get('stage'),
                 'error': task_data.get('error')
             })
     
@@ -585,35 +1398,108 @@ async def get_batch_task_status(batch_task_id: str):
         message=batch_data['message']
     )
 
-@app.get("/api/v1/batch/download/{batch_task_id}")
-async def download_batch_results(batch_task_id: str):
-    """下载批量处理结果（ZIP格式）"""
-    if batch_task_id not in batch_tasks_storage:
+@app.get("/api/v1/batch/events/{batch_task_id}")
+async def batch_task_events(batch_task_id: str):
+    """
+    订阅批量任务的状态推送 (Server-Sent Events)
+    
+    先推送批量任务及全部子任务的当前状态，之后推送子任务的 `task` 事件和批量任务的 `batch` 事件，
+    批量任务结束后关闭连接
+    """
+    if batch_task_id not in batch_task_store:
         raise HTTPException(status_code=404, detail="批量任务不存在")
     
-    batch_data = batch_tasks_storage[batch_task_id]
-    if batch_data['status'] not in ['completed', 'partial_completed']:
+    async def stream():
+        queue = event_bus.subscribe(batch_task_id)
+        try:
+            batch_data = batch_task_store.get(batch_task_id)
+            if batch_data is None:
+                return
+            for task_id in batch_data['sub_tasks']:
+                task_data = with_live_progress(task_store.get(task_id))
+                if task_data is not None:
+                    yield format_sse('task', task_event(task_data))
+            yield format_sse('batch', batch_event(batch_data))
+            status = batch_data['status']
+            while status not in BATCH_FINAL_STATUSES:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield format_sse(event, data)
+                if event == 'batch':
+                    status = data['status']
+        finally:
+            event_bus.unsubscribe(batch_task_id, queue)
+    
+    return StreamingResponse(stream(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+@app.get("/api/v1/batch/download/{batch_task_id}")
+async def download_batch_results(
+    batch_task_id: str,
+    wait: bool = Query(False, description="批量任务未完成时，先输出已完成的图片，并等待其余子任务完成后继续输出")
+):
+    """下载批量处理结果（流式ZIP，边读边发送，图片以STORED方式存储）"""
+    batch_data = batch_task_store.get(batch_task_id)
+    if batch_data is None:
+        raise HTTPException(status_code=404, detail="批量任务不存在")
+    if batch_data['status'] not in ['completed', 'partial_completed'] and not wait:
         raise HTTPException(status_code=400, detail="批量任务未完成")
     
-    # 创建ZIP文件
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for task_id in batch_data['sub_tasks']:
-            if task_id in tasks_storage:
-                task_data = tasks_storage[task_id]
-                if task_data['status'] == 'completed':
-                    output_path = Path(task_data['output_path'])
-                    if output_path.exists():
-                        zip_file.write(output_path, task_data['original_filename'])
-    
-    zip_buffer.seek(0)
-    
-    return Response(
-        content=zip_buffer.getvalue(),
+    return StreamingResponse(
+        stream_batch_zip(batch_task_id, batch_data['sub_tasks']),
         media_type='application/zip',
         headers={'Content-Disposition': f'attachment; filename="batch_results_{batch_task_id}.zip"'}
     )
 
+async def stream_batch_zip(batch_task_id: str, sub_task_ids: List[str]):
+    """按子任务完成顺序逐个写入ZIP条目，未完成的子任务通过任务事件等待其结束"""
+    writer = ZipStreamWriter()
+    # 先订阅再读取快照，避免丢失两者之间完成的子任务
+    queue = event_bus.subscribe(batch_task_id)
+    try:
+        pending = set()
+        for task_id in sub_task_ids:
+            task_data = task_store.get(task_id)
+            if task_data is None:
+                continue
+            if task_data['status'] in ACTIVE_STATUSES:
+                pending.add(task_id)
+            elif task_data['status'] == 'completed':
+                async for chunk in zip_task_result(writer, task_data):
+                    yield chunk
+        
+        while pending:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                # 子任务被删除时没有事件，长时间没有事件时核对一次
+                pending = {task_id for task_id in pending if task_id in task_store}
+                continue
+            if event != 'task' or data['task_id'] not in pending or data['status'] not in TASK_FINAL_STATUSES:
+                continue
+            pending.discard(data['task_id'])
+            task_data = task_store.get(data['task_id'])
+            if task_data is not None and task_data['status'] == 'completed':
+                async for chunk in zip_task_result(writer, task_data):
+                    yield chunk
+    finally:
+        event_bus.unsubscribe(batch_task_id, queue)
+    yield writer.close()
+
+async def zip_task_result(writer: ZipStreamWriter, task_data: Dict[str, Any]):
+    """写入一个子任务的结果：优先使用内存中的编码结果，已淘汰或重启后读取结果文件"""
+    output_path = Path(task_data['output_path'])
+    arcname = Path(task_data['original_filename']).stem + output_path.suffix
+    encoded = result_store.get(task_data['task_id'])
+    if encoded is not None:
+        async for chunk in writer.add_bytes(encoded.data, arcname):
+            yield chunk
+    elif output_path.exists():
+        async for chunk in writer.add_file(output_path, arcname):
+            yield chunk
+
 if __name__ == "__main__":
     # Development server
     uvicorn.run(
@@ -5,77 +5,127 @@ PhotoEnhanceAI Model Manager
 """
 
 import asyncio
+import gc
+import multiprocessing
+import os
+import threading
+import time
 import cv2
+import numpy as np
 import torch
 import logging
 from pathlib import Path
-from typing import Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 import sys
 
 # Add project root to path
 PROJECT_ROOT = Path(__file__).parent.parent
 sys.path.append(str(PROJECT_ROOT))
 
+from config.settings import settings
+from inference_executor import InferenceExecutor, read_process_memory
+from shared_buffers import SharedImageBuffer
+from output_encoder import EncodedImage, encode_image
+from progress import ProgressHub, ProgressReporter, install_queue_sink
+from gfpgan.stages import StageTimer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 人脸处理模式：full 完整流程 | auto 自动识别人像特写并跳过背景模型 | face 只输出修复后的512人脸
+FACE_MODES = ('full', 'auto', 'face')
+
+class EnhanceResult(NamedTuple):
+    """单张图片的处理结果：编码后的图片、各阶段耗时（秒）、检测到的人脸数、实际使用的处理路径与输出分辨率"""
+    encoded: EncodedImage
+    timings: Dict[str, float]
+    num_faces: int
+    path: str = 'full'  # full | portrait(背景插值放大) | face | aligned
+    scale: Optional[int] = None  # 实际放大倍数（仅人脸路径为None）
+    output_size: Optional[Tuple[int, int]] = None  # (宽, 高)
+
+# 质量等级 → 背景处理方式（None: Lanczos插值放大，不运行背景模型）
+QUALITY_BG_MODELS = {
+    'fast': None,
+    'medium': 'realesr-general-x4v3',  # SRVGG紧凑网络，直接4倍
+    'high': 'realesrgan-x2plus'        # RRDBNet，2倍后Lanczos放大到4倍
+}
+# CPU主机上默认运行的背景模型（轻量SRVGG）；其余模型需要 BG_UPSAMPLE_ON_CPU=true
+CPU_BG_MODELS = {'realesr-general-x4v3'}
+
 class ModelManager:
     """GFPGAN模型管理器 - 单例模式"""
     
     def __init__(self):
         self.restorer = None
-        self.bg_upsampler = None
-        self._lock = asyncio.Lock()
+        # 背景超分模型，按质量等级首次使用时加载: 模型名 -> TiledUpsampler
+        self.bg_upsamplers = {}
+        self._bg_lock = threading.Lock()
+        # CPU主机上被跳过（改为插值放大）并已告警的背景模型
+        self._bg_skipped = set()
+        self.upscale = 4
+        # 降低精度的质量等级，如 -fast-int8
+        reduced_precision = ''.join(
+            f"-{q}-{self.face_precision(q)}" for q in QUALITY_BG_MODELS if self.face_precision(q) != 'fp32'
+        )
+        # 模型版本标识，参与结果缓存键；更换权重、人脸修复精度或背景增强配置后旧缓存自动失效
+        self.model_version = (
+            f"GFPGANv1.4-clean-x{self.upscale}"
+            f"{'-fused' if settings.FACE_OPTIMIZED_ARCH and settings.FACE_BACKEND == 'torch' else ''}"
+            f"{'-onnx' if settings.FACE_BACKEND == 'onnx' else ''}"
+            f"{reduced_precision}"
+            f"{'-realesrgan-tiled' if torch.cuda.is_available() or settings.BG_UPSAMPLE_ON_CPU else '-srvgg-tiled'}"
+        )
+        # 编译与预热报告：各batch分桶/检测输入尺寸的编译耗时、eager与编译后的稳态延迟
+        self.warmup_report = []
+        self._lock = threading.Lock()
+        self._init_lock = asyncio.Lock()
         self._initialized = False
-        self._initialization_started = False
+        # CPU进程池模式下，主进程加载一次模型后fork工作进程，权重以写时复制方式共享
+        self.share_weights = (
+            settings.INFERENCE_EXECUTOR == 'process'
+            and settings.INFERENCE_SHARE_WEIGHTS
+            and not torch.cuda.is_available()
+        )
+        start_method = 'fork' if self.share_weights else 'spawn'
+        # 分阶段进度：进程池模式下工作进程通过队列把进度发回主进程
+        progress_queue = (
+            multiprocessing.get_context(start_method).Queue() if settings.INFERENCE_EXECUTOR == 'process' else None
+        )
+        self.progress_hub = ProgressHub(progress_queue)
+        # 推理执行器：模型推理不在事件循环中执行
+        # 线程模式下可通过 FACE_BATCH_CONCURRENCY 显式提高同时处理的图片数（共享同一份模型），
+        # 不同请求的人脸才能在批处理调度器中合并为一次前向计算；每张图片的完整流程都会并行运行
+        max_workers = settings.INFERENCE_WORKERS
+        if settings.INFERENCE_EXECUTOR == 'thread' and settings.FACE_BATCHING and settings.FACE_BATCH_CONCURRENCY:
+            max_workers = settings.FACE_BATCH_CONCURRENCY
+            logger.info(f"📦 人脸批处理并发: 线程执行器同时处理 {max_workers} 张图片 "
+                        f"(FACE_BATCH_CONCURRENCY，INFERENCE_WORKERS={settings.INFERENCE_WORKERS})")
+        self.executor = InferenceExecutor(
+            mode=settings.INFERENCE_EXECUTOR,
+            max_workers=max_workers,
+            initializer=_worker_initialize if settings.INFERENCE_EXECUTOR == 'process' else None,
+            initargs=(progress_queue,) if progress_queue is not None else (),
+            start_method=start_method
+        )
         
-    async def initialize(self):
-        """初始化模型（只执行一次）"""
-        async with self._lock:
-            if self._initialized:
-                logger.info("✅ 模型已初始化，直接返回")
-                return
-            
-            if self._initialization_started:
-                # 等待其他协程完成初始化
-                while not self._initialized:
-                    await asyncio.sleep(0.1)
+    def load_models(self, start_runtime: bool = True):
+        """在当前进程中加载模型（只执行一次，线程安全）
+
+        start_runtime=False 时只加载权重：不运行推理、不创建线程，共享权重模式下主进程在fork工作进程前调用，
+        编译预热、ONNX会话与人脸批处理线程由各工作进程启动后创建（见 start_runtime / prepare_worker）
+        """
+        with self._lock:
+            if self.restorer is not None:
+                logger.info("✅ 模型已加载，直接返回")
                 return
             
-            self._initialization_started = True
-            
             try:
                 logger.info("🚀 开始加载GFPGAN模型...")
                 
                 # 延迟导入，避免启动时的问题
                 from gfpgan import GFPGANer
-                from basicsr.archs.rrdbnet_arch import RRDBNet
-                from realesrgan import RealESRGANer
-                
-                # 初始化背景超分辨率模型
-                if torch.cuda.is_available():
-                    logger.info("🎮 检测到CUDA，初始化RealESRGAN背景超分辨率模型...")
-                    model = RRDBNet(
-                        num_in_ch=3, 
-                        num_out_ch=3, 
-                        num_feat=64, 
-                        num_block=23, 
-                        num_grow_ch=32, 
-                        scale=2
-                    )
-                    self.bg_upsampler = RealESRGANer(
-                        scale=2,
-                        model_path='https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.1/RealESRGAN_x2plus.pth',
-                        model=model,
-                        tile=400,
-                        tile_pad=10,
-                        pre_pad=0,
-                        half=True
-                    )
-                    logger.info("✅ RealESRGAN背景超分辨率模型加载完成")
-                else:
-                    logger.info("💻 使用CPU模式，跳过RealESRGAN背景超分辨率")
                 
                 # 初始化GFPGAN模型
                 logger.info("🎭 初始化GFPGAN人脸修复模型...")
@@ -86,69 +136,571 @@ class ModelManager:
                 
                 self.restorer = GFPGANer(
                     model_path=str(model_path),
-                    upscale=4,
+                    upscale=self.upscale,
                     arch='clean',
                     channel_multiplier=2,
-                    bg_upsampler=self.bg_upsampler
+                    bg_upsampler=None,
+                    optimized_arch=settings.FACE_OPTIMIZED_ARCH
                 )
+                if settings.FACE_BACKEND != 'onnx':
+                    # 降低精度的人脸修复网络在编译之前准备，默认精度的网络随之编译
+                    self.enable_face_precisions()
+                if settings.LANDMARK_CACHE_SIZE > 0:
+                    # 同一图片以不同参数再次增强时跳过RetinaFace人脸检测
+                    self.restorer.enable_landmark_cache(max_entries=settings.LANDMARK_CACHE_SIZE)
+                    logger.info(f"📍 人脸关键点缓存已启用: max_entries={settings.LANDMARK_CACHE_SIZE}")
+                
+                # 预加载常用质量等级的背景模型（进程池共享权重模式下在fork前加载）
+                for quality_level in settings.BG_PRELOAD_QUALITY:
+                    self.get_bg_upsampler(quality_level)
                 
+                if start_runtime:
+                    self.start_runtime()
                 self._initialized = True
                 logger.info("🎉 GFPGAN模型加载完成！模型已常驻内存")
                 
             except Exception as e:
                 logger.error(f"❌ 模型初始化失败: {str(e)}")
-                self._initialization_started = False
                 raise e
     
+    def start_runtime(self):
+        """创建推理运行时：ONNX会话或编译预热，以及人脸批处理调度线程（需在运行推理的进程中调用）"""
+        if settings.FACE_BACKEND == 'onnx':
+            self.enable_onnx_backend()
+        elif settings.COMPILE_MODE != 'none':
+            # 启动时编译并预热每个batch分桶，首个请求不再承担编译开销
+            self.warmup_report = self._warmup()
+        
+        # 跨请求动态批处理：并发请求的人脸合并为一次前向计算
+        if settings.FACE_BATCHING:
+            self.restorer.enable_face_batching(
+                max_batch_size=settings.FACE_BATCH_MAX_SIZE,
+                max_wait_ms=settings.FACE_BATCH_MAX_WAIT_MS
+            )
+            logger.info(f"📦 人脸动态批处理已启用: max_batch={settings.FACE_BATCH_MAX_SIZE}, "
+                        f"max_wait={settings.FACE_BATCH_MAX_WAIT_MS}ms")
+    
+    def enable_onnx_backend(self):
+        """人脸修复网络改用 ONNX Runtime 执行（需先运行 scripts/export_onnx.py 导出模型）"""
+        onnx_path = Path(settings.ONNX_MODEL_PATH)
+        if not onnx_path.exists():
+            raise FileNotFoundError(f"ONNX模型文件不存在: {onnx_path}，请先运行 python scripts/export_onnx.py")
+        # 每个进程一个会话（线程模式下由批处理线程独占），按进程数分配CPU核
+        intra_op_threads = settings.ONNX_INTRA_OP_THREADS or max(1, (os.cpu_count() or 1) // settings.INFERENCE_WORKERS)
+        restorer = self.restorer.enable_onnx_backend(
+            str(onnx_path), intra_op_threads=intra_op_threads, inter_op_threads=settings.ONNX_INTER_OP_THREADS
+        )
+        logger.info(f"⚡ 人脸修复使用ONNX Runtime: {onnx_path.name} (noise_mode={restorer.noise_mode}, "
+                    f"intra_op_threads={intra_op_threads}, inter_op_threads={settings.ONNX_INTER_OP_THREADS})")
+    
+    @staticmethod
+    def supports_noise_mode(noise_mode: str) -> bool:
+        """zero 噪声只有优化后的推理网络支持（FACE_OPTIMIZED_ARCH）；ONNX后端使用导出时确定的噪声模式"""
+        return noise_mode != 'zero' or settings.FACE_BACKEND == 'onnx' or settings.FACE_OPTIMIZED_ARCH
+    
+    def face_precision(self, quality_level: str) -> str:
+        """质量等级对应的人脸修复精度（QUALITY_FACE_PRECISION，未列出的等级为 FACE_PRECISION；ONNX后端为fp32）"""
+        if settings.FACE_BACKEND == 'onnx':
+            return 'fp32'
+        return settings.QUALITY_FACE_PRECISION.get(quality_level, settings.FACE_PRECISION)
+    
+    def enable_face_precisions(self):
+        """按质量等级准备降低精度的人脸修复网络（bf16 / 动态int8）；没有等级使用fp32时原地转换，释放fp32权重"""
+        from gfpgan.quantized import FACE_PRECISIONS, model_size_mb
+        
+        precisions = {self.face_precision(quality_level) for quality_level in QUALITY_BG_MODELS}
+        unknown = precisions - set(FACE_PRECISIONS)
+        if unknown:
+            raise ValueError(f"未知的人脸修复精度: {sorted(unknown)}，可选: {FACE_PRECISIONS}")
+        if precisions == {'fp32'}:
+            return
+        fp32_mb = model_size_mb(self.restorer.gfpgan)
+        default = settings.FACE_PRECISION
+        # 先由fp32网络复制出其他精度，最后转换默认精度（可能原地转换）
+        for precision in sorted(precisions - {'fp32', default}):
+            self.restorer.enable_precision(precision)
+        if default != 'fp32':
+            self.restorer.enable_precision(default, replace='fp32' not in precisions)
+        sizes = {self.restorer.precision: model_size_mb(self.restorer.gfpgan)}
+        sizes.update({precision: model_size_mb(net) for precision, net in self.restorer.face_tiers.items()})
+        logger.info("🧮 人脸修复精度: " + ", ".join(f"{q}={self.face_precision(q)}" for q in QUALITY_BG_MODELS)
+                    + f"；权重 fp32 {fp32_mb:.0f}MB → "
+                    + ", ".join(f"{precision} {mb:.0f}MB" for precision, mb in sizes.items()))
+    
+    def warmup_models(self) -> List[Dict[str, Any]]:
+        """预热人脸修复与检测模型的每个batch分桶/输入尺寸（COMPILE_MODE 下首次调用时编译），返回预热报告"""
+        self.load_models()
+        self.warmup_report = self._warmup()
+        return self.warmup_report
+    
+    def _warmup(self) -> List[Dict[str, Any]]:
+        if settings.COMPILE_MODE != 'none' and settings.FACE_BACKEND == 'torch':
+            logger.info(f"🔨 编译推理路径: mode={settings.COMPILE_MODE}, batch分桶={settings.COMPILE_BATCH_BUCKETS}, "
+                        f"检测输入={settings.COMPILE_DETECTOR_SIZES}")
+            report = self.restorer.enable_compiled(
+                mode=settings.COMPILE_MODE,
+                batch_buckets=settings.COMPILE_BATCH_BUCKETS,
+                detector_sizes=settings.COMPILE_DETECTOR_SIZES,
+                noise_mode=settings.NOISE_MODE
+            )
+        else:
+            report = self._warmup_eager()
+        for r in report:
+            if r['status'] == 'compiled':
+                logger.info(f"⚡ {r['model']} {r['shape']}: 编译 {r['compile_s']:.1f}s，稳态 {r['eager_ms']:.0f}ms → "
+                            f"{r['compiled_ms']:.0f}ms ({r['speedup']:.2f}x)")
+            else:
+                logger.info(f"🔥 {r['model']} {r['shape']}: eager {r['eager_ms']:.0f}ms")
+        logger.info(f"✅ 预热完成，编译总耗时 {sum(r['compile_s'] for r in report):.1f}s")
+        return report
+    
+    @torch.no_grad()
+    def _warmup_eager(self) -> List[Dict[str, Any]]:
+        """未启用编译时按各batch分桶运行人脸修复网络、按各检测输入尺寸运行人脸检测，完成延迟初始化（内存分配、算子选择）"""
+        report = []
+        detector = self.restorer.face_helper.face_det
+        for h, w in settings.COMPILE_DETECTOR_SIZES:
+            image = torch.randn(1, 3, h, w, device=next(detector.parameters()).device)
+            detector(image)
+            start = time.perf_counter()
+            detector(image)
+            report.append({
+                'model': 'retinaface',
+                'shape': f'{h}x{w}',
+                'status': 'eager',
+                'compile_s': 0.0,
+                'eager_ms': round((time.perf_counter() - start) * 1000, 1),
+                'compiled_ms': None,
+                'speedup': None
+            })
+        for bucket in settings.COMPILE_BATCH_BUCKETS:
+            faces = torch.randn(bucket, 3, 512, 512, device=self.restorer.device)
+            self.restorer.gfpgan(faces, return_rgb=False, randomize_noise=False)
+            start = time.perf_counter()
+            self.restorer.gfpgan(faces, return_rgb=False, randomize_noise=False)
+            report.append({
+                'model': 'gfpgan',
+                'shape': f'batch={bucket}',
+                'status': 'eager',
+                'compile_s': 0.0,
+                'eager_ms': round((time.perf_counter() - start) * 1000, 1),
+                'compiled_ms': None,
+                'speedup': None
+            })
+        return report
+    
+    def get_bg_upsampler(self, quality_level: str):
+        """质量等级对应的背景超分模型（首次使用时加载），None 表示Lanczos插值放大
+
+        CPU主机上只运行 CPU_BG_MODELS 中的轻量模型，其余模型需要 BG_UPSAMPLE_ON_CPU=true，否则插值放大并告警一次
+        """
+        name = QUALITY_BG_MODELS.get(quality_level, QUALITY_BG_MODELS['high'])
+        use_cuda = torch.cuda.is_available()
+        if name is None:
+            return None
+        if not (use_cuda or settings.BG_UPSAMPLE_ON_CPU or name in CPU_BG_MODELS):
+            if name not in self._bg_skipped:
+                self._bg_skipped.add(name)
+                logger.warning(f"⚠️ CPU主机未启用 BG_UPSAMPLE_ON_CPU，quality_level={quality_level} 的背景模型 {name} "
+                               f"不运行，背景改用插值放大")
+            return None
+        upsampler = self.bg_upsamplers.get(name)
+        if upsampler is not None:
+            return upsampler
+        with self._bg_lock:
+            if name not in self.bg_upsamplers:
+                from gfpgan.tiling import create_bg_upsampler
+                
+                # CPU上多个瓦片由线程池并行计算，GPU上多个瓦片合并为一个batch（分块并行 + 重叠区域融合）
+                tile_workers = 1 if use_cuda else (
+                    settings.BG_TILE_WORKERS or max(1, min(4, (os.cpu_count() or 1) // self.executor.max_workers))
+                )
+                logger.info(f"{'🎮 检测到CUDA' if use_cuda else '💻 CPU模式'}，加载背景超分辨率模型 {name} "
+                            f"(quality_level={quality_level}, tile_workers={tile_workers}, "
+                            f"tile_batch={settings.BG_TILE_BATCH if use_cuda else 1})...")
+                self.bg_upsamplers[name] = create_bg_upsampler(
+                    name,
+                    tile_size=settings.DEFAULT_TILE_SIZE,
+                    tile_pad=settings.BG_TILE_PAD,
+                    overlap=settings.BG_TILE_OVERLAP,
+                    half=use_cuda,
+                    num_workers=tile_workers,
+                    batch_size=settings.BG_TILE_BATCH if use_cuda else 1
+                )
+                logger.info(f"✅ 背景超分辨率模型 {name} 加载完成")
+            return self.bg_upsamplers[name]
+    
+    async def initialize(self):
+        """初始化模型（只执行一次），加载过程在推理执行器中进行"""
+        async with self._init_lock:
+            if self._initialized:
+                return
+            self.progress_hub.bind(asyncio.get_running_loop())
+            if self.share_weights:
+                # 先在主进程加载模型，再fork工作进程共享只读权重；主进程不运行推理
+                await asyncio.to_thread(self._load_weights_before_fork)
+                # 冻结已有对象，避免子进程中GC写对象头触发整页复制
+                gc.collect()
+                gc.freeze()
+                logger.info("🔗 模型已在主进程加载，工作进程将以写时复制方式共享权重")
+            # 进程池模式下预热报告在工作进程中生成，取回一份供 /health 显示
+            self.warmup_report = await self.executor.run(_load_models_job)
+            self._initialized = True
+    
+    def _load_weights_before_fork(self):
+        """共享权重模式下在主进程中只加载权重
+
+        单线程加载，主进程不创建OpenMP线程池、不运行推理，也不启动批处理线程，
+        fork出的工作进程不会继承被其他线程持有的锁或线程池状态
+        """
+        torch.set_num_threads(1)
+        self.load_models(start_runtime=False)
+    
+    def prepare_worker(self):
+        """进程池工作进程启动时调用"""
+        torch_threads = settings.INFERENCE_TORCH_THREADS or max(1, (os.cpu_count() or 1) // self.executor.max_workers)
+        torch.set_num_threads(torch_threads)
+        if self.restorer is None:
+            self.load_models()
+        else:
+            # fork只继承了权重：编译预热、ONNX会话与批处理调度线程在工作进程中创建
+            self.start_runtime()
+        logger.info(f"👷 推理工作进程就绪: pid={os.getpid()}, torch_threads={torch_threads}")
+    
     async def get_restorer(self):
         """获取模型实例"""
         await self.initialize()
         return self.restorer
     
-    async def enhance_image(self, input_path: str, output_path: str, tile_size: int = 400):
-        """使用常驻模型处理图片"""
+    def enhance_image_sync(self, input_source: Union[str, bytes, bytearray, np.ndarray], output_path: Optional[str],
+                           tile_size: int = 400,
+                           output_format: str = 'jpeg', output_quality: int = 95, quality_level: str = 'high',
+                           face_mode: str = 'full', only_center_face: bool = False, has_aligned: bool = False,
+                           scale: Optional[int] = None, max_output_pixels: Optional[int] = None,
+                           noise_mode: Optional[str] = None, image_key: Optional[str] = None,
+                           progress: Optional[Callable[[str, float], None]] = None
+                           ) -> EnhanceResult:
+        """使用常驻模型处理图片（阻塞调用，只应在推理执行器的工作线程/进程中执行）
+
+        input_source 为图片文件路径，或内存中的原始图片字节（bytes 或一维uint8数组，如共享内存视图；
+        直接 cv2.imdecode，不经过临时文件）。
+        结果在内存中编码，返回编码结果、各阶段耗时（秒）与人脸数；output_path 不为None时另写入该文件
+        （结果缓存与重启后下载需要结果文件）。
+        quality_level 选择背景处理方式（见 QUALITY_BG_MODELS），face_mode 见 FACE_MODES；
+        has_aligned=True 表示输入已是对齐的人脸，直接输出修复后的512人脸。
+        scale 为期望放大倍数（默认 DEFAULT_UPSCALE），输出超过像素预算（max_output_pixels 与 MAX_OUTPUT_PIXELS
+        取较小者）时降低放大倍数，1倍仍超出时先缩小输入。
+        noise_mode 为人脸修复的噪声模式（random/fixed/zero，默认 NOISE_MODE），fixed/zero 下相同输入的结果完全一致。
+        image_key 为原始图片字节的哈希（接收上传时已计算），作为人脸关键点缓存键，省去对像素再做一次哈希。
+        progress(stage, fraction) 在每个阶段开始/结束及背景超分每个瓦片完成时调用。
+        """
         try:
-            restorer = await self.get_restorer()
+            self.load_models()
+            stages = StageTimer({}, progress)
             
             # 读取图片
-            logger.info(f"📖 读取图片: {input_path}")
-            input_img = cv2.imread(input_path)
-            if input_img is None:
-                raise ValueError(f"无法读取图片: {input_path}")
-            
-            logger.info(f"🖼️ 图片尺寸: {input_img.shape}")
+            with stages('decode'):
+                if isinstance(input_source, str):
+                    logger.info(f"📖 读取图片: {input_source}")
+                    input_img = cv2.imread(input_source)
+                else:
+                    logger.info(f"📖 解码内存图片: {len(input_source) / 1024:.0f}KB")
+                    input_img = cv2.imdecode(np.frombuffer(input_source, dtype=np.uint8), cv2.IMREAD_COLOR)
+                if input_img is None:
+                    raise ValueError("无法读取图片: " + (input_source if isinstance(input_source, str) else "内存数据"))
+                logger.info(f"🖼️ 图片尺寸: {input_img.shape}")
+                
+                # 按输出像素预算确定放大倍数，超大图片先缩小
+                upscale = None
+                if not (has_aligned or face_mode == 'face'):
+                    input_img, upscale = self.fit_output_budget(input_img, scale, max_output_pixels)
+                if image_key is not None:
+                    # 超出像素预算时输入会被缩小，关键点缓存键带上实际检测的尺寸
+                    image_key = f"{image_key}-{input_img.shape[1]}x{input_img.shape[0]}"
             
             # 处理图片
-            logger.info("🎨 开始GFPGAN处理...")
-            cropped_faces, restored_faces, restored_img = restorer.enhance(
-                input_img,
-                has_aligned=False,
-                only_center_face=False,
-                paste_back=True,
-                weight=0.5
+            restored_img, num_faces, path = self._restore(
+                input_img, tile_size, stages, quality_level, face_mode, only_center_face, has_aligned, upscale,
+                noise_mode, image_key
             )
             
-            # 保存结果
-            if restored_img is not None:
-                cv2.imwrite(output_path, restored_img)
-                logger.info(f"💾 处理完成，保存到: {output_path}")
-                return True
-            else:
-                raise ValueError("图片处理失败，未生成结果")
+            # 内存中编码，只在需要结果文件时写入磁盘
+            with stages('encode'):
+                encoded = encode_image(restored_img, output_format, output_quality, settings.OUTPUT_PNG_COMPRESSION)
+            if output_path is not None:
+                with stages('write'):
+                    with open(output_path, 'wb') as f:
+                        f.write(encoded.data)
+            timings = {stage: round(seconds, 4) for stage, seconds in stages.timings.items()}
+            logger.info(f"💾 处理完成，{output_format} {len(encoded) / 1024:.0f}KB，保存到: {output_path or '内存'}，"
+                        f"阶段耗时: " + ", ".join(f"{k}={v * 1000:.0f}ms" for k, v in timings.items()))
+            return EnhanceResult(encoded, timings, num_faces, path, upscale,
+                                 (restored_img.shape[1], restored_img.shape[0]))
                 
         except Exception as e:
             logger.error(f"❌ 图片处理失败: {str(e)}")
             raise e
     
+    def fit_output_budget(self, input_img: np.ndarray, scale: Optional[int] = None,
+                          max_output_pixels: Optional[int] = None):
+        """确定不超过输出像素预算的放大倍数，返回 (输入图片或缩小后的输入, 放大倍数)"""
+        from gfpgan.utils import fit_upscale
+        
+        budget = settings.MAX_OUTPUT_PIXELS
+        if max_output_pixels:
+            budget = min(budget, max_output_pixels) if budget else max_output_pixels
+        requested = scale or settings.DEFAULT_UPSCALE
+        h, w = input_img.shape[:2]
+        upscale, ratio = fit_upscale(h, w, requested, budget)
+        if ratio < 1:
+            size = (max(1, int(w * ratio)), max(1, int(h * ratio)))
+            input_img = cv2.resize(input_img, size, interpolation=cv2.INTER_AREA)
+            logger.info(f"📐 输出超出像素预算 {budget / 1e6:.1f}MP，输入先缩小到 {size[0]}x{size[1]}")
+        if upscale != requested:
+            logger.info(f"📐 放大倍数 {requested}x → {upscale}x (输出像素预算 {budget / 1e6:.1f}MP)")
+        return input_img, upscale
+    
+    def enhance_array_sync(self, input_img: np.ndarray, tile_size: int = 400) -> np.ndarray:
+        """处理已解码的图片数组并返回增强结果（阻塞调用）"""
+        return self._restore(input_img, tile_size, StageTimer())[0]
+    
+    def _restore(self, input_img: np.ndarray, tile_size: int, stages: StageTimer, quality_level: str = 'high',
+                 face_mode: str = 'full', only_center_face: bool = False, has_aligned: bool = False,
+                 upscale: Optional[int] = None, noise_mode: Optional[str] = None, image_key: Optional[str] = None):
+        """人脸修复 + 背景超分，返回 (增强结果, 人脸数, 处理路径)；upscale 为None时使用模型默认放大倍数"""
+        self.load_models()
+        noise_mode = noise_mode or settings.NOISE_MODE
+        face_precision = self.face_precision(quality_level)
+        if has_aligned or face_mode == 'face':
+            # 只输出修复后的人脸：跳过背景处理与贴回
+            logger.info(f"🎨 开始GFPGAN人脸修复... ({'已对齐人脸' if has_aligned else '仅人脸'})")
+            cropped_faces, restored_faces, _ = self.restorer.enhance(
+                input_img,
+                has_aligned=has_aligned,
+                only_center_face=True,
+                paste_back=False,
+                weight=0.5,
+                timings=stages.timings,
+                progress_callback=stages.callback,
+                noise_mode=noise_mode,
+                face_precision=face_precision,
+                image_key=image_key
+            )
+            if not restored_faces:
+                raise ValueError("未检测到人脸，无法使用仅人脸模式")
+            return restored_faces[0], len(cropped_faces), 'aligned' if has_aligned else 'face'
+        
+        bg_upsampler = self.get_bg_upsampler(quality_level)
+        logger.info(f"🎨 开始GFPGAN处理... (quality_level={quality_level}, face_mode={face_mode}, "
+                    f"upscale={upscale or self.upscale}x, noise_mode={noise_mode}, face_precision={face_precision})")
+        details = {}
+        cropped_faces, restored_faces, restored_img = self.restorer.enhance(
+            input_img,
+            has_aligned=False,
+            only_center_face=only_center_face,
+            paste_back=True,
+            weight=0.5,
+            timings=stages.timings,
+            progress_callback=stages.callback,
+            bg_tile=tile_size,
+            bg_upsampler=bg_upsampler,
+            portrait_ratio=settings.PORTRAIT_FACE_RATIO if face_mode == 'auto' else None,
+            details=details,
+            upscale=upscale,
+            noise_mode=noise_mode,
+            face_precision=face_precision,
+            image_key=image_key
+        )
+        if restored_img is None:
+            raise ValueError("图片处理失败，未生成结果")
+        path = 'portrait' if bg_upsampler is not None and details.get('background') == 'resize' else 'full'
+        if path == 'portrait':
+            logger.info(f"👤 人像特写 (人脸占比 {details['face_area_ratio']:.0%})，背景使用插值放大")
+        return restored_img, len(cropped_faces), path
+    
+    async def enhance_image(self, input_source: Union[str, bytes, bytearray], output_path: Optional[str],
+                            tile_size: int = 400,
+                            output_format: str = 'jpeg', output_quality: int = 95, quality_level: str = 'high',
+                            face_mode: str = 'full', only_center_face: bool = False, has_aligned: bool = False,
+                            scale: Optional[int] = None, max_output_pixels: Optional[int] = None,
+                            noise_mode: Optional[str] = None, image_key: Optional[str] = None,
+                            task_id: Optional[str] = None,
+                            on_progress: Optional[Callable[[str, float], None]] = None
+                            ) -> EnhanceResult:
+        """使用常驻模型处理图片（提交到推理执行器，不阻塞事件循环）
+
+        传入 task_id 与 on_progress 时，on_progress(stage, fraction) 在事件循环中被调用
+        """
+        await self.initialize()
+        reporter = None
+        if task_id is not None and on_progress is not None:
+            self.progress_hub.subscribe(task_id, on_progress)
+            reporter = ProgressReporter(task_id)
+        try:
+            options = {
+                'tile_size': tile_size,
+                'output_format': output_format,
+                'output_quality': output_quality,
+                'quality_level': quality_level,
+                'face_mode': face_mode,
+                'only_center_face': only_center_face,
+                'has_aligned': has_aligned,
+                'scale': scale,
+                'max_output_pixels': max_output_pixels,
+                'noise_mode': noise_mode,
+                'image_key': image_key
+            }
+            if self.executor.mode != 'process' or isinstance(input_source, str):
+                return await self.executor.run(_enhance_image_job, input_source, output_path, options, reporter)
+            
+            # 进程池模式下上传数据与编码结果都经共享内存传递，只pickle缓冲区描述符
+            in_buf = SharedImageBuffer.from_array(np.frombuffer(input_source, dtype=np.uint8))
+            try:
+                result, out_buf = await self.executor.run(
+                    _enhance_shared_image_job, in_buf, output_path, options, reporter
+                )
+            finally:
+                in_buf.release()
+            try:
+                result.encoded.data = out_buf.to_array().tobytes()
+            finally:
+                out_buf.release()
+            return result
+        finally:
+            if reporter is not None:
+                self.progress_hub.unsubscribe(task_id)
+    
+    async def enhance_array(self, input_img: np.ndarray, tile_size: int = 400) -> np.ndarray:
+        """处理已解码的图片数组（提交到推理执行器）
+
+        进程池模式下输入/输出图片通过共享内存传递，只pickle缓冲区描述符
+        """
+        await self.initialize()
+        if self.executor.mode != 'process':
+            return await self.executor.run(_enhance_array_job, input_img, tile_size)
+        
+        h, w = input_img.shape[:2]
+        in_buf = SharedImageBuffer.from_array(input_img)
+        out_buf = SharedImageBuffer.allocate((int(h * self.upscale), int(w * self.upscale), 3), np.uint8)
+        try:
+            fallback = await self.executor.run(_enhance_shared_job, in_buf, out_buf, tile_size)
+            # 输出形状与预分配不一致时（如非8位图片）由工作进程直接返回数组
+            return fallback if fallback is not None else out_buf.to_array()
+        finally:
+            in_buf.release()
+            out_buf.release()
+    
+    async def warmup(self) -> List[Dict[str, Any]]:
+        """在推理执行器中预热模型并返回预热报告
+
+        进程池模式下只在其中一个工作进程中执行（各工作进程启动时已完成编译与预热），报告同时保存在主进程中
+        """
+        await self.initialize()
+        self.warmup_report = await self.executor.run(_warmup_job)
+        return self.warmup_report
+    
+    def shutdown(self):
+        """关闭推理执行器"""
+        self.executor.shutdown(wait=False)
+        self.progress_hub.close()
+    
+    def get_batching_stats(self):
+        """获取人脸动态批处理指标（batch大小分布、排队延迟）
+
+        process 模式下推理在工作进程中运行，主进程的计数始终为空，不返回
+        """
+        if self.executor.mode == 'process' or self.restorer is None or self.restorer.face_batcher is None:
+            return None
+        return self.restorer.face_batcher.get_stats()
+    
+    def get_gpu_memory(self):
+        """当前进程各GPU的显存占用（字节）：[(设备号, 已分配, 已保留)]"""
+        if not torch.cuda.is_available():
+            return []
+        return [
+            (device, torch.cuda.memory_allocated(device), torch.cuda.memory_reserved(device))
+            for device in range(torch.cuda.device_count())
+        ]
+    
+    def get_landmark_cache_stats(self):
+        """获取人脸关键点缓存命中率（process 模式下同样不返回主进程的空计数）"""
+        if self.executor.mode == 'process' or self.restorer is None or self.restorer.landmark_cache is None:
+            return None
+        return self.restorer.landmark_cache.get_stats()
+    
     def get_model_info(self):
         """获取模型信息"""
         return {
             "initialized": self._initialized,
-            "has_bg_upsampler": self.bg_upsampler is not None,
+            "bg_upsamplers": sorted(self.bg_upsamplers),
             "has_restorer": self.restorer is not None,
             "cuda_available": torch.cuda.is_available(),
-            "device": str(torch.device('cuda' if torch.cuda.is_available() else 'cpu'))
+            "device": str(torch.device('cuda' if torch.cuda.is_available() else 'cpu')),
+            "executor": self.executor.get_stats(),
+            "memory": {
+                "main_process": read_process_memory(os.getpid()),
+                "workers": self.executor.get_worker_memory() if self.executor.mode == 'process' else []
+            },
+            "face_batching": self.get_batching_stats(),
+            "landmark_cache": self.get_landmark_cache_stats(),
+            "face_backend": settings.FACE_BACKEND,
+            "face_precision": {q: self.face_precision(q) for q in QUALITY_BG_MODELS},
+            "compile_mode": settings.COMPILE_MODE,
+            "warmup": self.warmup_report
         }
 
+# 推理执行器中运行的任务函数（模块级函数，process模式下可被pickle）
+def _worker_initialize(progress_queue=None):
+    """进程池工作进程启动时准备模型"""
+    if progress_queue is not None:
+        install_queue_sink(progress_queue)
+    model_manager.prepare_worker()
+
+def _load_models_job():
+    model_manager.load_models()
+    return model_manager.warmup_report
+
+def _warmup_job():
+    return model_manager.warmup_models()
+
+def _enhance_image_job(input_source, output_path: Optional[str], options: Dict[str, Any],
+                       progress: Optional[ProgressReporter] = None):
+    return model_manager.enhance_image_sync(input_source, output_path, progress=progress, **options)
+
+def _enhance_shared_image_job(in_buf: SharedImageBuffer, output_path: Optional[str], options: Dict[str, Any],
+                              progress: Optional[ProgressReporter] = None):
+    """在工作进程中直接解码共享内存中的上传数据，编码结果写入新的共享内存，由主进程拷贝后释放"""
+    input_data = in_buf.ndarray()
+    try:
+        result = model_manager.enhance_image_sync(input_data, output_path, progress=progress, **options)
+    finally:
+        del input_data
+        in_buf.close()
+    out_buf = SharedImageBuffer.from_array(np.frombuffer(result.encoded.data, dtype=np.uint8))
+    out_buf.close()
+    result.encoded.data = b''
+    return result, out_buf
+
+def _enhance_array_job(input_img: np.ndarray, tile_size: int):
+    return model_manager.enhance_array_sync(input_img, tile_size)
+
+def _enhance_shared_job(in_buf: SharedImageBuffer, out_buf: SharedImageBuffer, tile_size: int):
+    """在工作进程中直接读写共享内存中的图片"""
+    input_img = in_buf.ndarray()
+    try:
+        restored_img = model_manager.enhance_array_sync(input_img, tile_size)
+    finally:
+        del input_img
+        in_buf.close()
+    output_view = out_buf.ndarray()
+    try:
+        if output_view.shape == restored_img.shape and output_view.dtype == restored_img.dtype:
+            output_view[...] = restored_img
+            return None
+        return restored_img
+    finally:
+        del output_view
+        out_buf.close()
+
 # 全局模型管理器实例
 model_manager = ModelManager()
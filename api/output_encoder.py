@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Output Encoder
+结果图片在内存中编码为 JPEG/PNG/WebP，并统计各格式的编码耗时与输出字节数
+"""
+
+import hashlib
+import threading
+import time
+from typing import Dict
+
+import cv2
+import numpy as np
+
+# 支持的输出格式: 扩展名与 Content-Type
+OUTPUT_FORMATS = {
+    'jpeg': {'extension': '.jpg', 'media_type': 'image/jpeg'},
+    'png': {'extension': '.png', 'media_type': 'image/png'},
+    'webp': {'extension': '.webp', 'media_type': 'image/webp'},
+}
+
+
+class EncodedImage:
+    """编码后的结果图片（可pickle，进程池模式下从工作进程返回）"""
+
+    __slots__ = ('data', 'format', 'etag', 'encode_time')
+
+    def __init__(self, data: bytes, format: str, etag: str, encode_time: float = 0.0):
+        self.data = data
+        self.format = format
+        self.etag = etag
+        self.encode_time = encode_time
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def media_type(self) -> str:
+        return OUTPUT_FORMATS[self.format]['media_type']
+
+    @property
+    def extension(self) -> str:
+        return OUTPUT_FORMATS[self.format]['extension']
+
+
+def compute_etag(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def encode_params(output_format: str, quality: int, png_compression: int = 3) -> list:
+    """cv2.imencode 参数：JPEG/WebP 使用 quality(1-100)，PNG 为无损格式，使用压缩级别(0-9)"""
+    if output_format == 'jpeg':
+        return [cv2.IMWRITE_JPEG_QUALITY, int(quality)]
+    if output_format == 'webp':
+        return [cv2.IMWRITE_WEBP_QUALITY, int(quality)]
+    if output_format == 'png':
+        return [cv2.IMWRITE_PNG_COMPRESSION, int(png_compression)]
+    raise ValueError(f"不支持的输出格式: {output_format} (可选: {', '.join(OUTPUT_FORMATS)})")
+
+
+def encode_image(img: np.ndarray, output_format: str = 'jpeg', quality: int = 95,
+                 png_compression: int = 3) -> EncodedImage:
+    """在内存中编码图片，不经过临时文件"""
+    params = encode_params(output_format, quality, png_compression)
+    start = time.perf_counter()
+    ok, buffer = cv2.imencode(OUTPUT_FORMATS[output_format]['extension'], img, params)
+    if not ok:
+        raise ValueError(f"图片编码失败: {output_format}")
+    data = buffer.tobytes()
+    encode_time = time.perf_counter() - start
+    return EncodedImage(data, output_format, compute_etag(data), encode_time)
+
+
+class EncoderStats:
+    """各输出格式的编码耗时、编码后大小与实际发送字节数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._formats: Dict[str, Dict[str, float]] = {
+            fmt: {'images': 0, 'bytes': 0, 'encode_time': 0.0, 'bytes_served': 0} for fmt in OUTPUT_FORMATS
+        }
+
+    def record_encode(self, encoded: EncodedImage):
+        with self._lock:
+            stats = self._formats[encoded.format]
+            stats['images'] += 1
+            stats['bytes'] += len(encoded)
+            stats['encode_time'] += encoded.encode_time
+
+    def record_served(self, output_format: str, num_bytes: int):
+        with self._lock:
+            self._formats[output_format]['bytes_served'] += num_bytes
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                fmt: {
+                    'images': int(stats['images']),
+                    'avg_size_kb': round(stats['bytes'] / stats['images'] / 1024, 1) if stats['images'] else 0.0,
+                    'avg_encode_ms': round(stats['encode_time'] / stats['images'] * 1000, 1) if stats['images'] else 0.0,
+                    'bytes_served_mb': round(stats['bytes_served'] / 1024 / 1024, 2)
+                }
+                for fmt, stats in self._formats.items()
+            }
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Pipeline Progress
+推理流水线的分阶段进度上报：工作线程/进程中调用 ProgressReporter(stage, fraction)，
+主进程的 ProgressHub 把进度转交到事件循环，由订阅该任务的回调更新任务状态
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 流水线阶段及其在总进度中的占比（按CPU上的典型耗时估计）
+PIPELINE_STAGES = (
+    ('decode', 0.02),
+    ('detect', 0.10),
+    ('align', 0.03),
+    ('restore', 0.25),
+    ('background', 0.45),
+    ('paste', 0.10),
+    ('encode', 0.04),
+    ('write', 0.01),
+)
+
+STAGE_MESSAGES = {
+    'decode': '解码图片',
+    'detect': '人脸检测 (RetinaFace)',
+    'align': '人脸对齐',
+    'restore': 'GFPGAN人脸修复',
+    'background': 'RealESRGAN背景超分辨率',
+    'paste': '人脸贴回',
+    'encode': '编码输出图片',
+    'write': '保存结果',
+}
+
+_STAGE_START: Dict[str, float] = {}
+_STAGE_WEIGHT: Dict[str, float] = {}
+_offset = 0.0
+for _name, _weight in PIPELINE_STAGES:
+    _STAGE_START[_name] = _offset
+    _STAGE_WEIGHT[_name] = _weight
+    _offset += _weight
+
+
+def overall_progress(stage: str, fraction: float) -> float:
+    """阶段内进度 → 整条流水线的进度 (0-1)"""
+    if stage not in _STAGE_START:
+        return 0.0
+    return min(1.0, _STAGE_START[stage] + _STAGE_WEIGHT[stage] * max(0.0, min(1.0, fraction)))
+
+
+# 当前进程中进度的去向：主进程为 ProgressHub，进程池工作进程为跨进程队列
+_sink: Optional[Callable[[str, str, float], None]] = None
+
+
+def install_queue_sink(queue):
+    """进程池工作进程初始化时调用，进度通过队列发回主进程"""
+    global _sink
+    _sink = lambda task_id, stage, fraction: queue.put_nowait((task_id, stage, fraction))
+
+
+class ProgressReporter:
+    """可pickle的进度回调，随推理任务一起提交到线程池/进程池"""
+
+    __slots__ = ('task_id',)
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+
+    def __call__(self, stage: str, fraction: float):
+        if _sink is not None:
+            try:
+                _sink(self.task_id, stage, fraction)
+            except Exception:  # 进度上报失败不影响推理
+                pass
+
+
+class ProgressHub:
+    """主进程中的进度分发器"""
+
+    def __init__(self, queue=None):
+        self._queue = queue
+        self._listeners: Dict[str, Callable[[str, float], None]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pump_thread: Optional[threading.Thread] = None
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """绑定事件循环；进程池模式下启动从队列读取进度的线程"""
+        global _sink
+        if self._loop is not None:
+            return
+        self._loop = loop
+        _sink = self._from_thread
+        if self._queue is not None:
+            self._pump_thread = threading.Thread(target=self._pump, name='progress-pump', daemon=True)
+            self._pump_thread.start()
+
+    def subscribe(self, task_id: str, listener: Callable[[str, float], None]):
+        self._listeners[task_id] = listener
+
+    def unsubscribe(self, task_id: str):
+        self._listeners.pop(task_id, None)
+
+    def _from_thread(self, task_id: str, stage: str, fraction: float):
+        if self._loop is not None and task_id in self._listeners:
+            self._loop.call_soon_threadsafe(self._dispatch, task_id, stage, fraction)
+
+    def _dispatch(self, task_id: str, stage: str, fraction: float):
+        listener = self._listeners.get(task_id)
+        if listener is None:
+            return
+        try:
+            listener(stage, fraction)
+        except Exception as e:
+            logger.warning(f"⚠️ 进度回调执行失败 {task_id}: {e}")
+
+    def _pump(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._from_thread(*item)
+
+    def close(self):
+        if self._pump_thread is not None:
+            self._queue.put(None)
+            self._pump_thread.join(timeout=5)
+            self._pump_thread = None
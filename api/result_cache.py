@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Result Cache
+内容寻址的结果缓存：以 图片内容哈希 + 增强参数 + 模型版本 为键，磁盘存储，按总大小LRU淘汰，
+并对正在处理中的相同请求去重（共享同一次推理）
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def link_or_copy(src: Path, dst: Path):
+    """优先硬链接（零拷贝，且不受缓存淘汰影响），跨文件系统时回退为复制"""
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+class ResultCache:
+    """磁盘结果缓存（LRU，按总字节数限制）"""
+
+    def __init__(self, cache_dir: str, max_bytes: int, suffix: str = '.bin'):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> 文件大小，按最近使用排序
+        self._total_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.dedup_hits = 0
+        self.evictions = 0
+        self._load_index()
+
+    @staticmethod
+    def make_key(content_digest: str, **params) -> str:
+        """缓存键 = sha256(图片字节的sha256 + 排序后的参数)，图片哈希在接收上传时流式计算"""
+        digest = hashlib.sha256(content_digest.encode('utf-8'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{self.suffix}"
+
+    def _load_index(self):
+        """启动时扫描缓存目录，按修改时间恢复LRU顺序"""
+        files = sorted(self.cache_dir.glob(f"*/*{self.suffix}"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+        if files:
+            logger.info(f"🗃️ 结果缓存已加载: {len(files)} 项, {self._total_bytes / 1024 / 1024:.1f}MB")
+
+    def get(self, key: str) -> Optional[Path]:
+        """查找缓存结果，命中时更新LRU顺序"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            if not path.exists():
+                self._total_bytes -= self._entries.pop(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # 持久化最近使用时间，重启后LRU顺序不变
+        os.utime(path)
+        return path
+
+    def put(self, key: str, src_path: Path) -> Path:
+        """将结果文件加入缓存，超出容量时淘汰最久未使用的条目"""
+        path = self._path(key)
+        link_or_copy(Path(src_path), path)
+        size = path.stat().st_size
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)
+            self._entries[key] = size
+            self._total_bytes += size
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._total_bytes -= old_size
+                evicted.append(old_key)
+            self.evictions += len(evicted)
+        for old_key in evicted:
+            self._path(old_key).unlink(missing_ok=True)
+        return path
+
+    # ---- 处理中请求去重 ----
+    def inflight(self, key: str) -> Optional[asyncio.Future]:
+        """相同请求正在处理时返回其结果Future"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.dedup_hits += 1
+        return future
+
+    def begin(self, key: str):
+        """登记一个正在处理的请求"""
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+
+    def finish(self, key: str, result_path: Optional[Path] = None, error: Optional[str] = None):
+        """处理结束，通知所有等待相同结果的请求"""
+        future = self._inflight.pop(key, None)
+        if future is None or future.done():
+            return
+        if result_path is not None:
+            future.set_result(result_path)
+        else:
+            future.set_exception(RuntimeError(error or "处理失败"))
+            # 没有等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "size_mb": round(self._total_bytes / 1024 / 1024, 1),
+                "max_size_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "dedup_hits": self.dedup_hits,
+                "inflight": len(self._inflight),
+                "evictions": self.evictions
+            }
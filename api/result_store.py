@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Result Store
+内存中保存最近完成任务的编码结果，下载时直接返回字节（支持 ETag / If-None-Match 与 Range 断点续传），
+超出容量或服务重启后回退为读取磁盘上的结果文件；尚未写入磁盘的结果在被淘汰时由调用方写入
+"""
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi.responses import Response
+
+from output_encoder import EncodedImage
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ResultStore:
+    """按总字节数限制的内存结果存储（LRU）
+
+    put 时传入 spill_path 表示该结果还没有写入磁盘：被淘汰（或超过容量无法放入）时 put 返回
+    (task_id, spill_path, 数据)，调用方写入文件后调用 spilled(task_id)，在此之前 get 仍能取到该结果。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._results: "OrderedDict[str, EncodedImage]" = OrderedDict()
+        self._spill_paths: Dict[str, str] = {}
+        # 已淘汰、正在写入磁盘的结果
+        self._spilling: Dict[str, EncodedImage] = {}
+        self._total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, task_id: str, encoded: EncodedImage,
+            spill_path: Optional[str] = None) -> List[Tuple[str, str, bytes]]:
+        """保存编码结果，返回需要由调用方写入磁盘的 (task_id, 路径, 数据)"""
+        with self._lock:
+            self._pop(task_id)
+            if len(encoded) > self.max_bytes:
+                if spill_path is None:
+                    return []
+                self._spilling[task_id] = encoded
+                return [(task_id, spill_path, encoded.data)]
+            self._results[task_id] = encoded
+            if spill_path is not None:
+                self._spill_paths[task_id] = spill_path
+            self._total_bytes += len(encoded)
+            spills = []
+            while self._total_bytes > self.max_bytes:
+                evicted_id, evicted = self._results.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                path = self._spill_paths.pop(evicted_id, None)
+                if path is not None:
+                    self._spilling[evicted_id] = evicted
+                    spills.append((evicted_id, path, evicted.data))
+            return spills
+
+    def spilled(self, task_id: str):
+        """结果已写入磁盘：淘汰后从结果文件读取，不再重复写入"""
+        with self._lock:
+            self._spilling.pop(task_id, None)
+            self._spill_paths.pop(task_id, None)
+
+    def unwritten(self) -> List[Tuple[str, str, bytes]]:
+        """仍只保存在内存中、尚未写入磁盘的结果 (task_id, 路径, 数据)，服务关闭时由调用方写入"""
+        with self._lock:
+            return [(task_id, path, self._results[task_id].data) for task_id, path in self._spill_paths.items()]
+
+    def get(self, task_id: str) -> Optional[EncodedImage]:
+        with self._lock:
+            encoded = self._results.get(task_id)
+            if encoded is None:
+                encoded = self._spilling.get(task_id)
+                if encoded is None:
+                    self.misses += 1
+                    return None
+            else:
+                self._results.move_to_end(task_id)
+            self.hits += 1
+            return encoded
+
+    def pop(self, task_id: str):
+        with self._lock:
+            self._pop(task_id)
+
+    def _pop(self, task_id: str):
+        encoded = self._results.pop(task_id, None)
+        if encoded is not None:
+            self._total_bytes -= len(encoded)
+        self._spill_paths.pop(task_id, None)
+        self._spilling.pop(task_id, None)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._results),
+                "size_mb": round(self._total_bytes / 1024 / 1024, 1),
+                "max_size_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def parse_range(range_header: Optional[str], size: int):
+    """解析单段 Range 头，返回 (start, end)（含end）；无Range或多段Range返回None，不可满足时抛出ValueError"""
+    if not range_header:
+        return None
+    match = _RANGE_RE.match(range_header.strip())
+    if match is None:
+        return None
+    start, end = match.groups()
+    if start == '':
+        # bytes=-N：最后N个字节
+        if end == '' or int(end) == 0:
+            raise ValueError(range_header)
+        return max(0, size - int(end)), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(range_header)
+    return start, end
+
+
+def bytes_response(data: bytes, media_type: str, etag: str, filename: str,
+                   range_header: Optional[str] = None, if_none_match: Optional[str] = None,
+                   if_range: Optional[str] = None) -> Response:
+    """返回内存中的结果字节，带 Content-Length、ETag，支持 304 与 206 部分内容"""
+    quoted_etag = f'"{etag}"'
+    headers = {
+        'ETag': quoted_etag,
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': 'private, max-age=3600',
+        'Content-Disposition': f"attachment; filename*=utf-8''{quote(filename)}"
+    }
+    if if_none_match and quoted_etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers={'ETag': quoted_etag})
+
+    size = len(data)
+    # If-Range 与当前ETag不一致时忽略Range，返回完整内容
+    if if_range and if_range.strip() != quoted_etag:
+        range_header = None
+    try:
+        byte_range = parse_range(range_header, size)
+    except ValueError:
+        return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+    if byte_range is None:
+        return Response(content=data, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return Response(content=data[start:end + 1], status_code=206,
+                    media_type=media_type, headers=headers)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Shared Image Buffers
+基于共享内存的图像缓冲区，进程池推理时只传递缓冲区描述符，不pickle像素数据
+"""
+
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class SharedImageBuffer:
+    """共享内存图像缓冲区
+
+    主进程负责创建和释放(release)；工作进程按名称附加(ndarray)后原地读写。
+    pickle时只包含名称、形状和数据类型。
+    """
+    
+    def __init__(self, shape: Tuple[int, ...], dtype=np.uint8, name: Optional[str] = None):
+        self.shape = tuple(int(v) for v in shape)
+        self.dtype = np.dtype(dtype).str
+        self.name = name
+        self._shm: Optional[shared_memory.SharedMemory] = None
+    
+    @classmethod
+    def allocate(cls, shape: Tuple[int, ...], dtype=np.uint8) -> 'SharedImageBuffer':
+        """创建指定形状的共享内存缓冲区"""
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        buffer = cls(shape, dtype, shm.name)
+        buffer._shm = shm
+        return buffer
+    
+    @classmethod
+    def from_array(cls, array: np.ndarray) -> 'SharedImageBuffer':
+        """创建缓冲区并拷贝数组内容"""
+        buffer = cls.allocate(array.shape, array.dtype)
+        view = buffer.ndarray()
+        view[...] = array
+        del view
+        return buffer
+    
+    def ndarray(self) -> np.ndarray:
+        """返回映射到共享内存的数组视图（零拷贝）"""
+        if self._shm is None:
+            self._shm = shared_memory.SharedMemory(name=self.name)
+        return np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+    
+    def to_array(self) -> np.ndarray:
+        """拷贝出缓冲区内容，之后可安全释放缓冲区"""
+        view = self.ndarray()
+        array = np.array(view, copy=True)
+        del view
+        return array
+    
+    def close(self):
+        """解除当前进程的映射"""
+        if self._shm is not None:
+            try:
+                self._shm.close()
+            except BufferError:
+                # 仍有数组视图引用该内存，映射在视图被回收后释放
+                pass
+            self._shm = None
+    
+    def release(self):
+        """解除映射并删除共享内存（仅由创建方调用）"""
+        shm = self._shm or shared_memory.SharedMemory(name=self.name)
+        self._shm = shm
+        self.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+    
+    def __getstate__(self):
+        return {'shape': self.shape, 'dtype': self.dtype, 'name': self.name}
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = None
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Task Events
+任务状态推送：任务存储的每次写入都会发布到对应任务(及所属批量任务)的频道，
+客户端通过 Server-Sent Events 订阅，状态变化和结果地址即时送达，无需轮询
+"""
+
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+# SSE 心跳间隔（秒），防止代理因空闲断开连接
+HEARTBEAT_INTERVAL = 15.0
+
+
+class TaskEventBus:
+    """进程内发布/订阅：每个订阅者一个 asyncio.Queue，频道为 task_id 或 batch_task_id"""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self.published = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """绑定事件循环；其他线程中发布的事件会转交给该循环投递"""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def subscribe(self, channel: str) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers[channel].add(queue)
+        return queue
+
+    def unsubscribe(self, channel: str, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(queue)
+        if not subscribers:
+            del self._subscribers[channel]
+
+    def publish(self, channel: str, event: str, data: Dict[str, Any]):
+        if channel not in self._subscribers:
+            return
+        if self._loop is not None and threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self._deliver, channel, event, data)
+        else:
+            self._deliver(channel, event, data)
+
+    def _deliver(self, channel: str, event: str, data: Dict[str, Any]):
+        for queue in list(self._subscribers.get(channel, ())):
+            queue.put_nowait((event, data))
+            self.published += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "channels": len(self._subscribers),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "published": self.published
+        }
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Task Store
+可插拔的任务存储：内存后端(memory)与嵌入式SQLite后端(sqlite, WAL模式，重启后任务不丢失)
+"""
+
+import abc
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 任务处于这些状态时不会被TTL清理
+ACTIVE_STATUSES = ('queued', 'processing')
+
+
+class TaskStore(abc.ABC):
+    """任务存储接口
+
+    任务以字典形式保存，必须包含 task_id 字段名（由 id_field 指定）、status、created_at、updated_at。
+    状态计数器在写入时增量维护，count_by_status() 为 O(1)。
+    每次 create/update 后以完整任务字典调用已注册的监听器（用于状态推送）。
+    persistent 表示任务在重启后仍然存在，此时排队任务的输入需要落盘才能在重启后重新处理。
+    """
+
+    persistent = False
+
+    def __init__(self, id_field: str = 'task_id'):
+        self.id_field = id_field
+        self._status_index: Dict[str, str] = {}
+        self._status_counts: Counter = Counter()
+        self._counter_lock = threading.Lock()
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+    # ---- 子类实现 ----
+    @abc.abstractmethod
+    def _insert(self, task: Dict[str, Any]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def _update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def _delete(self, task_ids: Iterable[str]) -> None:
+        ...
+
+    @abc.abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def list(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def find_by_status(self, statuses: Iterable[str]) -> List[Dict[str, Any]]:
+        ...
+
+    @abc.abstractmethod
+    def find_expired(self, created_before: float) -> List[Dict[str, Any]]:
+        ...
+
+    # ---- 公共接口 ----
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._status_index
+
+    def __len__(self) -> int:
+        return len(self._status_index)
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]):
+        """注册任务写入监听器"""
+        self._listeners.append(listener)
+
+    def create(self, task: Dict[str, Any]) -> None:
+        """新建任务"""
+        self._insert(task)
+        self._track(task[self.id_field], task['status'])
+        self._notify(task)
+
+    def update(self, task_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """更新任务字段，返回更新后的任务（不存在时返回None）"""
+        task = self._update(task_id, fields)
+        if task is not None:
+            if 'status' in fields:
+                self._track(task_id, fields['status'])
+            self._notify(task)
+        return task
+
+    def _notify(self, task: Dict[str, Any]):
+        for listener in self._listeners:
+            try:
+                listener(task)
+            except Exception as e:
+                logger.warning(f"⚠️ 任务监听器执行失败: {e}")
+
+    def delete(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """删除任务，返回被删除的任务"""
+        task = self.get(task_id)
+        if task is not None:
+            self._delete([task_id])
+            self._untrack([task_id])
+        return task
+
+    def expire(self, ttl_seconds: float) -> List[Dict[str, Any]]:
+        """删除创建时间超过TTL且不在处理中的任务，返回被删除的任务（由调用方清理临时文件）"""
+        expired = [t for t in self.find_expired(time.time() - ttl_seconds) if t['status'] not in ACTIVE_STATUSES]
+        if expired:
+            task_ids = [t[self.id_field] for t in expired]
+            self._delete(task_ids)
+            self._untrack(task_ids)
+        return expired
+
+    def count_by_status(self) -> Dict[str, int]:
+        """各状态的任务数量（增量维护，不扫描存储）"""
+        with self._counter_lock:
+            return {status: count for status, count in self._status_counts.items() if count > 0}
+
+    def _track(self, task_id: str, status: str):
+        with self._counter_lock:
+            previous = self._status_index.get(task_id)
+            if previous == status:
+                return
+            if previous is not None:
+                self._status_counts[previous] -= 1
+            self._status_index[task_id] = status
+            self._status_counts[status] += 1
+
+    def _untrack(self, task_ids: Iterable[str]):
+        with self._counter_lock:
+            for task_id in task_ids:
+                previous = self._status_index.pop(task_id, None)
+                if previous is not None:
+                    self._status_counts[previous] -= 1
+
+    def close(self):
+        pass
+
+
+class MemoryTaskStore(TaskStore):
+    """内存任务存储（重启后丢失，用于开发调试）"""
+
+    def __init__(self, id_field: str = 'task_id'):
+        super().__init__(id_field)
+        self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _insert(self, task):
+        with self._lock:
+            self._tasks[task[self.id_field]] = dict(task)
+
+    def _update(self, task_id, fields):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            if task is None:
+                return None
+            task.update(fields)
+            return dict(task)
+
+    def _delete(self, task_ids):
+        with self._lock:
+            for task_id in task_ids:
+                self._tasks.pop(task_id, None)
+
+    def get(self, task_id):
+        with self._lock:
+            task = self._tasks.get(task_id)
+            return dict(task) if task is not None else None
+
+    def list(self, limit=None):
+        with self._lock:
+            tasks = sorted(self._tasks.values(), key=lambda t: t['created_at'], reverse=True)
+            return [dict(t) for t in tasks[:limit]]
+
+    def find_by_status(self, statuses):
+        statuses = set(statuses)
+        with self._lock:
+            return [dict(t) for t in self._tasks.values() if t['status'] in statuses]
+
+    def find_expired(self, created_before):
+        with self._lock:
+            return [dict(t) for t in self._tasks.values() if t['created_at'] < created_before]
+
+
+class SQLiteTaskStore(TaskStore):
+    """SQLite任务存储（WAL模式），按status与created_at建立索引"""
+
+    persistent = True
+
+    def __init__(self, db_path: str, table: str, id_field: str = 'task_id'):
+        super().__init__(id_field)
+        Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.db_path = db_path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_status ON {table}(status)")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_created_at ON {table}(created_at)")
+
+        # 启动时从数据库恢复状态索引与计数器
+        for task_id, status in self._conn.execute(f"SELECT task_id, status FROM {table}"):
+            self._track(task_id, status)
+        logger.info(f"🗄️ 任务存储已打开: {db_path} [{table}]，共 {len(self)} 个任务")
+
+    def _insert(self, task):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (task_id, status, created_at, updated_at, data) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task[self.id_field], task['status'], task['created_at'], task['updated_at'], json.dumps(task))
+            )
+
+    def _update(self, task_id, fields):
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            task = json.loads(row[0])
+            task.update(fields)
+            self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, updated_at = ?, data = ? WHERE task_id = ?",
+                (task['status'], task['updated_at'], json.dumps(task), task_id)
+            )
+            return task
+
+    def _delete(self, task_ids):
+        with self._lock:
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE task_id = ?", [(t,) for t in task_ids])
+
+    def get(self, task_id):
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE task_id = ?", (task_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def list(self, limit=None):
+        sql = f"SELECT data FROM {self.table} ORDER BY created_at DESC"
+        params: tuple = ()
+        if limit is not None:
+            sql += " LIMIT ?"
+            params = (limit,)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def find_by_status(self, statuses):
+        statuses = list(statuses)
+        placeholders = ', '.join('?' for _ in statuses)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM {self.table} WHERE status IN ({placeholders}) ORDER BY created_at", statuses
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def find_expired(self, created_before):
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM {self.table} WHERE created_at < ?", (created_before,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def create_task_store(backend: str, db_path: str, table: str, id_field: str = 'task_id') -> TaskStore:
+    """根据配置创建任务存储"""
+    if backend == 'sqlite':
+        return SQLiteTaskStore(db_path, table, id_field)
+    if backend == 'memory':
+        return MemoryTaskStore(id_field)
+    raise ValueError(f"不支持的任务存储后端: {backend} (可选: sqlite, memory)")
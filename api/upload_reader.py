@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Upload Reader
+流式接收上传图片：分块读取并同时计算内容哈希，小文件保留在内存中由 cv2.imdecode 直接解码，
+超过阈值的大文件边读边写入磁盘，任何时候都不会把整个大文件读入内存
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional, Union
+
+import aiofiles
+from fastapi import UploadFile
+
+logger = logging.getLogger(__name__)
+
+# 每次从上传流读取的块大小
+CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"上传文件超过 {max_bytes // 1024 // 1024}MB")
+        self.max_bytes = max_bytes
+
+
+class UploadedImage:
+    """接收完成的上传图片
+
+    data 为内存中的原始字节（bytearray，可零拷贝地交给 cv2.imdecode），path 为落盘后的文件路径；
+    超过阈值的文件只有 path，内存中的文件经 persist_upload 另存一份后两者都有，处理时仍直接解码内存字节。
+    digest 为原始字节的 sha256，用于结果缓存，无需保留原始字节。
+    """
+
+    __slots__ = ('data', 'path', 'size', 'digest')
+
+    def __init__(self, data: Optional[bytearray], path: Optional[Path], size: int, digest: str):
+        self.data = data
+        self.path = path
+        self.size = size
+        self.digest = digest
+
+    @property
+    def in_memory(self) -> bool:
+        return self.data is not None
+
+    @property
+    def source(self) -> Union[bytearray, str]:
+        """传给 ModelManager.enhance_image 的输入：内存字节或文件路径"""
+        return self.data if self.data is not None else str(self.path)
+
+
+async def receive_upload(file: UploadFile, spill_path: Path, spill_threshold: int, max_bytes: int) -> UploadedImage:
+    """分块读取上传文件
+
+    累计大小不超过 spill_threshold 时保留在内存中；一旦超过，把已读部分和后续分块依次写入
+    spill_path。spill_threshold 为 0 时总是落盘。超过 max_bytes 时删除已写入的文件并抛出 UploadTooLargeError。
+    """
+    digest = hashlib.sha256()
+    buffer = bytearray()
+    spill_file = None
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            digest.update(chunk)
+            if spill_file is None and size > spill_threshold:
+                spill_file = await aiofiles.open(spill_path, 'wb')
+                if buffer:
+                    await spill_file.write(buffer)
+                    buffer = bytearray()
+            if spill_file is not None:
+                await spill_file.write(chunk)
+            else:
+                buffer += chunk
+    except BaseException:
+        if spill_file is not None:
+            await spill_file.close()
+            spill_path.unlink(missing_ok=True)
+        raise
+
+    if spill_file is not None:
+        await spill_file.close()
+        return UploadedImage(None, spill_path, size, digest.hexdigest())
+    return UploadedImage(buffer, None, size, digest.hexdigest())
+
+
+async def persist_upload(upload: UploadedImage, path: Path) -> None:
+    """把保留在内存中的上传数据另存到 path（已落盘的上传不重复写入），任务重启后可从该文件重新处理"""
+    if upload.path is not None:
+        return
+    async with aiofiles.open(path, 'wb') as f:
+        await f.write(upload.data)
+    upload.path = path
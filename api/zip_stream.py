@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI Streaming ZIP
+边读结果文件边输出ZIP数据块，内存占用只与块大小有关，与批量大小无关；
+JPEG/PNG/WebP 已经是压缩格式，使用 STORED 直接存储，不再浪费CPU做 deflate
+"""
+
+import asyncio
+import io
+import time
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, List, Set
+
+# 每次读取结果文件的块大小
+CHUNK_SIZE = 1024 * 1024
+
+# 已压缩的格式直接存储
+STORED_SUFFIXES = {'.jpg', '.jpeg', '.png', '.webp', '.zip'}
+
+
+class _ChunkSink(io.RawIOBase):
+    """zipfile 的输出目标：收集写入的数据块，由调用方取走后发送（不可seek，zipfile会写数据描述符）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStreamWriter:
+    """流式生成ZIP文件"""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, mode='w', allowZip64=True)
+        self._names: Set[str] = set()
+
+    def _unique_name(self, arcname: str) -> str:
+        """同名文件追加序号，避免ZIP中出现重复条目"""
+        name, index = arcname, 1
+        while name in self._names:
+            path = Path(arcname)
+            name = f"{path.stem}({index}){path.suffix}"
+            index += 1
+        self._names.add(name)
+        return name
+
+    def _info(self, arcname: str, mtime: float, size: int) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(self._unique_name(arcname), time.localtime(mtime)[:6])
+        info.compress_type = (
+            zipfile.ZIP_STORED if Path(arcname).suffix.lower() in STORED_SUFFIXES else zipfile.ZIP_DEFLATED
+        )
+        info.file_size = size
+        return info
+
+    async def add_file(self, path: Path, arcname: str) -> AsyncIterator[bytes]:
+        """逐块写入一个文件，每块写完立即产出对应的ZIP数据"""
+        path = Path(path)
+        stat = path.stat()
+        info = self._info(arcname, stat.st_mtime, stat.st_size)
+
+        with open(path, 'rb') as src, self._zip.open(info, mode='w', force_zip64=info.file_size >= 2 ** 31) as dest:
+            while True:
+                chunk = await asyncio.to_thread(src.read, self.chunk_size)
+                if not chunk:
+                    break
+                dest.write(chunk)
+                data = self._sink.drain()
+                if data:
+                    yield data
+        # 数据描述符
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    async def add_bytes(self, content: bytes, arcname: str) -> AsyncIterator[bytes]:
+        """逐块写入内存中的文件内容（如内存结果存储中的编码结果）"""
+        info = self._info(arcname, time.time(), len(content))
+        view = memoryview(content)
+        with self._zip.open(info, mode='w', force_zip64=info.file_size >= 2 ** 31) as dest:
+            for start in range(0, len(view), self.chunk_size):
+                dest.write(view[start:start + self.chunk_size])
+                data = self._sink.drain()
+                if data:
+                    yield data
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def close(self) -> bytes:
+        """写入中央目录，返回最后的数据块"""
+        self._zip.close()
+        return self._sink.drain()
@@ -4,7 +4,23 @@ PhotoEnhanceAI Configuration Settings
 
 import os
 from pathlib import Path
-from typing import List
+from typing import Dict, List
+
+FACE_PRECISIONS = ('fp32', 'bf16', 'int8')
+
+def parse_face_precisions(value: str) -> Dict[str, str]:
+    """Parse QUALITY_FACE_PRECISION, e.g. "fast:int8,medium:bf16", into {quality_level: precision}"""
+    precisions = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        level, _, precision = item.partition(':')
+        level, precision = level.strip(), precision.strip()
+        if not level or precision not in FACE_PRECISIONS:
+            raise ValueError(f"Invalid QUALITY_FACE_PRECISION entry {item!r}: expected <quality_level>:<precision> "
+                             f"with precision one of {', '.join(FACE_PRECISIONS)}")
+        precisions[level] = precision
+    return precisions
 
 class APISettings:
     """API configuration settings"""
@@ -15,19 +31,38 @@ class APISettings:
     
     # Model paths
     GFPGAN_MODEL_PATH = PROJECT_ROOT / 'models/gfpgan/GFPGANv1.4.pth'
+    # ONNX export of the face restoration network (python scripts/export_onnx.py), used when FACE_BACKEND=onnx
+    ONNX_MODEL_PATH = os.getenv('ONNX_MODEL_PATH', str(PROJECT_ROOT / 'models/gfpgan/GFPGANv1.4.onnx'))
     
     # File handling settings
     MAX_FILE_SIZE_MB = 50
     MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+    # Uploads up to this size are kept in memory and decoded with cv2.imdecode; larger ones are
+    # streamed to disk. 0 always spills. With the sqlite task store, in-memory uploads of tasks still
+    # queued at shutdown are written to disk so that they are re-queued after the restart.
+    UPLOAD_SPILL_THRESHOLD_MB = float(os.getenv('UPLOAD_SPILL_THRESHOLD_MB', 8))
+    UPLOAD_SPILL_THRESHOLD_BYTES = int(UPLOAD_SPILL_THRESHOLD_MB * 1024 * 1024)
+    # Also write in-memory uploads to disk before enqueueing, so queued tasks survive a crash
+    # (sqlite task store only; costs one file write per upload)
+    UPLOAD_PERSIST_QUEUED = os.getenv('UPLOAD_PERSIST_QUEUED', 'false').lower() == 'true'
     SUPPORTED_FORMATS = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff']
     
     # Processing settings
     DEFAULT_TILE_SIZE = 400
     MIN_TILE_SIZE = 256
     MAX_TILE_SIZE = 512
+    # Output resolution: per-request scale (1..MAX_UPSCALE) is lowered, and oversized inputs are downscaled
+    # first, so that no output exceeds MAX_OUTPUT_PIXELS (0 = unlimited)
+    DEFAULT_UPSCALE = int(os.getenv('DEFAULT_UPSCALE', 4))
+    MAX_UPSCALE = int(os.getenv('MAX_UPSCALE', 8))
+    MAX_OUTPUT_PIXELS = int(os.getenv('MAX_OUTPUT_PIXELS', 32_000_000))
     
     # Output settings
-    OUTPUT_QUALITY = 95
+    OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'jpeg')  # jpeg | png | webp
+    OUTPUT_QUALITY = int(os.getenv('OUTPUT_QUALITY', 95))  # JPEG/WebP quality (1-100)
+    OUTPUT_PNG_COMPRESSION = int(os.getenv('OUTPUT_PNG_COMPRESSION', 3))  # PNG compression level (0-9)
+    # Recently finished results kept encoded in memory and served without reading the result file
+    RESULT_MEMORY_MAX_MB = int(os.getenv('RESULT_MEMORY_MAX_MB', 256))
     TEMP_DIR = '/tmp/photoenhanceai'
     
     # API settings
@@ -39,11 +74,93 @@ class APISettings:
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
     MAX_CONCURRENT_TASKS = int(os.getenv('MAX_CONCURRENT_TASKS', 10))
     
+    # Job queue settings (bounded depth per lane, HTTP 429 when full)
+    QUEUE_INTERACTIVE_MAX_DEPTH = int(os.getenv('QUEUE_INTERACTIVE_MAX_DEPTH', 50))
+    QUEUE_BULK_MAX_DEPTH = int(os.getenv('QUEUE_BULK_MAX_DEPTH', 100))
+    
+    # Inference executor settings
+    INFERENCE_EXECUTOR = os.getenv('INFERENCE_EXECUTOR', 'thread')  # thread | process
+    INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 1))
+    # process mode on CPU: load the models in the main process, then fork the workers so they share the weights
+    # copy-on-write
+    INFERENCE_SHARE_WEIGHTS = os.getenv('INFERENCE_SHARE_WEIGHTS', 'true').lower() == 'true'
+    # PyTorch threads per inference worker, 0 = CPU cores / number of workers
+    INFERENCE_TORCH_THREADS = int(os.getenv('INFERENCE_TORCH_THREADS', 0))
+    
+    # Dynamic face batching settings
+    FACE_BATCHING = os.getenv('FACE_BATCHING', 'true').lower() == 'true'
+    FACE_BATCH_MAX_SIZE = int(os.getenv('FACE_BATCH_MAX_SIZE', 8))
+    FACE_BATCH_MAX_WAIT_MS = float(os.getenv('FACE_BATCH_MAX_WAIT_MS', 10))
+    # thread executor: images processed at once so that faces of concurrent requests can share a forward pass,
+    # 0 = INFERENCE_WORKERS. Every image runs its full pipeline (decode, background, paste) in parallel, so each
+    # one adds its own peak memory and CPU threads
+    FACE_BATCH_CONCURRENCY = int(os.getenv('FACE_BATCH_CONCURRENCY', 0))
+    
+    # Inference-only GFPGANv1Clean (fused modulation, same weights and outputs up to float rounding) instead of
+    # the stock network; required for NOISE_MODE / noise_mode zero on the torch backend
+    FACE_OPTIMIZED_ARCH = os.getenv('FACE_OPTIMIZED_ARCH', 'false').lower() == 'true'
+    
+    # Face restoration backend: torch (PyTorch eager) | onnx (ONNX Runtime on ONNX_MODEL_PATH)
+    FACE_BACKEND = os.getenv('FACE_BACKEND', 'torch')
+    # ONNX Runtime threads per inference worker: inside an operator (0 = CPU cores / number of workers)
+    # and across operators
+    ONNX_INTRA_OP_THREADS = int(os.getenv('ONNX_INTRA_OP_THREADS', 0))
+    ONNX_INTER_OP_THREADS = int(os.getenv('ONNX_INTER_OP_THREADS', 1))
+    
+    # Compiled inference path (torch backend): none | trace (torch.jit.trace) | compile (torch.compile, torch>=2.0)
+    # compiled and warmed at startup, falls back to eager for anything that fails to compile
+    COMPILE_MODE = os.getenv('COMPILE_MODE', 'none')
+    # GFPGAN batch sizes with a compiled graph; a batch runs on the smallest bucket that holds it
+    COMPILE_BATCH_BUCKETS = [int(b) for b in os.getenv('COMPILE_BATCH_BUCKETS', '1,2,4,8').split(',') if b]
+    # input sizes (HxW) the RetinaFace detector is warmed on, empty to keep it eager
+    COMPILE_DETECTOR_SIZES = [
+        tuple(int(v) for v in size.split('x'))
+        for size in os.getenv('COMPILE_DETECTOR_SIZES', '512x512,768x1024').split(',') if size
+    ]
+    
+    # Face restoration precision (torch backend, CPU): fp32 | bf16 (BF16 weights and activations) |
+    # int8 (dynamic INT8 nn.Linear: style MLP, final_linear and modulations; the convs stay FP32)
+    FACE_PRECISION = os.getenv('FACE_PRECISION', 'fp32')
+    # per quality_level override, e.g. "fast:int8,medium:bf16"; the levels not listed use FACE_PRECISION
+    QUALITY_FACE_PRECISION = parse_face_precisions(os.getenv('QUALITY_FACE_PRECISION', ''))
+
+    # Background super-resolution (RealESRGAN x2, tiled with overlap blending)
+    # CPU hosts run the light SRVGG model (quality_level=medium) by default; the RealESRGAN x2plus
+    # model (quality_level=high) is opt-in there, otherwise its background is resized
+    BG_UPSAMPLE_ON_CPU = os.getenv('BG_UPSAMPLE_ON_CPU', 'false').lower() == 'true'
+    BG_TILE_WORKERS = int(os.getenv('BG_TILE_WORKERS', 0))  # tiles processed in parallel on CPU, 0 = auto
+    BG_TILE_BATCH = int(os.getenv('BG_TILE_BATCH', 4))  # tiles per forward pass on GPU
+    BG_TILE_PAD = int(os.getenv('BG_TILE_PAD', 10))  # context pixels around every tile
+    BG_TILE_OVERLAP = int(os.getenv('BG_TILE_OVERLAP', 16))  # blended overlap between neighbouring tiles
+    # quality levels whose background model is loaded at startup (none by default), the others on first use
+    BG_PRELOAD_QUALITY = [q for q in os.getenv('BG_PRELOAD_QUALITY', '').split(',') if q]
+    
+    # face_mode=auto: a single face whose aligned crop covers at least this fraction of the image is
+    # treated as a portrait crop and its background is resized instead of super-resolved
+    PORTRAIT_FACE_RATIO = float(os.getenv('PORTRAIT_FACE_RATIO', 0.25))
+    
+    # StyleGAN2 noise of the face restoration, overridable per request: fixed (stored noise of the checkpoint,
+    # deterministic) | zero (no noise, deterministic) | random (fresh noise per request)
+    NOISE_MODE = os.getenv('NOISE_MODE', 'fixed')
+    
+    # Face landmark cache: number of images whose detection results are kept, 0 disables
+    LANDMARK_CACHE_SIZE = int(os.getenv('LANDMARK_CACHE_SIZE', 1024))
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     
     # Task cleanup settings
     TASK_CLEANUP_HOURS = int(os.getenv('TASK_CLEANUP_HOURS', 24))
+    TASK_CLEANUP_INTERVAL_SECONDS = int(os.getenv('TASK_CLEANUP_INTERVAL_SECONDS', 600))
+    
+    # Task store settings
+    TASK_STORE_BACKEND = os.getenv('TASK_STORE_BACKEND', 'sqlite')  # sqlite | memory
+    TASK_STORE_PATH = os.getenv('TASK_STORE_PATH', str(PROJECT_ROOT / 'data' / 'tasks.db'))
+    
+    # Result cache settings
+    RESULT_CACHE_ENABLED = os.getenv('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+    RESULT_CACHE_DIR = os.getenv('RESULT_CACHE_DIR', str(PROJECT_ROOT / 'data' / 'result_cache'))
+    RESULT_CACHE_MAX_MB = int(os.getenv('RESULT_CACHE_MAX_MB', 2048))
     
     def __init__(self):
         # Ensure temp directory exists
@@ -171,6 +171,9 @@ class GFPGANv1Clean(nn.Module):
         sft_half (bool): Whether to apply SFT on half of the input channels. Default: False.
     """
 
+    # the StyleGAN2 decoder, overridden by the inference-optimized network
+    decoder_type = StyleGAN2GeneratorCSFT
+
     def __init__(
             self,
             out_size,
@@ -239,7 +242,7 @@ class GFPGANv1Clean(nn.Module):
         self.final_linear = nn.Linear(channels['4'] * 4 * 4, linear_out_channel)
 
         # the decoder: stylegan2 generator with SFT modulations
-        self.stylegan_decoder = StyleGAN2GeneratorCSFT(
+        self.stylegan_decoder = self.decoder_type(
             out_size=out_size,
             num_style_feat=num_style_feat,
             num_mlp=num_mlp,
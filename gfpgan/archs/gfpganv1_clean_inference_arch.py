@@ -0,0 +1,319 @@
+import random
+import threading
+import torch
+from basicsr.utils.registry import ARCH_REGISTRY
+from torch import nn
+from torch.nn import functional as F
+
+from .gfpganv1_clean_arch import GFPGANv1Clean, StyleGAN2GeneratorCSFT
+from .stylegan2_clean_arch import ModulatedConv2d, StyleConv, ToRGB
+
+# per-thread noise buffers, reused by all the style convs of the same shape
+_noise_buffers = threading.local()
+
+
+class FusedModulatedConv2d(ModulatedConv2d):
+    """Modulated Conv2d for inference, with the demodulation computed from precomputed weight sums.
+
+    The demodulation coefficients only depend on the style and on the squared weight summed over the kernel,
+    which is precomputed once per weight, so the ``(b, c_out, c_in, k, k)`` modulated weight is never built
+    just to normalize it. The modulation itself is applied where it is cheaper:
+
+    - on the activations (scale the input channels, plain convolution shared by the batch, scale the output
+      channels) for low-resolution layers with large weights;
+    - on the weight (one grouped convolution, as in ``ModulatedConv2d``) for high-resolution layers and
+      1x1 convs such as ToRGB, where the weight is much smaller than the feature map.
+
+    The parameters are the same as ``ModulatedConv2d``, so stock checkpoints load unchanged.
+    """
+
+    # set to False to always modulate the activations, e.g. for export with a dynamic batch size: the number of
+    # groups of the grouped convolution depends on the batch size
+    weight_modulation = True
+
+    def __init__(self, *args, **kwargs):
+        super(FusedModulatedConv2d, self).__init__(*args, **kwargs)
+        self.register_buffer('weight_sq', None, persistent=False)
+        self.refresh()
+
+    @torch.no_grad()
+    def refresh(self):
+        """Recompute the squared weight sums after the weight changed, e.g. after loading a checkpoint."""
+        if self.demodulate:
+            self.weight_sq = self.weight[0].pow(2).sum([2, 3])  # (c_out, c_in)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        super(FusedModulatedConv2d, self)._load_from_state_dict(*args, **kwargs)
+        self.refresh()
+
+    def forward(self, x, style, gain=1.):
+        """Forward function.
+
+        Args:
+            x (Tensor): Tensor with shape (b, c, h, w).
+            style (Tensor): Tensor with shape (b, num_style_feat).
+            gain (float): Constant folded into the output scaling. Default: 1.
+
+        Returns:
+            Tensor: Modulated tensor after convolution.
+        """
+        b, c, h, w = x.shape
+        style = self.modulation(style)  # (b, c_in)
+        scale = None  # per output channel scaling: demodulation and gain
+        if self.demodulate:
+            # sum over c_in and the kernel of (weight * style)^2
+            scale = torch.rsqrt(style.pow(2) @ self.weight_sq.t() + self.eps)
+            if gain != 1:
+                scale = scale * gain
+        elif gain != 1:
+            scale = style.new_full((b, self.out_channels), gain)
+
+        out_hw = h * w * (4 if self.sample_mode == 'upsample' else 1)
+        if self.weight_modulation and self.out_channels * self.kernel_size**2 < h * w + out_hw * self.out_channels // c:
+            # modulate the weight
+            weight = self.weight * style.view(b, 1, c, 1, 1)  # (b, c_out, c_in, k, k)
+            if scale is not None:
+                weight = weight * scale.view(b, self.out_channels, 1, 1, 1)
+            x = self._resample(x)
+            out = F.conv2d(
+                x.reshape(1, b * c, *x.shape[2:]),
+                weight.view(b * self.out_channels, c, self.kernel_size, self.kernel_size),
+                padding=self.padding,
+                groups=b)
+            return out.view(b, self.out_channels, *out.shape[2:4])
+
+        # modulate the activations; scaling the channels commutes with the bilinear resampling, so it is
+        # done at the lower resolution
+        x = self._resample(x * style.view(b, c, 1, 1))
+        out = F.conv2d(x, self.weight[0], padding=self.padding)
+        if scale is not None:
+            out.mul_(scale.view(b, self.out_channels, 1, 1))
+        return out
+
+    def _resample(self, x):
+        if self.sample_mode == 'upsample':
+            return F.interpolate(x, scale_factor=2, mode='bilinear', align_corners=False)
+        if self.sample_mode == 'downsample':
+            return F.interpolate(x, scale_factor=0.5, mode='bilinear', align_corners=False)
+        return x
+
+
+class FusedStyleConv(StyleConv):
+    """Style conv for inference: fused modulation, and in-place noise, bias and activation.
+
+    The random noise is drawn into a per-thread buffer that is reused across layers and calls. A given noise
+    map, e.g. the stored ``noises`` buffers with shape (1, 1, h, w), is broadcast over the batch in place.
+    """
+
+    def __init__(self, in_channels, out_channels, kernel_size, num_style_feat, demodulate=True, sample_mode=None):
+        nn.Module.__init__(self)
+        self.modulated_conv = FusedModulatedConv2d(
+            in_channels, out_channels, kernel_size, num_style_feat, demodulate=demodulate, sample_mode=sample_mode)
+        self.weight = nn.Parameter(torch.zeros(1))  # for noise injection
+        self.bias = nn.Parameter(torch.zeros(1, out_channels, 1, 1))
+
+    @staticmethod
+    def _noise(out):
+        b, _, h, w = out.shape
+        buffers = getattr(_noise_buffers, 'buffers', None)
+        if buffers is None:
+            buffers = _noise_buffers.buffers = {}
+        key = (b, h, w, out.device, out.dtype)
+        noise = buffers.get(key)
+        if noise is None:
+            noise = buffers[key] = out.new_empty(b, 1, h, w)
+        return noise.normal_()
+
+    def forward(self, x, style, noise=None):
+        """Forward function.
+
+        Args:
+            x (Tensor): Tensor with shape (b, c, h, w).
+            style (Tensor): Tensor with shape (b, num_style_feat).
+            noise (Tensor | None | bool): Noise map broadcastable to the output, None to draw random noise,
+                or False to skip the noise injection. Default: None.
+        """
+        # modulate, with the sqrt(2) conversion folded into the demodulation
+        out = self.modulated_conv(x, style, gain=2**0.5)
+        # noise injection
+        if noise is None:
+            noise = self._noise(out)
+        if noise is not False:
+            out.addcmul_(noise, self.weight)
+        # add bias and activation
+        out.add_(self.bias)
+        return F.leaky_relu_(out, negative_slope=0.2)
+
+
+class FusedToRGB(ToRGB):
+    """To RGB for inference, with in-place bias and skip addition."""
+
+    def __init__(self, in_channels, num_style_feat, upsample=True):
+        nn.Module.__init__(self)
+        self.upsample = upsample
+        self.modulated_conv = FusedModulatedConv2d(
+            in_channels, 3, kernel_size=1, num_style_feat=num_style_feat, demodulate=False, sample_mode=None)
+        self.bias = nn.Parameter(torch.zeros(1, 3, 1, 1))
+
+    def forward(self, x, style, skip=None):
+        out = self.modulated_conv(x, style)
+        out.add_(self.bias)
+        if skip is not None:
+            if self.upsample:
+                skip = F.interpolate(skip, scale_factor=2, mode='bilinear', align_corners=False)
+            out.add_(skip)
+        return out
+
+
+class StyleGAN2GeneratorCSFTInference(StyleGAN2GeneratorCSFT):
+    """StyleGAN2 Generator with SFT modulation, for inference.
+
+    It uses the fused style convs, and applies the SFT in place on the feature map instead of splitting and
+    concatenating it. The parameters are the same as ``StyleGAN2GeneratorCSFT``.
+    """
+
+    style_conv_type = FusedStyleConv
+    to_rgb_type = FusedToRGB
+
+    def forward(self,
+                styles,
+                conditions,
+                input_is_latent=False,
+                noise=None,
+                randomize_noise=True,
+                zero_noise=False,
+                truncation=1,
+                truncation_latent=None,
+                inject_index=None,
+                return_latents=False):
+        """Forward function for StyleGAN2GeneratorCSFTInference. The arguments are the same as
+        ``StyleGAN2GeneratorCSFT.forward``, and:
+
+        Args:
+            zero_noise (bool): Skip the noise injection, used when 'noise' is None. It takes precedence over
+                ``randomize_noise``. Default: False.
+        """
+        # style codes -> latents with Style MLP layer
+        if not input_is_latent:
+            styles = [self.style_mlp(s) for s in styles]
+        # noises
+        if noise is None:
+            if zero_noise:
+                noise = [False] * self.num_layers
+            elif randomize_noise:
+                noise = [None] * self.num_layers  # for each style conv layer
+            else:  # use the stored noise
+                noise = [getattr(self.noises, f'noise{i}') for i in range(self.num_layers)]
+        # style truncation
+        if truncation < 1:
+            styles = [truncation_latent + truncation * (style - truncation_latent) for style in styles]
+        # get style latents with injection
+        if len(styles) == 1:
+            if styles[0].ndim < 3:
+                # repeat latent code for all the layers
+                latent = styles[0].unsqueeze(1).expand(-1, self.num_latent, -1)
+            else:  # used for encoder with different latent code for each layer
+                latent = styles[0]
+        elif len(styles) == 2:  # mixing noises
+            if inject_index is None:
+                inject_index = random.randint(1, self.num_latent - 1)
+            latent1 = styles[0].unsqueeze(1).repeat(1, inject_index, 1)
+            latent2 = styles[1].unsqueeze(1).repeat(1, self.num_latent - inject_index, 1)
+            latent = torch.cat([latent1, latent2], 1)
+
+        # main generation
+        out = self.constant_input(latent.shape[0])
+        out = self.style_conv1(out, latent[:, 0], noise=noise[0])
+        skip = self.to_rgb1(out, latent[:, 1])
+
+        i = 1
+        for conv1, conv2, noise1, noise2, to_rgb in zip(self.style_convs[::2], self.style_convs[1::2], noise[1::2],
+                                                        noise[2::2], self.to_rgbs):
+            out = conv1(out, latent[:, i], noise=noise1)
+
+            # the conditions may have fewer levels
+            if i < len(conditions):
+                # SFT part to combine the conditions, in place on the (freshly computed) feature map
+                out_sft = out[:, out.size(1) // 2:] if self.sft_half else out
+                out_sft.mul_(conditions[i - 1]).add_(conditions[i])
+
+            out = conv2(out, latent[:, i + 1], noise=noise2)
+            skip = to_rgb(out, latent[:, i + 2], skip)  # feature back to the rgb space
+            i += 2
+
+        image = skip
+
+        if return_latents:
+            return image, latent
+        else:
+            return image, None
+
+
+@ARCH_REGISTRY.register()
+class GFPGANv1CleanInference(GFPGANv1Clean):
+    """Inference-only GFPGANv1Clean.
+
+    It computes the same function as ``GFPGANv1Clean`` and loads the same checkpoints, but:
+
+    - the style convs get the demodulation from precomputed weight sums, and the low-resolution ones scale
+      the activations instead of building per-sample weights (see ``FusedModulatedConv2d``);
+    - the SFT conditions are used directly instead of cloned, and applied in place;
+    - the intermediate RGB outputs are not computed unless ``return_rgb=True``;
+    - random noise is drawn into reused buffers, and the stored noise (``randomize_noise=False``) is broadcast
+      over the batch in place; ``zero_noise=True`` skips the noise injection.
+
+    It does not support training. The arguments are the same as ``GFPGANv1Clean``.
+    """
+
+    decoder_type = StyleGAN2GeneratorCSFTInference
+
+    def forward(self, x, return_latents=False, return_rgb=False, randomize_noise=True, zero_noise=False, **kwargs):
+        """Forward function for GFPGANv1CleanInference.
+
+        Args:
+            x (Tensor): Input images.
+            return_latents (bool): Whether to return style latents. Default: False.
+            return_rgb (bool): Whether return intermediate rgb images. Default: False.
+            randomize_noise (bool): Randomize noise, used when 'noise' is False. Default: True.
+            zero_noise (bool): Skip the noise injection. The output is then deterministic and does not depend
+                on the stored noise. Default: False.
+        """
+        conditions = []
+        unet_skips = []
+        out_rgbs = []
+
+        # encoder
+        feat = F.leaky_relu_(self.conv_body_first(x), negative_slope=0.2)
+        for i in range(self.log_size - 2):
+            feat = self.conv_body_down[i](feat)
+            unet_skips.append(feat)
+        feat = F.leaky_relu_(self.final_conv(feat), negative_slope=0.2)
+
+        # style code
+        style_code = self.final_linear(feat.view(feat.size(0), -1))
+        if self.different_w:
+            style_code = style_code.view(style_code.size(0), -1, self.num_style_feat)
+
+        # decode
+        for i in range(self.log_size - 2):
+            # add unet skip
+            feat = feat + unet_skips[-1 - i]
+            # ResUpLayer
+            feat = self.conv_body_up[i](feat)
+            # generate scale and shift for SFT layers
+            conditions.append(self.condition_scale[i](feat))
+            conditions.append(self.condition_shift[i](feat))
+            # generate rgb images
+            if return_rgb:
+                out_rgbs.append(self.toRGB[i](feat))
+
+        # decoder
+        image, _ = self.stylegan_decoder([style_code],
+                                         conditions,
+                                         return_latents=return_latents,
+                                         input_is_latent=self.input_is_latent,
+                                         randomize_noise=randomize_noise,
+                                         zero_noise=zero_noise)
+
+        return image, out_rgbs
+
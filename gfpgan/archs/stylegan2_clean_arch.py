@@ -203,6 +203,10 @@ class StyleGAN2GeneratorClean(nn.Module):
         narrow (float): Narrow ratio for channels. Default: 1.0.
     """
 
+    # building blocks, overridden by the inference-optimized generator
+    style_conv_type = StyleConv
+    to_rgb_type = ToRGB
+
     def __init__(self, out_size, num_style_feat=512, num_mlp=8, channel_multiplier=2, narrow=1):
         super(StyleGAN2GeneratorClean, self).__init__()
         # Style MLP layers
@@ -231,14 +235,14 @@ class StyleGAN2GeneratorClean(nn.Module):
         self.channels = channels
 
         self.constant_input = ConstantInput(channels['4'], size=4)
-        self.style_conv1 = StyleConv(
+        self.style_conv1 = self.style_conv_type(
             channels['4'],
             channels['4'],
             kernel_size=3,
             num_style_feat=num_style_feat,
             demodulate=True,
             sample_mode=None)
-        self.to_rgb1 = ToRGB(channels['4'], num_style_feat, upsample=False)
+        self.to_rgb1 = self.to_rgb_type(channels['4'], num_style_feat, upsample=False)
 
         self.log_size = int(math.log(out_size, 2))
         self.num_layers = (self.log_size - 2) * 2 + 1
@@ -258,7 +262,7 @@ class StyleGAN2GeneratorClean(nn.Module):
         for i in range(3, self.log_size + 1):
             out_channels = channels[f'{2**i}']
             self.style_convs.append(
-                StyleConv(
+                self.style_conv_type(
                     in_channels,
                     out_channels,
                     kernel_size=3,
@@ -266,14 +270,14 @@ class StyleGAN2GeneratorClean(nn.Module):
                     demodulate=True,
                     sample_mode='upsample'))
             self.style_convs.append(
-                StyleConv(
+                self.style_conv_type(
                     out_channels,
                     out_channels,
                     kernel_size=3,
                     num_style_feat=num_style_feat,
                     demodulate=True,
                     sample_mode=None))
-            self.to_rgbs.append(ToRGB(out_channels, num_style_feat, upsample=True))
+            self.to_rgbs.append(self.to_rgb_type(out_channels, num_style_feat, upsample=True))
             in_channels = out_channels
 
     def make_noise(self):
@@ -0,0 +1,153 @@
+import queue
+import threading
+import time
+import torch
+from concurrent.futures import Future
+
+
+class _FaceRequest():
+    """A single aligned face waiting to be restored."""
+
+    __slots__ = ('tensor', 'options', 'future', 'enqueued_at')
+
+    def __init__(self, tensor, options):
+        self.tensor = tensor
+        self.options = options
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class FaceBatchScheduler():
+    """Dynamic batching scheduler for GFPGAN face restoration.
+
+    Aligned 512x512 face crops submitted from any number of threads (several in-flight requests,
+    and several faces of one group photo) are collected into a single (N, 3, 512, 512) tensor and
+    restored with one forward pass. A batch is dispatched when it reaches ``max_batch_size`` or when
+    the oldest face has waited ``max_wait_ms``, whichever comes first. Restored faces are scattered
+    back to their owners through futures.
+
+    Args:
+        net (nn.Module): The restoration network, e.g. GFPGANv1Clean.
+        device (torch.device): Device of the network.
+        max_batch_size (int): Maximum number of faces in one forward pass. Default: 8.
+        max_wait_ms (float): Maximum time the oldest face waits for a batch to fill. Default: 10.
+    """
+
+    def __init__(self, net, device, max_batch_size=8, max_wait_ms=10):
+        self.net = net
+        self.device = device
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0., float(max_wait_ms)) / 1000.
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_size_hist = {}
+        self._num_batches = 0
+        self._num_faces = 0
+        self._total_queue_delay = 0.
+        self._max_queue_delay = 0.
+        self._total_forward_time = 0.
+
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='gfpgan-face-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, face_tensors, weight=0.5, randomize_noise=True, zero_noise=False, net=None):
+        """Submit normalized face tensors with shape (3, h, w) and return their futures.
+
+        Each future resolves to the restored face tensor with shape (3, h, w) in [-1, 1]. ``net`` restores them
+        instead of ``self.net``, e.g. a reduced-precision copy of it.
+        """
+        if self._closed:
+            raise RuntimeError('FaceBatchScheduler is closed.')
+        options = (weight, randomize_noise, zero_noise, net)
+        requests = [_FaceRequest(t, options) for t in face_tensors]
+        for request in requests:
+            self._queue.put(request)
+        return [request.future for request in requests]
+
+    def restore(self, face_tensors, weight=0.5, randomize_noise=True, zero_noise=False, net=None):
+        """Blocking helper: submit faces and wait for all of them to be restored."""
+        return [future.result() for future in self.submit(face_tensors, weight, randomize_noise, zero_noise, net)]
+
+    def close(self):
+        """Stop the scheduler thread after draining pending faces."""
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self):
+        """Block for the first face, then gather more until the batch is full or the deadline expires."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = first.enqueued_at + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                # re-post the sentinel so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # faces with different forward options (fidelity weight, noise mode, network) cannot share a batch
+            groups = {}
+            for request in batch:
+                groups.setdefault(request.options, []).append(request)
+            for options, group in groups.items():
+                self._forward(group, *options)
+
+    @torch.no_grad()
+    def _forward(self, group, weight, randomize_noise, zero_noise, net):
+        dispatched_at = time.perf_counter()
+        try:
+            inputs = torch.stack([request.tensor for request in group]).to(self.device)
+            # zero_noise is only understood by the inference network, so it is only passed when set
+            extra = {'zero_noise': True} if zero_noise else {}
+            outputs = (self.net if net is None else net)(
+                inputs, return_rgb=False, weight=weight, randomize_noise=randomize_noise, **extra)[0]
+        except Exception as error:  # propagate to every owner, they decide how to fall back
+            for request in group:
+                request.future.set_exception(error)
+            return
+        forward_time = time.perf_counter() - dispatched_at
+        for idx, request in enumerate(group):
+            request.future.set_result(outputs[idx])
+
+        delays = [dispatched_at - request.enqueued_at for request in group]
+        with self._stats_lock:
+            self._num_batches += 1
+            self._num_faces += len(group)
+            self._batch_size_hist[len(group)] = self._batch_size_hist.get(len(group), 0) + 1
+            self._total_queue_delay += sum(delays)
+            self._max_queue_delay = max(self._max_queue_delay, max(delays))
+            self._total_forward_time += forward_time
+
+    def get_stats(self):
+        """Return batch-size and queue-delay metrics for tuning."""
+        with self._stats_lock:
+            num_batches = self._num_batches
+            num_faces = self._num_faces
+            return {
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.,
+                'pending_faces': self._queue.qsize(),
+                'batches': num_batches,
+                'faces': num_faces,
+                'avg_batch_size': num_faces / num_batches if num_batches else 0.,
+                'batch_size_histogram': dict(sorted(self._batch_size_hist.items())),
+                'avg_queue_delay_ms': self._total_queue_delay / num_faces * 1000. if num_faces else 0.,
+                'max_queue_delay_ms': self._max_queue_delay * 1000.,
+                'avg_forward_ms': self._total_forward_time / num_batches * 1000. if num_batches else 0.,
+            }
@@ -0,0 +1,216 @@
+import threading
+import time
+import torch
+from torch import nn
+
+# trace: torch.jit.trace (every torch version) | compile: torch.compile (torch >= 2.0, otherwise traced)
+COMPILE_MODES = ('trace', 'compile')
+
+
+class DeterministicForward(nn.Module):
+    """Single-input, single-output forward of a GFPGAN network with deterministic noise.
+
+    The stored noise is used, or no noise with ``zero_noise`` (``GFPGANv1CleanInference`` only). Random noise
+    cannot be traced or exported, so this is the module that is traced, compiled and exported.
+    """
+
+    def __init__(self, net, zero_noise=False):
+        super(DeterministicForward, self).__init__()
+        self.net = net
+        self.zero_noise = zero_noise
+
+    def forward(self, x):
+        extra = {'zero_noise': True} if self.zero_noise else {}
+        return self.net(x, return_rgb=False, randomize_noise=False, **extra)[0]
+
+
+def _resolve_mode(mode):
+    if mode not in COMPILE_MODES:
+        raise ValueError(f'Unknown compile mode {mode}. Choose from {COMPILE_MODES}.')
+    if mode == 'compile' and not hasattr(torch, 'compile'):
+        print('\ttorch.compile is not available (torch < 2.0), tracing instead.')
+        return 'trace'
+    return mode
+
+
+def _time(fn, repeat):
+    """Steady-state seconds per call of ``fn``, after one untimed call."""
+    fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeat
+
+
+def _report(model, shape, compile_time, eager_time, compiled_time):
+    return {
+        'model': model,
+        'shape': shape,
+        'status': 'eager' if compiled_time is None else 'compiled',
+        'compile_s': round(compile_time, 3),
+        'eager_ms': round(eager_time * 1000, 1),
+        'compiled_ms': None if compiled_time is None else round(compiled_time * 1000, 1),
+        'speedup': None if compiled_time is None else round(eager_time / compiled_time, 3)
+    }
+
+
+class CompiledFaceRestorer():
+    """GFPGAN face restoration on compiled graphs, one per batch-size bucket.
+
+    A batch runs on the graph of the smallest bucket that holds it, padded with zeros; larger batches are
+    split by the largest bucket. Graphs are compiled on first use, or ahead of the first request with
+    ``warmup``. A graph that fails to compile or to run falls back to the eager network for its bucket.
+
+    It is called like the PyTorch network, ``restorer(x, return_rgb=False, ...)`` returns ``(image, [])``, so
+    ``GFPGANer`` and the face batcher use it unchanged. Only the deterministic noise modes are compiled; with
+    random noise the eager network is used.
+
+    Args:
+        net (nn.Module): The GFPGAN network, in eval mode.
+        mode (str): One of ``COMPILE_MODES``. Default: 'trace'.
+        batch_buckets (list[int]): Batch sizes with a compiled graph. Default: (1, 2, 4, 8).
+    """
+
+    def __init__(self, net, mode='trace', batch_buckets=(1, 2, 4, 8)):
+        self.net = net
+        self.mode = _resolve_mode(mode)
+        self.batch_buckets = sorted(set(int(b) for b in batch_buckets if int(b) > 0))
+        if not self.batch_buckets:
+            raise ValueError('At least one batch bucket is required.')
+        self.device = next(net.parameters()).device
+        self._graphs = {}  # (bucket, zero_noise) -> compiled graph, or None to run eager
+        self._compile_times = {}
+        self._lock = threading.Lock()
+
+    def _graph(self, bucket, zero_noise):
+        key = (bucket, zero_noise)
+        if key not in self._graphs:
+            with self._lock:
+                if key not in self._graphs:
+                    start = time.perf_counter()
+                    try:
+                        self._graphs[key] = self._compile(bucket, zero_noise)
+                    except Exception as error:
+                        print(f'\tFailed to compile GFPGAN for batch {bucket}, using eager: {error}')
+                        self._graphs[key] = None
+                    self._compile_times[key] = time.perf_counter() - start
+        return self._graphs[key]
+
+    @torch.no_grad()
+    def _compile(self, bucket, zero_noise):
+        forward = DeterministicForward(self.net, zero_noise).eval()
+        example = torch.randn(bucket, 3, 512, 512, device=self.device)
+        if self.mode == 'compile':
+            graph = torch.compile(forward, dynamic=False)
+        else:
+            # the parameters are shared with the eager network, not copied
+            graph = torch.jit.trace(forward, example, check_trace=False)
+        # the first calls compile the kernels (torch.compile) or run the profiling passes (TorchScript)
+        for _ in range(2):
+            graph(example)
+        return graph
+
+    def _run(self, x, zero_noise):
+        size = x.size(0)
+        bucket = next(b for b in self.batch_buckets if b >= size)
+        graph = self._graph(bucket, zero_noise)
+        if graph is not None:
+            padded = x if bucket == size else torch.cat([x, x.new_zeros(bucket - size, *x.shape[1:])])
+            try:
+                return graph(padded)[:size]
+            except Exception as error:
+                print(f'\tCompiled GFPGAN failed for batch {bucket}, using eager: {error}')
+                self._graphs[(bucket, zero_noise)] = None
+        extra = {'zero_noise': True} if zero_noise else {}
+        return self.net(x, return_rgb=False, randomize_noise=False, **extra)[0]
+
+    @torch.no_grad()
+    def __call__(self, x, return_rgb=False, randomize_noise=True, zero_noise=False, **kwargs):
+        if randomize_noise and not zero_noise:
+            return self.net(x, return_rgb=False, randomize_noise=True, **kwargs)
+        largest = self.batch_buckets[-1]
+        outputs = [self._run(x[start:start + largest], zero_noise) for start in range(0, x.size(0), largest)]
+        return (outputs[0] if len(outputs) == 1 else torch.cat(outputs)), []
+
+    @torch.no_grad()
+    def warmup(self, zero_noise=False, repeat=3):
+        """Compile the graph of every bucket and measure its steady-state latency against eager.
+
+        Calling it again only measures: the compile time reported is the one of the first compilation.
+
+        Args:
+            zero_noise (bool): Warm the graphs of ``noise_mode='zero'`` instead of ``'fixed'``. Default: False.
+            repeat (int): Timed calls per bucket. Default: 3.
+
+        Returns:
+            list[dict]: One report per bucket: ``status``, ``compile_s``, ``eager_ms``, ``compiled_ms`` and
+            ``speedup``.
+        """
+        extra = {'zero_noise': True} if zero_noise else {}
+        reports = []
+        for bucket in self.batch_buckets:
+            graph = self._graph(bucket, zero_noise)
+            x = torch.randn(bucket, 3, 512, 512, device=self.device)
+            eager_time = _time(lambda: self.net(x, return_rgb=False, randomize_noise=False, **extra), repeat)
+            compiled_time = _time(lambda: graph(x), repeat) if graph is not None else None
+            reports.append(
+                _report('gfpgan', f'batch={bucket}', self._compile_times[(bucket, zero_noise)], eager_time,
+                        compiled_time))
+        return reports
+
+
+@torch.no_grad()
+def compile_detector(detector, mode='trace', sizes=((512, 512), ), repeat=3):
+    """Compile the forward of a face detector (RetinaFace) in place, and warm it on the given input sizes.
+
+    The detector runs on images of any size. A traced graph is checked against the eager forward on the other
+    warmup sizes, and ``torch.compile`` uses dynamic shapes; if compilation fails the detector stays eager.
+    Calling it again on a compiled detector only measures.
+
+    Args:
+        detector (nn.Module): The detector, in eval mode, e.g. ``FaceRestoreHelper.face_det``.
+        mode (str): One of ``COMPILE_MODES``. Default: 'trace'.
+        sizes (list[tuple]): ``(height, width)`` of the warmup inputs. Default: ((512, 512), ).
+        repeat (int): Timed calls per size. Default: 3.
+
+    Returns:
+        list[dict]: One report per size, as ``CompiledFaceRestorer.warmup``.
+    """
+    device = next(detector.parameters()).device
+    examples = [torch.randn(1, 3, h, w, device=device) for h, w in sizes]
+    eager_forward = detector.__dict__.get('eager_forward', detector.forward)
+    compiled = detector.__dict__.get('forward')
+    compile_time = detector.__dict__.get('compile_time', 0.)
+    if compiled is None and examples:
+        start = time.perf_counter()
+        try:
+            if _resolve_mode(mode) == 'compile':
+                compiled = torch.compile(eager_forward, dynamic=True)
+                for example in examples:
+                    compiled(example)
+            else:
+                # raises if the traced graph does not reproduce the eager outputs on the other sizes
+                compiled = torch.jit.trace(
+                    detector, examples[0], check_inputs=[(example, ) for example in examples[1:]] or None)
+        except Exception as error:
+            print(f'\tFailed to compile the face detector, using eager: {error}')
+            compiled = None
+        compile_time = time.perf_counter() - start
+        if compiled is not None:
+            if isinstance(compiled, nn.Module):
+                # a module attribute would be registered as a submodule instead of overriding the method
+                compiled = compiled.forward
+            detector.eager_forward = eager_forward
+            detector.compile_time = compile_time
+            detector.forward = compiled
+
+    reports = []
+    for (h, w), example in zip(sizes, examples):
+        eager_time = _time(lambda: eager_forward(example), repeat)
+        compiled_time = _time(lambda: compiled(example), repeat) if compiled is not None else None
+        reports.append(_report('retinaface', f'{h}x{w}', compile_time, eager_time, compiled_time))
+    return reports
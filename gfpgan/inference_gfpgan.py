@@ -1,5 +1,4 @@
 import argparse
-import cv2
 import glob
 import numpy as np
 import os
@@ -7,6 +6,7 @@ import torch
 from basicsr.utils import imwrite
 
 from gfpgan import GFPGANer
+from gfpgan.pipeline import run_pipeline
 
 
 def main():
@@ -42,6 +42,14 @@ def main():
         default='auto',
         help='Image extension. Options: auto | jpg | png, auto means using the same extension as inputs. Default: auto')
     parser.add_argument('-w', '--weight', type=float, default=0.5, help='Adjustable weights.')
+    parser.add_argument(
+        '--no_cropped_faces', action='store_true', help='Do not save the cropped input faces (debug output)')
+    parser.add_argument('--no_cmp', action='store_true', help='Do not save the comparison images (debug output)')
+    parser.add_argument('--read_workers', type=int, default=2, help='Threads that decode images ahead. Default: 2')
+    parser.add_argument('--write_workers', type=int, default=2, help='Threads that save the results. Default: 2')
+    parser.add_argument(
+        '--prefetch', type=int, default=4, help='Images decoded ahead of the model, and results waiting '
+        'to be saved. Default: 4')
     args = parser.parse_args()
 
     args = parser.parse_args()
@@ -123,26 +131,28 @@ def main():
         bg_upsampler=bg_upsampler)
 
     # ------------------------ restore ------------------------
-    for img_path in img_list:
-        # read image
-        img_name = os.path.basename(img_path)
-        print(f'Processing {img_name} ...')
-        basename, ext = os.path.splitext(img_name)
-        input_img = cv2.imread(img_path, cv2.IMREAD_COLOR)
-
+    # decoding, the model and saving are pipelined: images are decoded ahead by a thread pool and the
+    # results are saved by another one while the next image is being restored
+    def process(img_path, input_img):
+        print(f'Processing {os.path.basename(img_path)} ...')
         # restore faces and background if necessary
-        cropped_faces, restored_faces, restored_img = restorer.enhance(
+        return restorer.enhance(
             input_img,
             has_aligned=args.aligned,
             only_center_face=args.only_center_face,
             paste_back=True,
             weight=args.weight)
 
+    def write(img_path, results):
+        cropped_faces, restored_faces, restored_img = results
+        basename, ext = os.path.splitext(os.path.basename(img_path))
+
         # save faces
         for idx, (cropped_face, restored_face) in enumerate(zip(cropped_faces, restored_faces)):
             # save cropped face
-            save_crop_path = os.path.join(args.output, 'cropped_faces', f'{basename}_{idx:02d}.png')
-            imwrite(cropped_face, save_crop_path)
+            if not args.no_cropped_faces:
+                save_crop_path = os.path.join(args.output, 'cropped_faces', f'{basename}_{idx:02d}.png')
+                imwrite(cropped_face, save_crop_path)
             # save restored face
             if args.suffix is not None:
                 save_face_name = f'{basename}_{idx:02d}_{args.suffix}.png'
@@ -151,8 +161,9 @@ def main():
             save_restore_path = os.path.join(args.output, 'restored_faces', save_face_name)
             imwrite(restored_face, save_restore_path)
             # save comparison image
-            cmp_img = np.concatenate((cropped_face, restored_face), axis=1)
-            imwrite(cmp_img, os.path.join(args.output, 'cmp', f'{basename}_{idx:02d}.png'))
+            if not args.no_cmp:
+                cmp_img = np.concatenate((cropped_face, restored_face), axis=1)
+                imwrite(cmp_img, os.path.join(args.output, 'cmp', f'{basename}_{idx:02d}.png'))
 
         # save restored img
         if restored_img is not None:
@@ -167,6 +178,14 @@ def main():
                 save_restore_path = os.path.join(args.output, 'restored_imgs', f'{basename}.{extension}')
             imwrite(restored_img, save_restore_path)
 
+    stats = run_pipeline(
+        img_list,
+        process,
+        write,
+        read_workers=args.read_workers,
+        write_workers=args.write_workers,
+        prefetch=args.prefetch)
+    print(stats.report())
     print(f'Results are in the [{args.output}] folder.')
 
 
@@ -0,0 +1,102 @@
+import inspect
+import numpy as np
+import torch
+
+from gfpgan.archs.gfpganv1_clean_inference_arch import FusedModulatedConv2d
+from gfpgan.compiled import DeterministicForward
+
+# noise modes that can be baked into an exported graph
+ONNX_NOISE_MODES = ('fixed', 'zero')
+
+
+def export_onnx(net, onnx_path, noise_mode='fixed', opset_version=13):
+    """Export a GFPGAN network to ONNX, with a fixed 512x512 input and a dynamic batch size.
+
+    ``GFPGANv1CleanInference`` loads the ``GFPGANv1Clean`` checkpoints and exports to a graph of plain
+    convolutions: its style convs are switched to activation modulation during the export, since the grouped
+    convolution of the per-sample weights has a number of groups that depends on the batch size. The random
+    noise cannot be exported, so the graph uses the stored noise (``'fixed'``) or none (``'zero'``); the mode
+    is recorded in the ``noise_mode`` metadata of the model.
+
+    Args:
+        net (nn.Module): The GFPGAN network, in eval mode and on the CPU.
+        onnx_path (str): Output path.
+        noise_mode (str): ``'fixed'`` or ``'zero'``. Default: 'fixed'.
+        opset_version (int): ONNX opset. Default: 13.
+    """
+    import onnx
+
+    if noise_mode not in ONNX_NOISE_MODES:
+        raise ValueError(f'Unknown noise_mode {noise_mode} for export. Choose from {ONNX_NOISE_MODES}.')
+    fused = [module for module in net.modules() if isinstance(module, FusedModulatedConv2d)]
+    for module in fused:
+        module.weight_modulation = False
+    try:
+        kwargs = {}
+        if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+            kwargs['dynamo'] = False  # the TorchScript exporter, the one available on every supported torch version
+        with torch.no_grad():
+            torch.onnx.export(
+                DeterministicForward(net, zero_noise=noise_mode == 'zero'),
+                torch.randn(1, 3, 512, 512),
+                onnx_path,
+                input_names=['input'],
+                output_names=['output'],
+                dynamic_axes={
+                    'input': {
+                        0: 'batch'
+                    },
+                    'output': {
+                        0: 'batch'
+                    }
+                },
+                opset_version=opset_version,
+                do_constant_folding=True,
+                **kwargs)
+    finally:
+        for module in fused:
+            del module.weight_modulation  # back to the class default
+
+    model = onnx.load(onnx_path)
+    onnx.checker.check_model(model)
+    meta = model.metadata_props.add()
+    meta.key, meta.value = 'noise_mode', noise_mode
+    onnx.save(model, onnx_path)
+
+
+class OnnxFaceRestorer():
+    """Face restoration backend running an exported GFPGAN graph (see ``export_onnx``) with ONNX Runtime.
+
+    It is called like the PyTorch network, ``restorer(x, return_rgb=False, ...)`` returns ``(image, [])``, so
+    ``GFPGANer`` and the face batcher use it unchanged. ``Run`` is thread-safe, so concurrent calls share one
+    session. The noise mode is the one the graph was exported with: the noise arguments are ignored.
+
+    Args:
+        onnx_path (str): Path to the exported model.
+        intra_op_threads (int): Threads used inside an operator. 0 lets ONNX Runtime use all cores. Default: 0.
+        inter_op_threads (int): Threads running independent operators in parallel. Values above 1 enable
+            the parallel execution mode. Default: 1.
+        providers (list[str]): Execution providers. Default: None, the CPU provider.
+    """
+
+    def __init__(self, onnx_path, intra_op_threads=0, inter_op_threads=1, providers=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL)
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.onnx_path = onnx_path
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=providers or ['CPUExecutionProvider'])
+        self.input_name = self.session.get_inputs()[0].name
+        self.noise_mode = self.session.get_modelmeta().custom_metadata_map.get('noise_mode', 'fixed')
+
+    def __call__(self, x, return_rgb=False, **kwargs):
+        inputs = np.ascontiguousarray(x.detach().cpu().numpy(), dtype=np.float32)
+        output = self.session.run(None, {self.input_name: inputs})[0]
+        return torch.from_numpy(output), []
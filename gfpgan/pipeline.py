@@ -0,0 +1,119 @@
+import cv2
+import collections
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PipelineStats():
+    """Throughput report of a ``run_pipeline`` call.
+
+    ``model_time`` is the time the model stage spent processing, ``read_wait`` the time it waited for a
+    decoded image and ``write_wait`` the time it waited for the writer pool to drain. Model utilization is
+    ``model_time / wall_time``; it is close to 1 when decoding and writing are fully hidden.
+    """
+
+    def __init__(self):
+        self.images = 0
+        self.failed = 0
+        self.wall_time = 0.
+        self.model_time = 0.
+        self.read_wait = 0.
+        self.write_wait = 0.
+
+    @property
+    def images_per_sec(self):
+        return self.images / self.wall_time if self.wall_time > 0 else 0.
+
+    @property
+    def utilization(self):
+        return self.model_time / self.wall_time if self.wall_time > 0 else 0.
+
+    def as_dict(self):
+        return {
+            'images': self.images,
+            'failed': self.failed,
+            'wall_time': self.wall_time,
+            'images_per_sec': self.images_per_sec,
+            'model_time': self.model_time,
+            'model_utilization': self.utilization,
+            'read_wait': self.read_wait,
+            'write_wait': self.write_wait
+        }
+
+    def report(self):
+        return (f'Processed {self.images} images ({self.failed} failed) in {self.wall_time:.2f}s: '
+                f'{self.images_per_sec:.3f} img/s, model utilization {self.utilization:.1%} '
+                f'(model {self.model_time:.2f}s, waiting for reads {self.read_wait:.2f}s, '
+                f'waiting for writes {self.write_wait:.2f}s)')
+
+
+def run_pipeline(img_paths, process, write, read_workers=2, write_workers=2, prefetch=4, read=None):
+    """Process images with decoding, the model and writing overlapped.
+
+    Images are decoded by a thread pool up to ``prefetch`` images ahead of the model stage, which runs
+    ``process`` on the calling thread in input order. Its outputs are handed to a writer pool, so the next
+    image is processed while the previous results are encoded and saved. OpenCV releases the GIL while
+    decoding and encoding, so the three stages run in parallel.
+
+    Args:
+        img_paths (list[str]): Images to process.
+        process (callable): ``process(img_path, img)`` runs the model and returns the result for ``write``.
+        write (callable): ``write(img_path, result)`` saves the result. Called from the writer pool.
+        read_workers (int): Decode threads. Default: 2.
+        write_workers (int): Writer threads. Default: 2.
+        prefetch (int): Maximum number of decoded images waiting for the model. It also bounds the results
+            waiting to be written. Default: 4.
+        read (callable): ``read(img_path)`` returns the decoded image, or None if it cannot be read.
+            Default: ``cv2.imread`` in color.
+
+    Returns:
+        PipelineStats: Throughput report.
+    """
+    read = read or (lambda img_path: cv2.imread(img_path, cv2.IMREAD_COLOR))
+    prefetch = max(1, int(prefetch))
+    stats = PipelineStats()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max(1, read_workers), thread_name_prefix='pipeline-read') as readers, \
+            ThreadPoolExecutor(max(1, write_workers), thread_name_prefix='pipeline-write') as writers:
+        paths = iter(img_paths)
+        pending_reads = collections.deque()
+        pending_writes = collections.deque()
+
+        def fill():
+            while len(pending_reads) < prefetch:
+                img_path = next(paths, None)
+                if img_path is None:
+                    return
+                pending_reads.append((img_path, readers.submit(read, img_path)))
+
+        fill()
+        while pending_reads:
+            img_path, future = pending_reads.popleft()
+            wait_start = time.perf_counter()
+            img = future.result()
+            stats.read_wait += time.perf_counter() - wait_start
+            fill()
+            if img is None:
+                print(f'\tFailed to read {img_path}, skipped.')
+                stats.failed += 1
+                continue
+
+            model_start = time.perf_counter()
+            result = process(img_path, img)
+            stats.model_time += time.perf_counter() - model_start
+            del img
+
+            # bound the results held in memory while the writers catch up
+            wait_start = time.perf_counter()
+            while len(pending_writes) >= prefetch:
+                pending_writes.popleft().result()
+            stats.write_wait += time.perf_counter() - wait_start
+            pending_writes.append(writers.submit(write, img_path, result))
+            stats.images += 1
+
+        for future in pending_writes:
+            future.result()
+
+    stats.wall_time = time.perf_counter() - start
+    return stats
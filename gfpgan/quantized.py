@@ -0,0 +1,55 @@
+import copy
+import torch
+from torch import nn
+
+# fp32: the checkpoint as is | bf16: BF16 weights and activations | int8: dynamic INT8 nn.Linear, FP32 convs
+FACE_PRECISIONS = ('fp32', 'bf16', 'int8')
+
+
+class QuantizedFaceRestorer(nn.Module):
+    """GFPGAN network at a reduced precision, for CPU serving.
+
+    ``int8`` quantizes the ``nn.Linear`` layers dynamically (weights stored in INT8, activations quantized per
+    call): the style MLP, the ``final_linear`` of the encoder, which holds most of the weights of GFPGANv1Clean,
+    and the modulation of every style conv. The convolutions stay in FP32: the modulated convs build their
+    weights per call, which rules out static INT8 kernels. ``bf16`` casts all weights and buffers to BF16 and
+    runs the network on BF16 inputs; the outputs are returned in FP32.
+
+    It is called like the PyTorch network, ``restorer(x, return_rgb=False, ...)`` returns ``(image, out_rgbs)``,
+    and is a module, so the compiled path can trace it.
+
+    Args:
+        net (nn.Module): The GFPGAN network, in eval mode and on the CPU for ``int8``.
+        precision (str): One of ``FACE_PRECISIONS``. Default: 'int8'.
+        inplace (bool): Convert ``net`` itself, which frees its FP32 weights, instead of a copy. Default: False.
+    """
+
+    def __init__(self, net, precision='int8', inplace=False):
+        super(QuantizedFaceRestorer, self).__init__()
+        if precision not in FACE_PRECISIONS:
+            raise ValueError(f'Unknown precision {precision}. Choose from {FACE_PRECISIONS}.')
+        self.precision = precision
+        if precision == 'int8':
+            if next(net.parameters()).is_cuda:
+                raise ValueError('Dynamic INT8 quantization only runs on the CPU.')
+            net = torch.ao.quantization.quantize_dynamic(net, {nn.Linear}, dtype=torch.qint8, inplace=inplace)
+        elif precision == 'bf16':
+            net = (net if inplace else copy.deepcopy(net)).to(torch.bfloat16)
+        self.net = net.eval()
+
+    def forward(self, x, **kwargs):
+        if self.precision != 'bf16':
+            return self.net(x, **kwargs)
+        image, out_rgbs = self.net(x.to(torch.bfloat16), **kwargs)
+        return image.float(), [rgb.float() for rgb in out_rgbs]
+
+
+def model_size_mb(net):
+    """Memory of the weights and buffers of a network in MB, including the packed weights of quantized layers."""
+    total = sum(t.numel() * t.element_size() for t in list(net.parameters()) + list(net.buffers()))
+    for module in net.modules():
+        if isinstance(getattr(module, '_packed_params', None), nn.Module):  # a quantized linear
+            weight, bias = module.weight(), module.bias()
+            total += weight.numel() * weight.element_size()
+            total += 0 if bias is None else bias.numel() * bias.element_size()
+    return total / 1024 / 1024
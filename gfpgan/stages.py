@@ -0,0 +1,33 @@
+import time
+from contextlib import contextmanager
+
+
+class StageTimer():
+    """Per-call stage timing and progress reporting for the enhancement pipeline.
+
+    Use it as ``with stages('detect'): ...``. The elapsed time of every stage is accumulated in
+    ``timings`` (seconds), and ``callback(stage, fraction)`` is called with 0 when a stage starts and
+    1 when it ends. Long stages may report intermediate fractions with ``progress``.
+
+    Args:
+        timings (dict): Dict that receives the stage timings. A new dict is used if None.
+        callback (callable): Progress callback ``callback(stage, fraction)``. Default: None.
+    """
+
+    def __init__(self, timings=None, callback=None):
+        self.timings = {} if timings is None else timings
+        self.callback = callback
+
+    @contextmanager
+    def __call__(self, stage):
+        self.progress(stage, 0.)
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[stage] = self.timings.get(stage, 0.) + time.perf_counter() - start
+        self.progress(stage, 1.)
+
+    def progress(self, stage, fraction):
+        if self.callback is not None:
+            self.callback(stage, fraction)
@@ -0,0 +1,261 @@
+import cv2
+import numpy as np
+import os
+import threading
+import torch
+from basicsr.utils.download_util import load_file_from_url
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Background super-resolution networks: name -> (scale, weights url)
+BG_MODELS = {
+    # RRDBNet, 23 blocks, ~16.7M params
+    'realesrgan-x2plus': (2, 'https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.1/RealESRGAN_x2plus.pth'),
+    # SRVGG-style compact network, 32 convs, ~1.2M params
+    'realesr-general-x4v3':
+    (4, 'https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.5.0/realesr-general-x4v3.pth'),
+}
+
+
+def tile_starts(length, tile_size, overlap):
+    """Start offsets of fixed-size tiles covering ``[0, length)``.
+
+    Consecutive tiles overlap by at least ``overlap`` pixels; the last tile is aligned to the end, so every
+    tile has exactly ``tile_size`` pixels (or ``length`` if the image is smaller than one tile).
+    """
+    if length <= tile_size:
+        return [0]
+    step = max(1, tile_size - overlap)
+    starts = list(range(0, length - tile_size, step))
+    starts.append(length - tile_size)
+    return starts
+
+
+def blend_ramp(size, head, tail):
+    """1D blending weights: linear ramps over the ``head``/``tail`` pixels shared with neighbouring tiles.
+
+    Weights are strictly positive, so normalizing by the accumulated weight is always defined.
+    """
+    weights = np.ones(size, dtype=np.float32)
+    if head > 0:
+        weights[:head] = np.arange(1, head + 1, dtype=np.float32) / (head + 1)
+    if tail > 0:
+        weights[size - tail:] = np.minimum(weights[size - tail:],
+                                           np.arange(tail, 0, -1, dtype=np.float32) / (tail + 1))
+    return weights
+
+
+class TiledUpsampler():
+    """Tile-parallel background super-resolution with overlap blending.
+
+    The image is split into fixed-size tiles that overlap their neighbours. Every tile is cut with
+    ``tile_pad`` pixels of context, so the network sees the same receptive field as in the full image, and
+    the overlapping outputs are blended with linear ramps instead of being butted together. On CPU, tiles are
+    processed in parallel by a thread pool (PyTorch releases the GIL during the forward pass); on GPU they
+    are stacked into batches. Tiles are accumulated in a fixed order, so the output does not depend on the
+    number of workers.
+
+    It is a drop-in replacement for ``RealESRGANer.enhance`` and is reentrant: one instance can serve
+    several threads.
+
+    Args:
+        scale (int): Upsampling scale of the network.
+        model_path (str): The path to the pretrained model. It can be urls (will first download it automatically).
+            None keeps the current weights of ``model``.
+        model (nn.Module): The network, e.g. RRDBNet.
+        tile_size (int): Default tile size, overridable per call. Default: 400.
+        tile_pad (int): Context pixels added around every tile and cropped from its output. Default: 10.
+        overlap (int): Minimum overlap between neighbouring tiles, blended in the output. Default: 16.
+        half (bool): Use fp16 on GPU. Default: False.
+        device (torch.device): Default: cuda if available, else cpu.
+        num_workers (int): Tiles processed in parallel on CPU. Default: 1.
+        batch_size (int): Tiles per forward pass. Default: 1.
+    """
+
+    def __init__(self, scale, model_path, model, tile_size=400, tile_pad=10, overlap=16, half=False, device=None,
+                 num_workers=1, batch_size=1):
+        self.scale = scale
+        # RRDBNet pixel-unshuffles x2 models by 2 and x1 models by 4, so tile sides must be multiples of it
+        self.mod_scale = {2: 2, 1: 4}.get(scale, 1)
+        self.tile_size = tile_size
+        self.tile_pad = self._round_up(tile_pad)
+        self.overlap = overlap
+        self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu') if device is None else device
+        self.half = half and self.device.type == 'cuda'
+        self.num_workers = max(1, num_workers)
+        self.batch_size = max(1, batch_size)
+        self._pool = None
+        self._pool_pid = None
+        self._pool_lock = threading.Lock()
+
+        if model_path is not None:
+            if model_path.startswith('https://'):
+                model_path = load_file_from_url(
+                    url=model_path, model_dir=os.path.join(ROOT_DIR, 'gfpgan/weights'), progress=True, file_name=None)
+            loadnet = torch.load(model_path, map_location=torch.device('cpu'))
+            if 'params_ema' in loadnet:
+                keyname = 'params_ema'
+            else:
+                keyname = 'params'
+            model.load_state_dict(loadnet[keyname], strict=True)
+        model.eval()
+        self.model = model.to(self.device)
+        if self.half:
+            self.model = self.model.half()
+
+    def _round_up(self, value):
+        return -(-value // self.mod_scale) * self.mod_scale
+
+    def _round_down(self, value):
+        return max(self.mod_scale, value // self.mod_scale * self.mod_scale)
+
+    def _get_pool(self):
+        # created lazily and per process: a pool inherited through fork has no threads
+        with self._pool_lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix='bg-tile')
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    @torch.no_grad()
+    def _forward(self, padded, boxes, tile_h, tile_w):
+        """Run the network on a batch of tiles. Returns the outputs without their padding, HWC float32."""
+        pad = self.tile_pad
+        batch = np.stack([padded[y:y + tile_h + 2 * pad, x:x + tile_w + 2 * pad] for y, x in boxes])
+        tensor = torch.from_numpy(np.ascontiguousarray(batch.transpose(0, 3, 1, 2))).to(self.device)
+        if self.half:
+            tensor = tensor.half()
+        output = self.model(tensor).clamp_(0, 1)
+        output = output[:, :, pad * self.scale:(pad + tile_h) * self.scale, pad * self.scale:(pad + tile_w) * self.scale]
+        return output.float().cpu().numpy().transpose(0, 2, 3, 1)
+
+    def upsample(self, img, tile_size=None, progress=None):
+        """Upsample an RGB float32 image in [0, 1] by ``scale``.
+
+        Args:
+            img (ndarray): HWC RGB image, float32 in [0, 1].
+            tile_size (int): Tile size for this call. Default: ``self.tile_size``.
+            progress (callable): ``progress(fraction)``, called after every batch of tiles. Default: None.
+
+        Returns:
+            ndarray: HWC RGB float32 image of ``scale`` times the size.
+        """
+        h, w = img.shape[:2]
+        scale, pad = self.scale, self.tile_pad
+        # pad to multiples of mod_scale, then add tile_pad of context around the whole image
+        h_mod, w_mod = self._round_up(h), self._round_up(w)
+        border = cv2.BORDER_REFLECT_101 if min(h, w) > pad + self.mod_scale else cv2.BORDER_REPLICATE
+        padded = cv2.copyMakeBorder(img, pad, pad + h_mod - h, pad, pad + w_mod - w, border)
+
+        tile_size = self._round_down(tile_size or self.tile_size)
+        tile_h, tile_w = min(tile_size, h_mod), min(tile_size, w_mod)
+        overlap = min(self.overlap, tile_size // 2)
+        ys, xs = tile_starts(h_mod, tile_h, overlap), tile_starts(w_mod, tile_w, overlap)
+        weight_y = [blend_ramp(tile_h * scale, (ys[i - 1] + tile_h - y) * scale if i > 0 else 0,
+                               (y + tile_h - ys[i + 1]) * scale if i + 1 < len(ys) else 0) for i, y in enumerate(ys)]
+        weight_x = [blend_ramp(tile_w * scale, (xs[i - 1] + tile_w - x) * scale if i > 0 else 0,
+                               (x + tile_w - xs[i + 1]) * scale if i + 1 < len(xs) else 0) for i, x in enumerate(xs)]
+
+        tiles = [(iy, ix) for iy in range(len(ys)) for ix in range(len(xs))]
+        batches = [tiles[i:i + self.batch_size] for i in range(0, len(tiles), self.batch_size)]
+        jobs = [[(ys[iy], xs[ix]) for iy, ix in batch] for batch in batches]
+        futures = []
+        if self.num_workers > 1 and len(jobs) > 1:
+            pool = self._get_pool()
+            futures = [pool.submit(self._forward, padded, boxes, tile_h, tile_w) for boxes in jobs]
+            results = (future.result() for future in futures)
+        else:
+            results = (self._forward(padded, boxes, tile_h, tile_w) for boxes in jobs)
+
+        output = np.zeros((h_mod * scale, w_mod * scale, 3), dtype=np.float32)
+        weight_sum = np.zeros((h_mod * scale, w_mod * scale, 1), dtype=np.float32)
+        done = 0
+        try:
+            # accumulate in tile order, so the floating-point result does not depend on the worker count
+            for batch, outputs in zip(batches, results):
+                for (iy, ix), tile_out in zip(batch, outputs):
+                    weight = (weight_y[iy][:, None] * weight_x[ix][None, :])[..., None]
+                    oy, ox = ys[iy] * scale, xs[ix] * scale
+                    output[oy:oy + tile_h * scale, ox:ox + tile_w * scale] += tile_out * weight
+                    weight_sum[oy:oy + tile_h * scale, ox:ox + tile_w * scale] += weight
+                done += len(batch)
+                if progress is not None:
+                    progress(done / len(tiles))
+        finally:
+            for future in futures:
+                future.cancel()
+        output /= weight_sum
+        return output[:h * scale, :w * scale]
+
+    def enhance(self, img, outscale=None, tile_size=None, progress=None):
+        """Upsample a BGR (or gray / BGRA, 8 or 16 bit) image, like ``RealESRGANer.enhance``.
+
+        Args:
+            img (ndarray): Input image as read by cv2.
+            outscale (float): Final scale; the network output is resized with Lanczos if it differs from
+                ``scale``. Default: None.
+            tile_size (int): Tile size for this call. Default: ``self.tile_size``.
+            progress (callable): ``progress(fraction)``, called after every batch of tiles. Default: None.
+
+        Returns:
+            tuple: (upsampled image, image mode ``'L'``, ``'RGB'`` or ``'RGBA'``).
+        """
+        h_input, w_input = img.shape[0:2]
+        max_range = 65535 if np.max(img) > 256 else 255
+        img = img.astype(np.float32) / max_range
+        alpha = None
+        if img.ndim == 2:
+            img_mode = 'L'
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
+        elif img.shape[2] == 4:
+            img_mode = 'RGBA'
+            alpha = img[:, :, 3]
+            img = cv2.cvtColor(img[:, :, 0:3], cv2.COLOR_BGR2RGB)
+        else:
+            img_mode = 'RGB'
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+        output = self.upsample(img, tile_size=tile_size, progress=progress)
+        if img_mode == 'L':
+            output = cv2.cvtColor(output, cv2.COLOR_RGB2GRAY)
+        else:
+            output = cv2.cvtColor(output, cv2.COLOR_RGB2BGR)
+        if alpha is not None:
+            h, w = alpha.shape[0:2]
+            alpha = cv2.resize(alpha, (w * self.scale, h * self.scale), interpolation=cv2.INTER_LINEAR)
+            output = cv2.cvtColor(output, cv2.COLOR_BGR2BGRA)
+            output[:, :, 3] = alpha
+
+        if max_range == 65535:
+            output = (output * 65535.0).round().astype(np.uint16)
+        else:
+            output = (output * 255.0).round().astype(np.uint8)
+
+        if outscale is not None and outscale != float(self.scale):
+            output = cv2.resize(
+                output, (int(w_input * outscale), int(h_input * outscale)), interpolation=cv2.INTER_LANCZOS4)
+        return output, img_mode
+
+
+def build_bg_network(name):
+    """Instantiate the (untrained) network of a background model in ``BG_MODELS``."""
+    if name == 'realesrgan-x2plus':
+        from basicsr.archs.rrdbnet_arch import RRDBNet
+        return RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=2)
+    if name == 'realesr-general-x4v3':
+        from realesrgan.archs.srvgg_arch import SRVGGNetCompact
+        return SRVGGNetCompact(num_in_ch=3, num_out_ch=3, num_feat=64, num_conv=32, upscale=4, act_type='prelu')
+    raise ValueError(f'Unknown background model: {name}. Options: {", ".join(BG_MODELS)}')
+
+
+def create_bg_upsampler(name, pretrained=True, **kwargs):
+    """Create a ``TiledUpsampler`` for a background model in ``BG_MODELS``.
+
+    Args:
+        name (str): Model name, e.g. ``realesrgan-x2plus`` or ``realesr-general-x4v3``.
+        pretrained (bool): Load the released weights (downloaded on first use). Default: True.
+        **kwargs: Other ``TiledUpsampler`` arguments (tile_size, tile_pad, overlap, half, ...).
+    """
+    scale, url = BG_MODELS[name]
+    return TiledUpsampler(scale=scale, model_path=url if pretrained else None, model=build_bg_network(name), **kwargs)
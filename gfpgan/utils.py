@@ -1,5 +1,8 @@
+import copy
 import cv2
+import math
 import os
+import threading
 import torch
 from basicsr.utils import img2tensor, tensor2img
 from basicsr.utils.download_util import load_file_from_url
@@ -9,9 +12,42 @@ from torchvision.transforms.functional import normalize
 from gfpgan.archs.gfpgan_bilinear_arch import GFPGANBilinear
 from gfpgan.archs.gfpganv1_arch import GFPGANv1
 from gfpgan.archs.gfpganv1_clean_arch import GFPGANv1Clean
+from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+from gfpgan.batching import FaceBatchScheduler
+from gfpgan.face_cache import FaceLandmarkCache, FaceLandmarks, hash_image
+from gfpgan.stages import StageTimer
+from gfpgan.tiling import TiledUpsampler
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+# StyleGAN2 noise of the face restoration: fresh random noise per call, the stored noise buffers of the
+# checkpoint (deterministic), or no noise at all (deterministic, only for arch 'clean')
+NOISE_MODES = ('random', 'fixed', 'zero')
+
+
+def fit_upscale(height, width, upscale, max_output_pixels=None):
+    """Pick the upscale factor that keeps the output of an image within a pixel budget.
+
+    The largest integer factor not above ``upscale`` whose output fits is used. If the image does not fit
+    even at 1x, it has to be downscaled first by the returned ratio.
+
+    Args:
+        height (int): Input image height.
+        width (int): Input image width.
+        upscale (int): Requested upscale factor.
+        max_output_pixels (int): Output pixel budget. None or 0 means unlimited. Default: None.
+
+    Returns:
+        tuple: ``(upscale, input_ratio)``; ``input_ratio`` < 1 is the resize ratio to apply to the input.
+    """
+    upscale = max(1, int(upscale))
+    if not max_output_pixels or height * width * upscale * upscale <= max_output_pixels:
+        return upscale, 1.
+    fitted = int(math.sqrt(max_output_pixels / (height * width)))
+    if fitted >= 1:
+        return min(upscale, fitted), 1.
+    return 1, math.sqrt(max_output_pixels / (height * width))
+
 
 class GFPGANer():
     """Helper for restoration with GFPGAN.
@@ -27,17 +63,30 @@ class GFPGANer():
         arch (str): The GFPGAN architecture. Option: clean | original. Default: clean.
         channel_multiplier (int): Channel multiplier for large networks of StyleGAN2. Default: 2.
         bg_upsampler (nn.Module): The upsampler for the background. Default: None.
+        optimized_arch (bool): With ``arch='clean'``, use ``GFPGANv1CleanInference`` instead of the stock
+            ``GFPGANv1Clean``: same weights and outputs up to float rounding, fused modulation, and required for
+            ``noise_mode='zero'``. Default: False.
     """
 
-    def __init__(self, model_path, upscale=2, arch='clean', channel_multiplier=2, bg_upsampler=None, device=None):
+    def __init__(self, model_path, upscale=2, arch='clean', channel_multiplier=2, bg_upsampler=None, device=None,
+                 optimized_arch=False):
         self.upscale = upscale
         self.bg_upsampler = bg_upsampler
+        self.face_batcher = None
+        self.landmark_cache = None
+        # precision of self.gfpgan, and the other precisions kept next to it (see enable_precision)
+        self.precision = 'fp32'
+        self.face_tiers = {}
+        self._det_lock = threading.Lock()
+        self._bg_lock = threading.Lock()
 
         # initialize model
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu') if device is None else device
         # initialize the GFP-GAN
         if arch == 'clean':
-            self.gfpgan = GFPGANv1Clean(
+            # optionally the inference-only variant of GFPGANv1Clean: same weights and outputs, fused modulation
+            clean_arch = GFPGANv1CleanInference if optimized_arch else GFPGANv1Clean
+            self.gfpgan = clean_arch(
                 out_size=512,
                 num_style_feat=512,
                 channel_multiplier=channel_multiplier,
@@ -98,51 +147,353 @@ class GFPGANer():
         self.gfpgan.eval()
         self.gfpgan = self.gfpgan.to(self.device)
 
+    def enable_face_batching(self, max_batch_size=8, max_wait_ms=10):
+        """Route face restoration through a dynamic batching scheduler.
+
+        Faces from concurrent ``enhance`` calls are then restored together in one forward pass.
+        """
+        if self.face_batcher is None:
+            self.face_batcher = FaceBatchScheduler(
+                self.gfpgan, self.device, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        return self.face_batcher
+
+    def enable_onnx_backend(self, onnx_path, intra_op_threads=0, inter_op_threads=1):
+        """Run face restoration with ONNX Runtime on a graph exported by ``export_onnx``.
+
+        The exported graph replaces ``self.gfpgan`` (also in the face batcher); detection, parsing and the
+        background stay on PyTorch. The graph is deterministic: its noise mode is fixed at export time and
+        the ``noise_mode`` of ``enhance`` is ignored.
+
+        Args:
+            onnx_path (str): Path to the exported model.
+            intra_op_threads (int): ONNX Runtime threads inside an operator, 0 for all cores. Default: 0.
+            inter_op_threads (int): ONNX Runtime threads across independent operators. Default: 1.
+        """
+        from gfpgan.onnx_backend import OnnxFaceRestorer
+
+        self.gfpgan = OnnxFaceRestorer(onnx_path, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+        if self.face_batcher is not None:
+            self.face_batcher.net = self.gfpgan
+        return self.gfpgan
+
+    def enable_compiled(self, mode='trace', batch_buckets=(1, 2, 4, 8), detector_sizes=((512, 512), ),
+                        noise_mode='fixed', repeat=3):
+        """Run face restoration and detection on compiled graphs, compiled and warmed now.
+
+        GFPGAN gets one graph per batch-size bucket (see ``CompiledFaceRestorer``), compiled for ``noise_mode``;
+        the other deterministic mode is compiled on first use and random noise stays eager. The detector is
+        warmed on ``detector_sizes``. Anything that fails to compile falls back to eager. Calling it again
+        re-measures the steady-state speedup without compiling.
+
+        Args:
+            mode (str): ``'trace'`` (torch.jit.trace) or ``'compile'`` (torch.compile). Default: 'trace'.
+            batch_buckets (list[int]): GFPGAN batch sizes to compile. Default: (1, 2, 4, 8).
+            detector_sizes (list[tuple]): ``(height, width)`` inputs the detector is warmed on; empty to keep the
+                detector eager. Default: ((512, 512), ).
+            noise_mode (str): Noise mode of the warmed GFPGAN graphs. Default: 'fixed'.
+            repeat (int): Timed calls per bucket and size. Default: 3.
+
+        Returns:
+            list[dict]: Per bucket and size: compile time, eager and compiled latency, and speedup.
+        """
+        from gfpgan.compiled import CompiledFaceRestorer, compile_detector
+
+        if not isinstance(self.gfpgan, CompiledFaceRestorer):
+            self.gfpgan = CompiledFaceRestorer(self.gfpgan, mode=mode, batch_buckets=batch_buckets)
+            if self.face_batcher is not None:
+                self.face_batcher.net = self.gfpgan
+        reports = []
+        if noise_mode != 'random':
+            reports += self.gfpgan.warmup(zero_noise=noise_mode == 'zero', repeat=repeat)
+        if detector_sizes:
+            reports += compile_detector(self.face_helper.face_det, mode=mode, sizes=detector_sizes, repeat=repeat)
+        return reports
+
+    def enable_precision(self, precision='int8', replace=False):
+        """Add a reduced-precision face restoration network (see ``QuantizedFaceRestorer``), for the CPU.
+
+        With ``replace`` it converts ``self.gfpgan`` in place, which frees its FP32 weights, and becomes the
+        precision of every call. Otherwise a converted copy is kept next to it, and selected per call with the
+        ``face_precision`` of ``enhance``. Call it before ``enable_compiled`` to compile the reduced-precision
+        network; the copies kept next to it run eager.
+
+        Args:
+            precision (str): ``'bf16'`` or ``'int8'``. Default: 'int8'.
+            replace (bool): Convert ``self.gfpgan`` instead of adding a copy. Default: False.
+        """
+        from gfpgan.quantized import QuantizedFaceRestorer
+
+        if precision == self.precision:
+            return self.gfpgan
+        if not isinstance(self.gfpgan, torch.nn.Module):
+            raise ValueError('Reduced precisions are only supported by the PyTorch backend.')
+        if replace:
+            self.gfpgan = QuantizedFaceRestorer(self.gfpgan, precision, inplace=True)
+            self.precision = precision
+            self.face_tiers.pop(precision, None)
+            if self.face_batcher is not None:
+                self.face_batcher.net = self.gfpgan
+            return self.gfpgan
+        if precision not in self.face_tiers:
+            self.face_tiers[precision] = QuantizedFaceRestorer(self.gfpgan, precision)
+        return self.face_tiers[precision]
+
+    def face_net(self, precision=None):
+        """The face restoration network of a precision: ``self.gfpgan``, or one added by ``enable_precision``."""
+        if precision is None or precision == self.precision:
+            return self.gfpgan
+        if precision not in self.face_tiers:
+            raise ValueError(f'Precision {precision} is not enabled, call enable_precision first.')
+        return self.face_tiers[precision]
+
+    def enable_landmark_cache(self, max_entries=1024):
+        """Cache face landmarks and alignment matrices by image hash.
+
+        Enhancing the same image again (e.g. with another fidelity weight) then skips RetinaFace.
+        """
+        if self.landmark_cache is None:
+            self.landmark_cache = FaceLandmarkCache(max_entries=max_entries)
+        return self.landmark_cache
+
+    def align_faces(self, face_helper, only_center_face=False, image_key=None, stages=None):
+        """Detect, align and crop the faces of ``face_helper.input_img``.
+
+        This is the detection stage of ``enhance``. With the landmark cache enabled, a hit restores the
+        landmarks and affine matrices and only warps the crops; a miss runs RetinaFace and stores them.
+
+        Args:
+            face_helper (FaceRestoreHelper): Per-call context with the image already read.
+            only_center_face (bool): Only keep the face closest to the image center. Default: False.
+            image_key (str): Precomputed hash of the image. Computed from the pixels if None.
+            stages (StageTimer): Records the ``detect`` and ``align`` stages. Default: None.
+
+        Returns:
+            int: Number of aligned faces.
+        """
+        stages = stages or StageTimer()
+        cache = self.landmark_cache
+        key = None
+        faces = None
+        if cache is not None:
+            with stages('detect'):
+                key = (image_key or hash_image(face_helper.input_img), only_center_face)
+                faces = cache.get(key)
+        if faces is not None:
+            with stages('align'):
+                face_helper.all_landmarks_5 = list(faces.landmarks)
+                for affine_matrix in faces.affine_matrices:
+                    face_helper.affine_matrices.append(affine_matrix)
+                    # same warp as FaceRestoreHelper.align_warp_face with border_mode='constant'
+                    cropped_face = cv2.warpAffine(
+                        face_helper.input_img,
+                        affine_matrix,
+                        face_helper.face_size,
+                        borderMode=cv2.BORDER_CONSTANT,
+                        borderValue=(135, 133, 132))
+                    face_helper.cropped_faces.append(cropped_face)
+            return len(faces)
+
+        # get face landmarks for each face
+        # the detector keeps per-call tensors on itself, so detection is serialized
+        with stages('detect'), self._det_lock:
+            face_helper.get_face_landmarks_5(only_center_face=only_center_face, eye_dist_threshold=5)
+        # eye_dist_threshold=5: skip faces whose eye distance is smaller than 5 pixels
+        # TODO: even with eye_dist_threshold, it will still introduce wrong detections and restorations.
+        # align and warp each face
+        with stages('align'):
+            face_helper.align_warp_face()
+        if cache is not None:
+            cache.put(key, FaceLandmarks(face_helper.all_landmarks_5, face_helper.affine_matrices))
+        return len(face_helper.cropped_faces)
+
+    @staticmethod
+    def _face_to_tensor(cropped_face):
+        cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
+        normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
+        return cropped_face_t
+
     @torch.no_grad()
-    def enhance(self, img, has_aligned=False, only_center_face=False, paste_back=True, weight=0.5):
-        self.face_helper.clean_all()
+    def restore_faces(self, cropped_faces, weight=0.5, randomize_noise=True, zero_noise=False, net=None):
+        """Restore aligned 512x512 faces with a batched forward pass.
+
+        Faces whose inference fails are returned unchanged. ``zero_noise`` is only supported by arch 'clean'.
+        ``net`` is the network to use instead of ``self.gfpgan``, e.g. ``self.face_net('int8')``.
+        """
+        if len(cropped_faces) == 0:
+            return []
+        face_tensors = [self._face_to_tensor(cropped_face) for cropped_face in cropped_faces]
+        try:
+            if self.face_batcher is not None:
+                outputs = self.face_batcher.restore(
+                    face_tensors, weight=weight, randomize_noise=randomize_noise, zero_noise=zero_noise, net=net)
+            else:
+                extra = {'zero_noise': True} if zero_noise else {}
+                outputs = (self.gfpgan if net is None else net)(
+                    torch.stack(face_tensors).to(self.device),
+                    return_rgb=False,
+                    weight=weight,
+                    randomize_noise=randomize_noise,
+                    **extra)[0]
+        except RuntimeError as error:
+            print(f'\tFailed inference for GFPGAN: {error}.')
+            return [cropped_face.astype('uint8') for cropped_face in cropped_faces]
+
+        restored_faces = []
+        for output in outputs:
+            # convert to image
+            restored_face = tensor2img(output, rgb2bgr=True, min_max=(-1, 1))
+            restored_faces.append(restored_face.astype('uint8'))
+        return restored_faces
+
+    def face_context(self):
+        """Create a per-call face restoration context.
+
+        The context shares the loaded detection and parsing networks with ``self.face_helper``, but owns
+        all per-image state (input image, landmarks, affine matrices, cropped and restored faces), so that
+        concurrent ``enhance`` calls on one GFPGANer do not corrupt each other's results.
+        """
+        face_helper = copy.copy(self.face_helper)
+        face_helper.clean_all()
+        return face_helper
+
+    @staticmethod
+    def face_area_ratio(face_helper):
+        """Fraction of the image covered by the aligned crop of its only face.
+
+        It is computed from the affine matrix, so it is also available when the landmarks come from the cache.
+
+        Returns:
+            float: Ratio in [0, 1]; 0 unless exactly one face was aligned.
+        """
+        if len(face_helper.affine_matrices) != 1:
+            return 0.
+        matrix = face_helper.affine_matrices[0]
+        scale = math.sqrt(abs(matrix[0, 0] * matrix[1, 1] - matrix[0, 1] * matrix[1, 0]))
+        h, w = face_helper.input_img.shape[0:2]
+        side_w, side_h = face_helper.face_size[0] / scale, face_helper.face_size[1] / scale
+        return min(1., side_w * side_h / (h * w))
+
+    def _watch_bg_tiles(self, bg_upsampler, img, stages):
+        """Report per-tile progress of the background upsampler by counting forward calls of its model."""
+        model = getattr(bg_upsampler, 'model', None)
+        if stages.callback is None or model is None or not hasattr(model, 'register_forward_hook'):
+            return None
+        h, w = img.shape[:2]
+        tile_size = getattr(bg_upsampler, 'tile_size', 0)
+        pre_pad = getattr(bg_upsampler, 'pre_pad', 0)
+        num_tiles = math.ceil((w + pre_pad) / tile_size) * math.ceil((h + pre_pad) / tile_size) if tile_size else 1
+        done = [0]
+
+        def hook(module, inputs, output):
+            done[0] += 1
+            stages.progress('background', min(1., done[0] / num_tiles))
+
+        return model.register_forward_hook(hook)
+
+    @torch.no_grad()
+    def enhance(self, img, has_aligned=False, only_center_face=False, paste_back=True, weight=0.5,
+                randomize_noise=True, image_key=None, timings=None, progress_callback=None, bg_tile=None,
+                bg_upsampler='default', portrait_ratio=None, details=None, upscale=None, noise_mode=None,
+                face_precision=None):
+        """Restore faces in an image. It is reentrant: one GFPGANer can serve several threads.
+
+        Args:
+            randomize_noise (bool): Draw fresh StyleGAN2 noise for every call. Set to False to use the
+                stored noise buffers, which makes the output deterministic. Default: True.
+            image_key (str): Optional content hash of ``img`` for the landmark cache, e.g. the hash of the
+                uploaded file. Default: None.
+            timings (dict): If given, receives the seconds spent in each stage: ``detect``, ``align``,
+                ``restore``, ``background`` and ``paste``. Default: None.
+            progress_callback (callable): ``progress_callback(stage, fraction)``, called when a stage starts
+                (0) and ends (1), and after every background tile. Default: None.
+            bg_tile (int): Background tile size for this call. Only used with a ``TiledUpsampler``; its
+                default tile size is used if None. Default: None.
+            bg_upsampler: Background upsampler for this call, e.g. to pick a cheaper model per request. None
+                resizes the background with Lanczos. Default: 'default', the upsampler given at construction.
+            portrait_ratio (float): Portrait-crop fast path. If the image has a single face whose aligned crop
+                covers at least this fraction of it (see ``face_area_ratio``), the background is resized with
+                Lanczos instead of running the upsampler. Default: None (disabled).
+            details (dict): If given, receives ``background``: ``'upsampler'``, ``'resize'`` or ``'skipped'``,
+                and ``face_area_ratio``. Default: None.
+            upscale (int): Upscale of the output for this call; the background and the pasted faces follow it.
+                See ``fit_upscale`` to bound the output size. Default: None, the upscale given at construction.
+            noise_mode (str): One of ``NOISE_MODES``, overrides ``randomize_noise``. ``'fixed'`` uses the stored
+                noise buffers and ``'zero'`` (``optimized_arch`` only) skips the noise injection; both make identical
+                calls return identical faces, and neither draws random numbers. Default: None.
+            face_precision (str): Precision of the face restoration network for this call, ``self.precision`` or
+                one added with ``enable_precision``. Default: None, ``self.precision``.
+        """
+        net = self.face_net(face_precision)
+        zero_noise = False
+        if noise_mode is not None:
+            if noise_mode not in NOISE_MODES:
+                raise ValueError(f'Unknown noise_mode {noise_mode}. Choose from {NOISE_MODES}.')
+            # the ONNX backend is not a torch module and ignores the noise mode
+            arch_net = net
+            while isinstance(getattr(arch_net, 'net', None), torch.nn.Module):  # compiled path, reduced precision
+                arch_net = arch_net.net
+            if noise_mode == 'zero' and isinstance(arch_net, torch.nn.Module) and not isinstance(
+                    arch_net, GFPGANv1CleanInference):
+                raise ValueError("noise_mode 'zero' is only supported by arch 'clean' with optimized_arch=True.")
+            randomize_noise = noise_mode == 'random'
+            zero_noise = noise_mode == 'zero'
+        details = {} if details is None else details
+        if isinstance(bg_upsampler, str) and bg_upsampler == 'default':
+            bg_upsampler = self.bg_upsampler
+        upscale = self.upscale if upscale is None else upscale
+        stages = StageTimer(timings, progress_callback)
+        face_helper = self.face_context()
+        face_helper.upscale_factor = upscale
 
         if has_aligned:  # the inputs are already aligned
             img = cv2.resize(img, (512, 512))
-            self.face_helper.cropped_faces = [img]
+            face_helper.cropped_faces = [img]
         else:
-            self.face_helper.read_image(img)
-            # get face landmarks for each face
-            self.face_helper.get_face_landmarks_5(only_center_face=only_center_face, eye_dist_threshold=5)
-            # eye_dist_threshold=5: skip faces whose eye distance is smaller than 5 pixels
-            # TODO: even with eye_dist_threshold, it will still introduce wrong detections and restorations.
-            # align and warp each face
-            self.face_helper.align_warp_face()
-
-        # face restoration
-        for cropped_face in self.face_helper.cropped_faces:
-            # prepare data
-            cropped_face_t = img2tensor(cropped_face / 255., bgr2rgb=True, float32=True)
-            normalize(cropped_face_t, (0.5, 0.5, 0.5), (0.5, 0.5, 0.5), inplace=True)
-            cropped_face_t = cropped_face_t.unsqueeze(0).to(self.device)
-
-            try:
-                output = self.gfpgan(cropped_face_t, return_rgb=False, weight=weight)[0]
-                # convert to image
-                restored_face = tensor2img(output.squeeze(0), rgb2bgr=True, min_max=(-1, 1))
-            except RuntimeError as error:
-                print(f'\tFailed inference for GFPGAN: {error}.')
-                restored_face = cropped_face
-
-            restored_face = restored_face.astype('uint8')
-            self.face_helper.add_restored_face(restored_face)
+            face_helper.read_image(img)
+            self.align_faces(face_helper, only_center_face=only_center_face, image_key=image_key, stages=stages)
+
+        # face restoration, all faces of the image in one batch
+        with stages('restore'):
+            for restored_face in self.restore_faces(face_helper.cropped_faces, weight=weight,
+                                                    randomize_noise=randomize_noise, zero_noise=zero_noise,
+                                                    net=None if net is self.gfpgan else net):
+                face_helper.add_restored_face(restored_face)
 
         if not has_aligned and paste_back:
+            details['face_area_ratio'] = self.face_area_ratio(face_helper)
+            if portrait_ratio is not None and details['face_area_ratio'] >= portrait_ratio:
+                # a tight portrait crop: the face is pasted over most of the frame anyway
+                bg_upsampler = None
+            details['background'] = 'resize' if bg_upsampler is None else 'upsampler'
             # upsample the background
-            if self.bg_upsampler is not None:
+            if isinstance(bg_upsampler, TiledUpsampler):
+                # reentrant, tiles of concurrent calls share the upsampler's worker pool
+                with stages('background'):
+                    bg_img = bg_upsampler.enhance(
+                        img, outscale=upscale, tile_size=bg_tile,
+                        progress=lambda fraction: stages.progress('background', fraction))[0]
+            elif bg_upsampler is not None:
                 # Now only support RealESRGAN for upsampling background
-                bg_img = self.bg_upsampler.enhance(img, outscale=self.upscale)[0]
+                # RealESRGANer stores the image being processed on itself, so it is not reentrant
+                with stages('background'), self._bg_lock:
+                    tile_hook = self._watch_bg_tiles(bg_upsampler, img, stages)
+                    try:
+                        bg_img = bg_upsampler.enhance(img, outscale=upscale)[0]
+                    finally:
+                        if tile_hook is not None:
+                            tile_hook.remove()
             else:
-                bg_img = None
+                # the same Lanczos resize paste_faces_to_input_image would do, timed as the background stage
+                with stages('background'):
+                    h, w = face_helper.input_img.shape[0:2]
+                    bg_img = cv2.resize(face_helper.input_img, (int(w * upscale), int(h * upscale)),
+                                        interpolation=cv2.INTER_LANCZOS4)
 
-            self.face_helper.get_inverse_affine(None)
-            # paste each restored face to the input image
-            restored_img = self.face_helper.paste_faces_to_input_image(upsample_img=bg_img)
-            return self.face_helper.cropped_faces, self.face_helper.restored_faces, restored_img
+            with stages('paste'):
+                face_helper.get_inverse_affine(None)
+                # paste each restored face to the input image
+                restored_img = face_helper.paste_faces_to_input_image(upsample_img=bg_img)
+            return face_helper.cropped_faces, face_helper.restored_faces, restored_img
         else:
-            return self.face_helper.cropped_faces, self.face_helper.restored_faces, None
+            details['background'] = 'skipped'
+            return face_helper.cropped_faces, face_helper.restored_faces, None
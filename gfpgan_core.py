@@ -1,19 +1,109 @@
 #!/usr/bin/env python3
 """
 PhotoEnhanceAI - GFPGAN 命令行工具
-独立的 GFPGAN 图像增强命令行接口
+独立的 GFPGAN 图像增强命令行接口，与API服务使用同一个进程内推理引擎 (api/model_manager.py)：
+模型只加载一次并常驻内存，多张图片由推理执行器的工作线程/进程并行处理
 
 使用方法:
-python PhotoEnhanceAI/gfpgan_core.py --input PhotoEnhanceAI/input/test001.jpg --output PhotoEnhanceAI/output/test001_enhanced.jpg --scale 4
+python gfpgan_core.py --input input/test001.jpg --output output/test001_enhanced.jpg --scale 4
+python gfpgan_core.py --input input/ 'photos/*.png' --output output/ --workers 2
+find photos -name '*.jpg' | python gfpgan_core.py --input - --output output/
 """
 
 import argparse
+import asyncio
+import glob
 import os
 import sys
-import subprocess
 import time
-import shutil
 from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).parent
+SUPPORTED_FORMATS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+OUTPUT_EXTENSIONS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.webp': 'webp'}
+# 命令行质量等级 → API的 quality_level（balanced 为旧版本的名称）
+QUALITY_LEVELS = {'fast': 'fast', 'balanced': 'medium', 'medium': 'medium', 'high': 'high'}
+
+
+def collect_inputs(sources: List[str]) -> List[Path]:
+    """展开输入：文件、通配符、目录（其中的图片文件），'-' 表示从标准输入逐行读取路径"""
+    paths: List[Path] = []
+    for source in sources:
+        if source == '-':
+            paths.extend(collect_inputs([line.strip() for line in sys.stdin if line.strip()]))
+        elif os.path.isdir(source):
+            paths.extend(sorted(p for p in Path(source).iterdir()
+                                if p.is_file() and p.suffix.lower() in SUPPORTED_FORMATS))
+        elif glob.has_magic(source):
+            paths.extend(sorted(Path(p) for p in glob.glob(source, recursive=True)
+                                if Path(p).suffix.lower() in SUPPORTED_FORMATS))
+        else:
+            paths.append(Path(source))
+    # 去重并保持顺序
+    return list(dict.fromkeys(paths))
+
+
+def plan_outputs(inputs: List[Path], output: str, extension: str) -> Dict[Path, Path]:
+    """输入 → 输出路径；单张图片且 --output 带图片扩展名时直接写到该路径，否则写入输出目录"""
+    output_path = Path(output)
+    if len(inputs) == 1 and output_path.suffix.lower() in OUTPUT_EXTENSIONS:
+        return {inputs[0]: output_path}
+    plan: Dict[Path, Path] = {}
+    used = set()
+    for src in inputs:
+        name = f"{src.stem}_enhanced{extension}"
+        index = 1
+        while name in used:  # 不同目录下的同名图片
+            name = f"{src.stem}_{index}_enhanced{extension}"
+            index += 1
+        used.add(name)
+        plan[src] = output_path / name
+    return plan
+
+
+async def run_batch(plan: Dict[Path, Path], options: dict) -> List[dict]:
+    """把所有图片提交给推理执行器，按完成顺序输出进度"""
+    from model_manager import model_manager
+
+    load_start = time.time()
+    await model_manager.initialize()
+    print(f"✅ 模型加载完成 ({time.time() - load_start:.1f}秒)，工作线程/进程: {model_manager.executor.max_workers}")
+    print()
+
+    async def process(src: Path, dst: Path) -> dict:
+        start = time.time()
+        try:
+            result = await model_manager.enhance_image(str(src), str(dst), **options)
+        except Exception as e:
+            return {'input': str(src), 'output': str(dst), 'error': str(e), 'time': time.time() - start}
+        return {
+            'input': str(src),
+            'output': str(dst),
+            'time': time.time() - start,
+            'scale': result.scale,
+            'output_size': result.output_size,
+            'output_bytes': len(result.encoded),
+            'num_faces': result.num_faces
+        }
+
+    results = []
+    try:
+        tasks = [asyncio.ensure_future(process(src, dst)) for src, dst in plan.items()]
+        for done in asyncio.as_completed(tasks):
+            item = await done
+            results.append(item)
+            prefix = f"[{len(results)}/{len(tasks)}]"
+            if 'error' in item:
+                print(f"{prefix} ❌ {item['input']}: {item['error']}")
+            else:
+                width, height = item['output_size']
+                print(f"{prefix} ✅ {item['input']} → {item['output']} "
+                      f"({width}x{height}, {item['scale'] or '-'}x, {item['num_faces']}张人脸, {item['time']:.1f}秒)")
+    finally:
+        model_manager.shutdown()
+    return results
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -23,66 +113,138 @@ def main():
 🎨 GFPGAN 功能特点:
   ✅ AI人脸修复和美化
   ✅ RealESRGAN背景超分辨率
-  ✅ 1-16倍分辨率放大
+  ✅ 1 到 MAX_UPSCALE 倍分辨率放大（受 MAX_OUTPUT_PIXELS 输出像素上限约束）
   ✅ 一步到位处理
 
 📊 性能优势:
-  🚀 速度: 比传统流水线快7倍
+  🚀 进程内推理: 模型只加载一次，多张图片并行处理
   💾 显存: 智能瓦片处理
   🎯 效果: 人脸+背景同步优化
 
 使用示例:
-  python PhotoEnhanceAI/gfpgan_core.py --input PhotoEnhanceAI/input/test001.jpg --output PhotoEnhanceAI/output/test001_enhanced.jpg --scale 4
-  python PhotoEnhanceAI/gfpgan_core.py --input PhotoEnhanceAI/input/test001.jpg --output PhotoEnhanceAI/output/test001_enhanced.jpg --scale 2 --quality fast
+  python gfpgan_core.py --input input/test001.jpg --output output/test001_enhanced.jpg --scale 4
+  python gfpgan_core.py --input input/test001.jpg --output output/test001_enhanced.jpg --scale 2 --quality fast
+  python gfpgan_core.py --input input/ 'photos/**/*.jpg' --output output/ --workers 2
+  find photos -name '*.png' | python gfpgan_core.py --input - --output output/ --format webp
         """
     )
-    
+
     parser.add_argument(
-        '--input', '-i', 
+        '--input', '-i',
         required=True,
-        help='输入图像路径'
+        nargs='+',
+        help='输入图像：文件、通配符、目录，或 - 表示从标准输入读取路径列表'
     )
-    
+
     parser.add_argument(
         '--output', '-o',
-        required=True, 
-        help='输出图像路径'
+        required=True,
+        help='输出路径：单张图片时可为文件路径，多张图片时为输出目录'
     )
-    
+
     parser.add_argument(
         '--scale', '-s',
         type=int,
         default=4,
-        choices=[1, 2, 4, 8, 10, 16],
-        help='分辨率放大倍数 (默认: 4倍)'
+        metavar='N',
+        help='分辨率放大倍数，范围 1 到 MAX_UPSCALE，与API相同 (默认: 4倍)'
     )
-    
+
     parser.add_argument(
         '--quality',
-        choices=['fast', 'balanced', 'high'],
+        choices=list(QUALITY_LEVELS),
         default='balanced',
-        help='处理质量等级 (默认: balanced)'
+        help='处理质量等级，决定背景处理方式 (默认: balanced，即API的medium)'
     )
-    
+
     parser.add_argument(
         '--tile-size',
         type=int,
         default=400,
         help='瓦片大小，影响显存使用 (默认: 400)'
     )
-    
+
+    parser.add_argument(
+        '--format',
+        choices=['jpeg', 'png', 'webp'],
+        default=None,
+        help='输出格式 (默认: 按输出文件扩展名，目录输出时为 OUTPUT_FORMAT 配置)'
+    )
+
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=None,
+        help='并行处理的推理工作线程/进程数 (默认: INFERENCE_WORKERS 配置)'
+    )
+
+    parser.add_argument(
+        '--executor',
+        choices=['thread', 'process'],
+        default=None,
+        help='推理执行器模式 (默认: INFERENCE_EXECUTOR 配置)'
+    )
+
+    parser.add_argument(
+        '--max-output-pixels',
+        type=int,
+        default=None,
+        help='单张输出图片的像素上限，0表示不限制 (默认: MAX_OUTPUT_PIXELS 配置)'
+    )
+
+    parser.add_argument(
+        '--noise-mode',
+        choices=['random', 'fixed', 'zero'],
+        default=None,
+        help='人脸修复的噪声模式，fixed/zero 下相同输入结果完全一致 (默认: NOISE_MODE 配置)'
+    )
+
+    parser.add_argument(
+        '--face-precision',
+        choices=['fp32', 'bf16', 'int8'],
+        default=None,
+        help='人脸修复网络的精度 (CPU)，bf16/int8 降低内存占用 (默认: FACE_PRECISION 配置)'
+    )
+
     args = parser.parse_args()
-    
-    # 验证输入文件
-    if not os.path.exists(args.input):
-        print(f"❌ 错误: 输入文件不存在: {args.input}")
+
+    inputs = collect_inputs(args.input)
+    if not inputs:
+        print("❌ 错误: 没有找到输入图片")
+        sys.exit(1)
+    missing = [str(p) for p in inputs if not p.is_file()]
+    if missing:
+        print(f"❌ 错误: 输入文件不存在: {', '.join(missing)}")
         sys.exit(1)
-    
-    # 创建输出目录
-    output_dir = os.path.dirname(args.output)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
-    
+
+    # 推理引擎从环境变量读取配置，必须在导入 api 模块之前设置
+    quality_level = QUALITY_LEVELS[args.quality]
+    if args.workers is not None:
+        os.environ['INFERENCE_WORKERS'] = str(max(1, args.workers))
+    if args.executor is not None:
+        os.environ['INFERENCE_EXECUTOR'] = args.executor
+    if args.max_output_pixels is not None:
+        os.environ['MAX_OUTPUT_PIXELS'] = str(args.max_output_pixels)
+    if args.face_precision is not None:
+        os.environ['FACE_PRECISION'] = args.face_precision
+    os.environ.setdefault('BG_PRELOAD_QUALITY', quality_level)
+    sys.path.insert(0, str(PROJECT_ROOT / "api"))
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+    from config.settings import settings
+    from output_encoder import OUTPUT_FORMATS
+
+    if not 1 <= args.scale <= settings.MAX_UPSCALE:
+        parser.error(f"--scale 必须在 1 到 {settings.MAX_UPSCALE} (MAX_UPSCALE) 之间")
+    if (args.noise_mode or settings.NOISE_MODE) == 'zero' and not (
+            settings.FACE_OPTIMIZED_ARCH or settings.FACE_BACKEND == 'onnx'):
+        parser.error("--noise-mode zero 需要设置 FACE_OPTIMIZED_ARCH=true")
+
+    output_format = args.format or OUTPUT_EXTENSIONS.get(Path(args.output).suffix.lower(), settings.OUTPUT_FORMAT)
+    plan = plan_outputs(inputs, args.output, OUTPUT_FORMATS[output_format]['extension'])
+    for dst in set(plan.values()):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+
     # 根据质量等级调整参数
     if args.quality == 'fast':
         tile_size = min(args.tile_size, 256)
@@ -90,124 +252,49 @@ def main():
         tile_size = args.tile_size
     else:  # balanced
         tile_size = min(args.tile_size, 400)
-    
+
     print("🎨 PhotoEnhanceAI - GFPGAN 图像增强")
     print("=" * 50)
-    print(f"📁 输入文件: {args.input}")
-    print(f"📁 输出文件: {args.output}")
-    print(f"📈 放大倍数: {args.scale}x")
-    print(f"🎯 处理质量: {args.quality}")
+    print(f"📁 输入图片: {len(inputs)} 张" + (f" ({inputs[0]})" if len(inputs) == 1 else ""))
+    print(f"📁 输出位置: {args.output}")
+    print(f"📈 放大倍数: {args.scale}x (输出上限 {settings.MAX_OUTPUT_PIXELS / 1e6:.0f}MP)"
+          if settings.MAX_OUTPUT_PIXELS else f"📈 放大倍数: {args.scale}x")
+    print(f"🎯 处理质量: {args.quality} (quality_level={quality_level})")
     print(f"🔧 瓦片大小: {tile_size}")
+    print(f"🖼️ 输出格式: {output_format}")
     print()
-    
-    print("✨ GFPGAN功能包含:")
-    print("  🎭 AI人脸修复和美化")
-    print("  🖼️  RealESRGAN背景超分辨率")
-    print(f"  📏 {args.scale}倍分辨率提升")
-    print("  ⚡ 一步到位处理")
+
+    print("🚀 开始GFPGAN处理...")
+    start_time = time.time()
+    results = asyncio.run(run_batch(plan, {
+        'tile_size': tile_size,
+        'output_format': output_format,
+        'output_quality': settings.OUTPUT_QUALITY,
+        'quality_level': quality_level,
+        'scale': args.scale,
+        'noise_mode': args.noise_mode
+    }))
+    total_time = time.time() - start_time
+
+    succeeded = [r for r in results if 'error' not in r]
+    failed = len(results) - len(succeeded)
     print()
-    
-    # 检查环境
-    gfpgan_env = "/root/PhotoEnhanceAI/gfpgan_env"
-    project_dir = "/root/PhotoEnhanceAI"
-    
-    if not os.path.exists(gfpgan_env):
-        print(f"❌ 错误: GFPGAN环境不存在: {gfpgan_env}")
-        sys.exit(1)
-    
-    if not os.path.exists(os.path.join(project_dir, "gfpgan", "inference_gfpgan.py")):
-        print(f"❌ 错误: GFPGAN脚本不存在: {project_dir}/gfpgan/inference_gfpgan.py")
+    print("📊 处理结果:")
+    print(f"├─ 成功: {len(succeeded)} 张" + (f"，失败: {failed} 张" if failed else ""))
+    print(f"├─ 总耗时: {total_time:.1f}秒 (含模型加载)")
+    if succeeded:
+        output_mb = sum(r['output_bytes'] for r in succeeded) / (1024 * 1024)
+        print(f"├─ 单张平均: {sum(r['time'] for r in succeeded) / len(succeeded):.1f}秒")
+        print(f"├─ 输出大小: {output_mb:.1f}MB")
+    print(f"└─ 吞吐量: {len(succeeded) / total_time:.2f} 张/秒")
+
+    if len(plan) == 1 and succeeded:
+        print()
+        print(f"📁 结果文件位置:")
+        print(f"  - 完整增强图像: {succeeded[0]['output']}")
+
+    if failed:
         sys.exit(1)
-    
-    # 创建临时输出目录
-    temp_dir = "/tmp/gfpgan_cli_temp"
-    os.makedirs(temp_dir, exist_ok=True)
-    
-    try:
-        print("🚀 开始GFPGAN处理...")
-        start_time = time.time()
-        
-        # 构建GFPGAN命令
-        cmd = [
-            "bash", "-c",
-            f"""
-            source {gfpgan_env}/bin/activate && \
-            cd {project_dir} && \
-            python gfpgan/inference_gfpgan.py \
-                -i '{args.input}' \
-                -o '{temp_dir}' \
-                -v 1.4 \
-                -s {args.scale} \
-                --bg_upsampler realesrgan \
-                --bg_tile {tile_size} \
-                --suffix enhanced
-            """
-        ]
-        
-        # 执行处理
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        processing_time = time.time() - start_time
-        
-        if result.returncode == 0:
-            print("✅ GFPGAN处理完成!")
-            print()
-            
-            # 移动文件从临时目录到最终输出目录
-            temp_restored_imgs = os.path.join(temp_dir, "restored_imgs")
-            temp_restored_faces = os.path.join(temp_dir, "restored_faces")
-            temp_cropped_faces = os.path.join(temp_dir, "cropped_faces")
-            temp_cmp = os.path.join(temp_dir, "cmp")
-            
-            # 直接移动增强图像到API指定的输出路径
-            if os.path.exists(temp_restored_imgs):
-                for file in os.listdir(temp_restored_imgs):
-                    if file.endswith('.jpg') and 'enhanced' in file:
-                        src_file = os.path.join(temp_restored_imgs, file)
-                        dst_file = args.output  # 直接输出到API指定的确切路径
-                        # 如果目标文件已存在，先删除
-                        if os.path.exists(dst_file):
-                            os.remove(dst_file)
-                        shutil.move(src_file, dst_file)
-                        break
-            
-            # 检查文件是否成功输出到指定路径
-            if os.path.exists(args.output):
-                enhanced_file = args.output
-                output_size = os.path.getsize(enhanced_file) / (1024 * 1024)  # MB
-                input_size = os.path.getsize(args.input) / (1024 * 1024)  # MB
-                
-                print("📊 处理结果:")
-                print(f"├─ 输入文件: {os.path.basename(args.input)} ({input_size:.1f}MB)")
-                print(f"├─ 输出文件: {os.path.basename(args.output)} ({output_size:.1f}MB)")
-                print(f"├─ 处理时间: {processing_time:.1f}秒")
-                print(f"├─ 放大倍数: {args.scale}x")
-                print(f"└─ 文件增长: {output_size/input_size:.1f}x")
-                print()
-                
-                print("🎉 增强效果:")
-                print("✅ 人脸修复: AI智能修复面部细节")
-                print("✅ 背景增强: RealESRGAN超分辨率处理")
-                print(f"✅ 分辨率提升: {args.scale}倍清晰度增强")
-                print("✅ 整体优化: 一体化处理保证质量一致性")
-                print()
-                
-                print(f"📁 结果文件位置:")
-                print(f"  - 完整增强图像: {enhanced_file}")
-                
-            else:
-                print("❌ 错误: 未找到增强后的图像文件")
-                sys.exit(1)
-                
-        else:
-            print("❌ GFPGAN处理失败:")
-            print(result.stderr)
-            sys.exit(1)
-            
-    finally:
-        # 清理临时文件
-        if os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir)
-        print("🧹 已清理临时文件")
 
 if __name__ == "__main__":
     main()
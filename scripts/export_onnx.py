@@ -0,0 +1,63 @@
+import argparse
+import os
+import torch
+
+from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+from gfpgan.onnx_backend import ONNX_NOISE_MODES, export_onnx
+
+
+def main():
+    """Export the GFPGANv1Clean face restoration network to ONNX (fixed 512x512 input, dynamic batch).
+
+    The exported graph is used by the ONNX Runtime backend (``GFPGANer.enable_onnx_backend``, or
+    ``FACE_BACKEND=onnx`` for the API).
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--model_path', type=str, default='models/gfpgan/GFPGANv1.4.pth', help='GFPGANv1Clean checkpoint')
+    parser.add_argument('--output', type=str, default='models/gfpgan/GFPGANv1.4.onnx', help='Output ONNX model')
+    parser.add_argument(
+        '--noise_mode',
+        type=str,
+        default='fixed',
+        choices=ONNX_NOISE_MODES,
+        help='StyleGAN2 noise baked into the graph: the stored noise (fixed) or none (zero). Default: fixed')
+    parser.add_argument('--channel_multiplier', type=int, default=2, help='Channel multiplier of StyleGAN2')
+    parser.add_argument('--opset', type=int, default=13, help='ONNX opset version. Default: 13')
+    parser.add_argument('--no_verify', action='store_true', help='Skip the check against PyTorch')
+    args = parser.parse_args()
+
+    net = GFPGANv1CleanInference(
+        out_size=512,
+        num_style_feat=512,
+        channel_multiplier=args.channel_multiplier,
+        decoder_load_path=None,
+        fix_decoder=False,
+        num_mlp=8,
+        input_is_latent=True,
+        different_w=True,
+        narrow=1,
+        sft_half=True)
+    loadnet = torch.load(args.model_path, map_location='cpu')
+    keyname = 'params_ema' if 'params_ema' in loadnet else 'params'
+    net.load_state_dict(loadnet[keyname], strict=True)
+    net.eval()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    export_onnx(net, args.output, noise_mode=args.noise_mode, opset_version=args.opset)
+    print(f'Exported {args.model_path} to {args.output} (noise: {args.noise_mode}, '
+          f'{os.path.getsize(args.output) / 1024 / 1024:.1f}MB)')
+
+    if not args.no_verify:
+        from gfpgan.onnx_backend import OnnxFaceRestorer
+
+        # a batch size other than the traced one also checks the dynamic batch axis
+        x = torch.randn(2, 3, 512, 512)
+        with torch.no_grad():
+            expected = net(x, randomize_noise=False, zero_noise=args.noise_mode == 'zero')[0]
+        actual = OnnxFaceRestorer(args.output)(x)[0]
+        print(f'Max abs error vs PyTorch at batch 2: {(expected - actual).abs().max().item():.2e}')
+
+
+if __name__ == '__main__':
+    main()
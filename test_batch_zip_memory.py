@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 批量下载ZIP内存测试脚本
+对比 旧实现(io.BytesIO + ZIP_DEFLATED + getvalue) 与 流式ZIP(STORED, 逐块输出) 在不同批量大小下的
+峰值内存与耗时，验证流式ZIP的峰值内存不随批量大小增长
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录与api目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "api"))
+
+from inference_executor import read_process_memory
+from zip_stream import ZipStreamWriter
+
+class BatchZipMemoryTester:
+    """批量ZIP内存测试器"""
+
+    def __init__(self, file_size_mb: float):
+        self.file_size = int(file_size_mb * 1024 * 1024)
+        self.work_dir = Path(tempfile.mkdtemp(prefix="zip_memory_test_"))
+
+    def create_results(self, count: int) -> List[Path]:
+        """生成模拟的增强结果文件（随机字节，与JPEG一样不可再压缩）"""
+        paths = []
+        for i in range(count):
+            path = self.work_dir / f"enhanced_{i:03d}.jpg"
+            if not path.exists():
+                path.write_bytes(os.urandom(self.file_size))
+            paths.append(path)
+        return paths
+
+    @staticmethod
+    def build_bytesio_zip(paths: List[Path]) -> int:
+        """旧实现：整个ZIP在内存中构建后再复制一份作为响应体"""
+        zip_buffer = io.BytesIO()
+        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for path in paths:
+                zip_file.write(path, path.name)
+        zip_buffer.seek(0)
+        content = zip_buffer.getvalue()
+        return len(content)
+
+    @staticmethod
+    async def consume_stream_zip(paths: List[Path]) -> int:
+        """流式实现：模拟客户端逐块接收"""
+        writer = ZipStreamWriter()
+        total = 0
+        for path in paths:
+            async for chunk in writer.add_file(path, path.name):
+                total += len(chunk)
+        total += len(writer.close())
+        return total
+
+    def measure(self, name: str, fn) -> Dict:
+        tracemalloc.start()
+        rss_before = read_process_memory(os.getpid())['rss_mb']
+        start = time.time()
+        size = fn()
+        elapsed = time.time() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'method': name,
+            'zip_mb': size / 1024 / 1024,
+            'peak_alloc_mb': peak / 1024 / 1024,
+            'rss_growth_mb': read_process_memory(os.getpid())['rss_mb'] - rss_before,
+            'time': elapsed
+        }
+
+    def run(self, batch_sizes: List[int]) -> List[Dict]:
+        print("🧪 批量下载ZIP内存测试")
+        print("=" * 72)
+        print(f"📦 单个结果文件 {self.file_size / 1024 / 1024:.1f}MB\n")
+        print(f"{'批量':>6}{'实现':>10}{'ZIP大小(MB)':>14}{'峰值分配(MB)':>16}{'RSS增长(MB)':>14}{'耗时(s)':>10}")
+
+        results = []
+        try:
+            for batch_size in batch_sizes:
+                paths = self.create_results(batch_size)
+                # 先测流式实现，避免旧实现扩大后的堆影响RSS读数
+                for name, fn in (
+                    ('stream', lambda: asyncio.run(self.consume_stream_zip(paths))),
+                    ('bytesio', lambda: self.build_bytesio_zip(paths)),
+                ):
+                    result = self.measure(name, fn)
+                    result['batch_size'] = batch_size
+                    results.append(result)
+                    print(f"{batch_size:>6}{name:>10}{result['zip_mb']:>14.1f}{result['peak_alloc_mb']:>16.1f}"
+                          f"{result['rss_growth_mb']:>14.1f}{result['time']:>10.2f}")
+        finally:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+
+        stream_peaks = [r['peak_alloc_mb'] for r in results if r['method'] == 'stream']
+        bytesio_peaks = [r['peak_alloc_mb'] for r in results if r['method'] == 'bytesio']
+        print("\n" + "=" * 72)
+        print(f"📊 流式ZIP峰值分配: {min(stream_peaks):.1f} ~ {max(stream_peaks):.1f}MB")
+        print(f"📊 BytesIO峰值分配: {min(bytesio_peaks):.1f} ~ {max(bytesio_peaks):.1f}MB")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "batch_zip_memory_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'file_size_mb': self.file_size / 1024 / 1024,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='批量下载ZIP内存测试')
+    parser.add_argument('--file-size', type=float, default=8.0, help='单个结果文件大小(MB)，4倍超分结果通常为5-15MB')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[5, 10, 20], help='测试的批量大小')
+    args = parser.parse_args()
+
+    tester = BatchZipMemoryTester(args.file_size)
+    results = tester.run(args.batch_sizes)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
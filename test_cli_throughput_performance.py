@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 命令行工具吞吐量测试脚本
+对比两种命令行处理一批图片的整体吞吐量（张/秒，含模型加载）：
+  - subprocess: 旧版 gfpgan_core.py 的方式，每张图片启动一次 gfpgan/inference_gfpgan.py，每次重新加载全部模型
+  - inprocess: 新版 gfpgan_core.py，一次启动、模型常驻，按 --workers 并行处理全部图片
+"""
+
+import argparse
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+class CLIThroughputTester:
+    """命令行工具吞吐量测试器"""
+
+    def __init__(self, image_path: str, num_images: int, scale: int = 4, tile_size: int = 400):
+        self.source = PROJECT_ROOT / image_path
+        if not self.source.is_file():
+            raise FileNotFoundError(f"测试图片不存在: {image_path}")
+        self.num_images = num_images
+        self.scale = scale
+        self.tile_size = tile_size
+        self.workdir = Path(tempfile.mkdtemp(prefix='photoenhanceai_cli_'))
+        self.input_dir = self.workdir / 'input'
+        self.input_dir.mkdir()
+        # 同一张图片复制成N个文件，模拟一个待处理目录
+        self.images = []
+        for i in range(num_images):
+            dst = self.input_dir / f"img_{i:03d}{self.source.suffix}"
+            shutil.copyfile(self.source, dst)
+            self.images.append(dst)
+
+    def run_subprocess(self) -> Dict:
+        """旧方式：每张图片一个子进程"""
+        output_dir = self.workdir / 'subprocess'
+        start = time.perf_counter()
+        failed = 0
+        for image in self.images:
+            cmd = [
+                sys.executable, 'gfpgan/inference_gfpgan.py',
+                '-i', str(image), '-o', str(output_dir), '-v', '1.4', '-s', str(self.scale),
+                '--bg_upsampler', 'realesrgan', '--bg_tile', str(self.tile_size), '--suffix', 'enhanced'
+            ]
+            result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(PROJECT_ROOT))
+            failed += result.returncode != 0
+        return self._result('subprocess', 1, time.perf_counter() - start, failed)
+
+    def run_inprocess(self, workers: int) -> Dict:
+        """新方式：一次调用 gfpgan_core.py 处理整个目录"""
+        output_dir = self.workdir / f'inprocess_{workers}'
+        cmd = [
+            sys.executable, 'gfpgan_core.py', '-i', str(self.input_dir), '-o', str(output_dir),
+            '-s', str(self.scale), '--quality', 'high', '--tile-size', str(self.tile_size), '--workers', str(workers)
+        ]
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(PROJECT_ROOT))
+        elapsed = time.perf_counter() - start
+        produced = len(list(output_dir.glob('*'))) if output_dir.exists() else 0
+        return self._result('inprocess', workers, elapsed, self.num_images - produced if result.returncode else 0)
+
+    def _result(self, mode: str, workers: int, elapsed: float, failed: int) -> Dict:
+        done = self.num_images - failed
+        return {
+            'mode': mode,
+            'workers': workers,
+            'images': self.num_images,
+            'failed': failed,
+            'time': elapsed,
+            'images_per_sec': done / elapsed if elapsed > 0 else 0.0
+        }
+
+    def run(self, worker_counts: List[int], skip_subprocess: bool = False) -> List[Dict]:
+        print("🧪 命令行工具吞吐量测试 (子进程逐张 vs 进程内常驻模型)")
+        print("=" * 72)
+        print(f"🖼️ 测试图片 {self.source.name} × {self.num_images}，放大 {self.scale}x\n")
+
+        results = []
+        if not skip_subprocess:
+            print("🚀 subprocess: 每张图片启动一次 inference_gfpgan.py ...")
+            results.append(self.run_subprocess())
+        for workers in worker_counts:
+            print(f"🚀 inprocess: gfpgan_core.py --workers {workers} ...")
+            results.append(self.run_inprocess(workers))
+
+        print(f"\n{'方式':<12}{'并行数':>8}{'耗时(s)':>10}{'张/秒':>10}{'失败':>6}{'加速比':>8}")
+        print("-" * 56)
+        base = results[0]['images_per_sec'] or None
+        for r in results:
+            speedup = f"{r['images_per_sec'] / base:.2f}x" if base else '-'
+            print(f"{r['mode']:<12}{r['workers']:>8}{r['time']:>10.1f}{r['images_per_sec']:>10.3f}"
+                  f"{r['failed']:>6}{speedup:>8}")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "cli_throughput_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'image': self.source.name,
+                'num_images': self.num_images,
+                'scale': self.scale,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+    def cleanup(self):
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='命令行工具吞吐量测试')
+    parser.add_argument('--image', default='input/test001.jpg', help='测试图片')
+    parser.add_argument('--images', type=int, default=8, help='处理的图片数量')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2], help='进程内模式的并行数')
+    parser.add_argument('--scale', type=int, default=4, help='放大倍数')
+    parser.add_argument('--tile-size', type=int, default=400, help='背景瓦片大小')
+    parser.add_argument('--skip-subprocess', action='store_true', help='跳过旧的逐张子进程方式')
+    args = parser.parse_args()
+
+    tester = CLIThroughputTester(args.image, args.images, args.scale, args.tile_size)
+    try:
+        results = tester.run(args.workers, args.skip_subprocess)
+        tester.save_results(results)
+    finally:
+        tester.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 编译推理路径测试脚本
+对比 GFPGAN 人脸修复网络在 eager 与编译路径 (torch.jit.trace / torch.compile) 下:
+1. 每个batch分桶的编译耗时与稳态延迟、加速比
+2. 一致性: 编译路径与 eager 输出的最大误差（含需要补齐到分桶大小的batch）
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+# 与 gfpgan/utils.py 中 GFPGANer(arch='clean') 的网络参数一致
+ARCH_OPTIONS = dict(
+    out_size=512,
+    num_style_feat=512,
+    channel_multiplier=2,
+    decoder_load_path=None,
+    fix_decoder=False,
+    num_mlp=8,
+    input_is_latent=True,
+    different_w=True,
+    narrow=1,
+    sft_half=True
+)
+
+class CompiledInferenceTester:
+    """编译推理路径测试器"""
+
+    def __init__(self, model_path: str = None, threads: int = 0):
+        from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+
+        if threads:
+            torch.set_num_threads(threads)
+        torch.manual_seed(0)
+        self.net = GFPGANv1CleanInference(**ARCH_OPTIONS).eval()
+        if model_path:
+            state = torch.load(str(PROJECT_ROOT / model_path), map_location='cpu')
+            self.net.load_state_dict(state['params_ema'] if 'params_ema' in state else state['params'], strict=True)
+        else:
+            # 随机权重：噪声强度与偏置初始化为0，随机化后一致性测试才能覆盖这些路径
+            with torch.no_grad():
+                for param in self.net.parameters():
+                    if not param.any():
+                        param.normal_(0, 0.1)
+        self.weights = 'pretrained' if model_path else 'random'
+
+    @torch.no_grad()
+    def run_mode(self, mode: str, buckets: List[int], repeat: int, tolerance: float) -> Dict:
+        from gfpgan.compiled import CompiledFaceRestorer
+
+        print(f"\n🔨 mode={mode}，batch分桶 {buckets}")
+        restorer = CompiledFaceRestorer(self.net, mode=mode, batch_buckets=buckets)
+        reports = restorer.warmup(repeat=repeat)
+        print(f"{'分桶':<12}{'状态':<10}{'编译(s)':>9}{'eager(ms)':>11}{'编译后(ms)':>12}{'加速比':>8}")
+        print("-" * 62)
+        for r in reports:
+            compiled = f"{r['compiled_ms']:.1f}" if r['compiled_ms'] is not None else '-'
+            speedup = f"{r['speedup']:.2f}x" if r['speedup'] is not None else '-'
+            print(f"{r['shape']:<12}{r['status']:<10}{r['compile_s']:>9.1f}{r['eager_ms']:>11.1f}"
+                  f"{compiled:>12}{speedup:>8}")
+
+        # 一致性：每个分桶，以及一个需要补齐的batch（若存在）
+        batches = list(buckets)
+        padded = next((b + 1 for b in buckets if b + 1 not in buckets and b + 1 < max(buckets)), None)
+        if padded is not None:
+            batches.append(padded)
+        parity = []
+        for batch in batches:
+            x = torch.randn(batch, 3, 512, 512)
+            expected = self.net(x, return_rgb=False, randomize_noise=False)[0]
+            actual = restorer(x, return_rgb=False, randomize_noise=False)[0]
+            max_error = (expected - actual).abs().max().item()
+            passed = max_error <= tolerance
+            parity.append({'batch': batch, 'max_abs_error': max_error, 'passed': passed})
+            print(f"   batch={batch}: 最大误差 {max_error:.2e} {'✅' if passed else '❌'}")
+        return {'mode': restorer.mode, 'buckets': reports, 'parity': parity}
+
+    def save_results(self, results: List[Dict], filename: str = "compiled_inference_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'weights': self.weights,
+                'torch_version': torch.__version__,
+                'torch_threads': torch.get_num_threads(),
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='GFPGAN编译推理路径测试')
+    parser.add_argument('--model-path', default=None,
+                        help='GFPGAN权重（如 models/gfpgan/GFPGANv1.4.pth），默认使用随机权重')
+    parser.add_argument('--modes', nargs='+', default=['trace', 'compile'], choices=['trace', 'compile'],
+                        help='编译方式')
+    parser.add_argument('--buckets', type=int, nargs='+', default=[1, 2, 4, 8], help='batch分桶')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数')
+    parser.add_argument('--threads', type=int, default=0, help='torch线程数，0表示默认')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='一致性检查的最大绝对误差')
+    args = parser.parse_args()
+
+    tester = CompiledInferenceTester(args.model_path, args.threads)
+    print("🧪 GFPGAN编译推理路径测试 (eager vs 编译，按batch分桶)")
+    print("=" * 62)
+    print(f"⚙️ 权重: {tester.weights}，torch {torch.__version__}，线程 {torch.get_num_threads()}")
+    results = [tester.run_mode(mode, args.buckets, args.repeat, args.tolerance) for mode in args.modes]
+    tester.save_results(results)
+    if not all(p['passed'] for r in results for p in r['parity']):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
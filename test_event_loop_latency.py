@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 事件循环响应性测试脚本
+在推理满载的情况下测量 /api/v1/status/{task_id} 与 /health 的轮询延迟 (p50/p95/p99)
+"""
+
+import asyncio
+import aiohttp
+import time
+import json
+from pathlib import Path
+import sys
+from typing import List, Dict, Any
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+class EventLoopLatencyTester:
+    """事件循环响应性测试器"""
+    
+    def __init__(self, api_base: str = "http://localhost:8001"):
+        self.api_base = api_base
+        self.results = {}
+    
+    async def submit_load(self, session: aiohttp.ClientSession, image_path: Path, count: int) -> List[str]:
+        """提交多个增强任务，使推理执行器处于满载状态"""
+        task_ids = []
+        for _ in range(count):
+            form_data = aiohttp.FormData()
+            form_data.add_field('file', open(image_path, 'rb'), filename=image_path.name, content_type='image/jpeg')
+            async with session.post(f"{self.api_base}/api/v1/enhance", data=form_data) as response:
+                if response.status != 200:
+                    raise Exception(f"上传失败: {response.status}")
+                result = await response.json()
+                task_ids.append(result['task_id'])
+        return task_ids
+    
+    async def poll_latency(self, session: aiohttp.ClientSession, url: str, duration: float, interval: float) -> List[float]:
+        """按固定间隔轮询指定接口，记录每次请求的延迟（毫秒）"""
+        latencies = []
+        deadline = time.time() + duration
+        while time.time() < deadline:
+            start = time.perf_counter()
+            async with session.get(url) as response:
+                await response.read()
+            latencies.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(interval)
+        return latencies
+    
+    async def run(self, image: str = "input/test001.jpg", load_tasks: int = 8,
+                  duration: float = 30.0, interval: float = 0.05, pollers: int = 4):
+        """在推理满载期间并发轮询状态接口"""
+        print("🧪 PhotoEnhanceAI 事件循环响应性测试")
+        print("="*80)
+        
+        image_path = PROJECT_ROOT / image
+        if not image_path.exists():
+            print(f"❌ 测试图片不存在: {image_path}")
+            return
+        
+        async with aiohttp.ClientSession() as session:
+            # 空载基线
+            print("📊 测量空载基线...")
+            baseline = await self.poll_latency(session, f"{self.api_base}/health", 3.0, interval)
+            
+            # 推理满载
+            print(f"🚀 提交 {load_tasks} 个增强任务使推理满载...")
+            task_ids = await self.submit_load(session, image_path, load_tasks)
+            
+            print(f"⏱️ {pollers} 个轮询客户端持续 {duration:.0f} 秒...")
+            status_url = f"{self.api_base}/api/v1/status/{task_ids[-1]}"
+            groups = await asyncio.gather(
+                *[self.poll_latency(session, status_url, duration, interval) for _ in range(pollers)],
+                self.poll_latency(session, f"{self.api_base}/health", duration, interval)
+            )
+            status_latencies = [v for group in groups[:-1] for v in group]
+            health_latencies = groups[-1]
+        
+        for name, values in (('baseline_health', baseline), ('loaded_status', status_latencies),
+                             ('loaded_health', health_latencies)):
+            self.results[name] = {
+                'samples': len(values),
+                'p50_ms': percentile(values, 50),
+                'p95_ms': percentile(values, 95),
+                'p99_ms': percentile(values, 99),
+                'max_ms': max(values) if values else 0.0
+            }
+        
+        self.print_results()
+        self.save_results()
+    
+    def print_results(self):
+        """输出延迟统计"""
+        print(f"\n{'场景':<18} {'样本数':<8} {'p50(ms)':<10} {'p95(ms)':<10} {'p99(ms)':<10} {'max(ms)':<10}")
+        print("-" * 70)
+        for name, r in self.results.items():
+            print(f"{name:<18} {r['samples']:<8} {r['p50_ms']:<10.1f} {r['p95_ms']:<10.1f} {r['p99_ms']:<10.1f} {r['max_ms']:<10.1f}")
+        
+        p99 = self.results['loaded_status']['p99_ms']
+        if p99 < 100:
+            print(f"\n✅ 推理满载时状态轮询 p99 = {p99:.1f}ms，事件循环未被阻塞")
+        else:
+            print(f"\n⚠️ 推理满载时状态轮询 p99 = {p99:.1f}ms，事件循环可能仍被阻塞")
+    
+    def save_results(self):
+        """保存测试结果"""
+        results_file = PROJECT_ROOT / "event_loop_latency_results.json"
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 详细结果已保存到: {results_file}")
+
+async def main():
+    """主函数"""
+    tester = EventLoopLatencyTester()
+    await tester.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
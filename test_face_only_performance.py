@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 人像特写 / 仅人脸 快速路径性能测试脚本
+对同一张图片比较 full(完整流程) / auto(人像特写跳过背景模型) / face(只输出修复后的人脸) 三种
+face_mode 的端到端延迟与各阶段耗时，并给出相对完整流程节省的时间
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import torch
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+# 与 api/model_manager.py 中的 FACE_MODES / QUALITY_BG_MODELS 一致
+FACE_MODES = ('full', 'auto', 'face')
+QUALITY_BG_MODELS = {
+    'fast': None,
+    'medium': 'realesr-general-x4v3',
+    'high': 'realesrgan-x2plus'
+}
+
+class FaceOnlyTester:
+    """人脸快速路径性能测试器"""
+
+    def __init__(self, image_path: str, model_path: str = "models/gfpgan/GFPGANv1.4.pth",
+                 quality_level: str = 'high', portrait_ratio: float = 0.25, tile_size: int = 400):
+        from gfpgan import GFPGANer
+        from gfpgan.tiling import create_bg_upsampler
+
+        self.image = cv2.imread(str(PROJECT_ROOT / image_path))
+        if self.image is None:
+            raise FileNotFoundError(f"无法读取测试图片: {image_path}")
+        self.quality_level = quality_level
+        self.portrait_ratio = portrait_ratio
+        self.tile_size = tile_size
+        self.restorer = GFPGANer(
+            model_path=str(PROJECT_ROOT / model_path),
+            upscale=4,
+            arch='clean',
+            channel_multiplier=2,
+            bg_upsampler=None
+        )
+        name = QUALITY_BG_MODELS[quality_level]
+        self.bg_upsampler = None if name is None else create_bg_upsampler(
+            name, tile_size=tile_size, half=torch.cuda.is_available()
+        )
+
+    def run_once(self, face_mode: str) -> Dict:
+        """按 api/model_manager.py 中 _restore 的方式执行一次，返回各阶段耗时与实际处理路径"""
+        timings, details = {}, {}
+        if face_mode == 'face':
+            self.restorer.enhance(self.image, only_center_face=True, paste_back=False, weight=0.5,
+                                  timings=timings, details=details)
+        else:
+            self.restorer.enhance(
+                self.image, paste_back=True, weight=0.5, timings=timings, details=details,
+                bg_tile=self.tile_size, bg_upsampler=self.bg_upsampler,
+                portrait_ratio=self.portrait_ratio if face_mode == 'auto' else None
+            )
+        return {'timings': timings, 'details': details}
+
+    def measure(self, face_mode: str, repeat: int) -> Dict:
+        self.run_once(face_mode)  # 预热
+        totals = []
+        stage_times: Dict[str, List[float]] = {}
+        details = {}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run = self.run_once(face_mode)
+            totals.append(time.perf_counter() - start)
+            details = run['details']
+            for stage, seconds in run['timings'].items():
+                stage_times.setdefault(stage, []).append(seconds)
+        return {
+            'face_mode': face_mode,
+            'latency': statistics.median(totals),
+            'stages': {stage: statistics.median(values) for stage, values in stage_times.items()},
+            'background': details.get('background'),
+            'face_area_ratio': details.get('face_area_ratio')
+        }
+
+    def run(self, face_modes: List[str], repeat: int) -> List[Dict]:
+        print("🧪 人像特写 / 仅人脸 快速路径测试")
+        print("=" * 72)
+        print(f"🖼️ 图片 {self.image.shape[1]}x{self.image.shape[0]}，quality_level={self.quality_level}，"
+              f"设备 {'CUDA' if torch.cuda.is_available() else 'CPU'}\n")
+
+        results = []
+        for face_mode in face_modes:
+            result = self.measure(face_mode, repeat)
+            results.append(result)
+            stages = ', '.join(f"{stage} {seconds:.2f}s" for stage, seconds in result['stages'].items())
+            print(f"🔧 {face_mode:<5} 延迟 {result['latency']:.2f}s，背景: {result['background']} ({stages})")
+
+        full = next((r for r in results if r['face_mode'] == 'full'), None)
+        if full is not None:
+            print("\n" + "=" * 72)
+            if full['face_area_ratio'] is not None:
+                print(f"👤 人脸占画面比例 {full['face_area_ratio']:.0%} (人像特写阈值 {self.portrait_ratio:.0%})")
+            for result in results:
+                if result is full:
+                    continue
+                saved = full['latency'] - result['latency']
+                print(f"⚡ {result['face_mode']}: 比完整流程节省 {saved:.2f}s ({saved / full['latency']:.0%})")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "face_only_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'image_size': f"{self.image.shape[1]}x{self.image.shape[0]}",
+                'quality_level': self.quality_level,
+                'portrait_ratio': self.portrait_ratio,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='人像特写 / 仅人脸 快速路径性能测试')
+    parser.add_argument('--image', default='input/test001.jpg', help='测试图片（建议使用单人像特写）')
+    parser.add_argument('--modes', nargs='+', default=list(FACE_MODES), choices=list(FACE_MODES), help='测试的face_mode')
+    parser.add_argument('--quality-level', default='high', choices=list(QUALITY_BG_MODELS), help='背景处理质量等级')
+    parser.add_argument('--portrait-ratio', type=float, default=0.25, help='人像特写判定的人脸面积占比')
+    parser.add_argument('--repeat', type=int, default=3, help='每种模式的重复次数（取中位数）')
+    parser.add_argument('--tile-size', type=int, default=400, help='背景瓦片大小')
+    args = parser.parse_args()
+
+    tester = FaceOnlyTester(args.image, quality_level=args.quality_level,
+                            portrait_ratio=args.portrait_ratio, tile_size=args.tile_size)
+    results = tester.run(args.modes, args.repeat)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI GFPGAN推理优化网络 一致性与分层耗时测试脚本
+1. 一致性: GFPGANv1CleanInference 与原版 GFPGANv1Clean 加载同一份权重，固定噪声时输出的最大误差
+2. 分层耗时: CPU上 batch=1 与 batch=8 时两个网络各层（编码器/SFT条件/StyleGAN解码器各层）的耗时对比
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+# 与 gfpgan/utils.py 中 GFPGANer(arch='clean') 的网络参数一致
+ARCH_OPTIONS = dict(
+    out_size=512,
+    num_style_feat=512,
+    channel_multiplier=2,
+    decoder_load_path=None,
+    fix_decoder=False,
+    num_mlp=8,
+    input_is_latent=True,
+    different_w=True,
+    narrow=1,
+    sft_half=True
+)
+
+# 计时的层：名称前缀 → 报告中的分组
+LAYER_GROUPS = OrderedDict([
+    ('conv_body_first', 'encoder'),
+    ('conv_body_down', 'encoder'),
+    ('final_conv', 'encoder'),
+    ('final_linear', 'style'),
+    ('conv_body_up', 'unet_up'),
+    ('condition_scale', 'sft'),
+    ('condition_shift', 'sft'),
+    ('stylegan_decoder.style_conv1', 'style_conv'),
+    ('stylegan_decoder.style_convs', 'style_conv'),
+    ('stylegan_decoder.to_rgb1', 'to_rgb'),
+    ('stylegan_decoder.to_rgbs', 'to_rgb'),
+])
+
+class LayerTimer:
+    """前向钩子记录每层耗时（CPU同步执行，墙钟时间即计算时间）"""
+
+    def __init__(self, net):
+        self.times: Dict[str, float] = OrderedDict()
+        self._starts: Dict[str, float] = {}
+        self._handles = []
+        for name, module in net.named_modules():
+            if self._tracked(name):
+                self._handles.append(module.register_forward_pre_hook(self._pre(name)))
+                self._handles.append(module.register_forward_hook(self._post(name)))
+
+    @staticmethod
+    def _tracked(name: str) -> bool:
+        for prefix in LAYER_GROUPS:
+            if name == prefix:
+                return True
+            # ModuleList 的直接子层，如 conv_body_down.0 / stylegan_decoder.style_convs.3
+            if name.startswith(prefix + '.') and name[len(prefix) + 1:].isdigit():
+                return True
+        return False
+
+    def _pre(self, name):
+        def hook(module, inputs):
+            self._starts[name] = time.perf_counter()
+        return hook
+
+    def _post(self, name):
+        def hook(module, inputs, output):
+            self.times[name] = self.times.get(name, 0.) + time.perf_counter() - self._starts.pop(name)
+        return hook
+
+    def reset(self):
+        self.times.clear()
+
+    def remove(self):
+        for handle in self._handles:
+            handle.remove()
+
+class InferenceArchTester:
+    """推理优化网络测试器"""
+
+    def __init__(self, model_path: str = None, threads: int = 0):
+        from gfpgan.archs.gfpganv1_clean_arch import GFPGANv1Clean
+        from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+
+        if threads:
+            torch.set_num_threads(threads)
+        torch.manual_seed(0)
+        self.stock = GFPGANv1Clean(**ARCH_OPTIONS).eval()
+        if model_path:
+            state = torch.load(str(PROJECT_ROOT / model_path), map_location='cpu')
+            self.stock.load_state_dict(state['params_ema'] if 'params_ema' in state else state['params'], strict=True)
+        else:
+            # 随机权重：噪声强度与偏置初始化为0，随机化后一致性测试才能覆盖这些路径
+            with torch.no_grad():
+                for param in self.stock.parameters():
+                    if not param.any():
+                        param.normal_(0, 0.1)
+        self.optimized = GFPGANv1CleanInference(**ARCH_OPTIONS).eval()
+        self.optimized.load_state_dict(self.stock.state_dict(), strict=True)
+        self.weights = 'pretrained' if model_path else 'random'
+
+    @torch.no_grad()
+    def check_parity(self, batch_sizes: List[int], tolerance: float) -> List[Dict]:
+        print(f"🔍 一致性检查 (权重: {self.weights}，固定噪声，容差 {tolerance:g})")
+        results = []
+        for batch in batch_sizes:
+            x = torch.randn(batch, 3, 512, 512)
+            expected = self.stock(x, return_rgb=False, randomize_noise=False)[0]
+            actual = self.optimized(x, return_rgb=False, randomize_noise=False)[0]
+            max_error = (expected - actual).abs().max().item()
+            passed = max_error <= tolerance
+            results.append({'batch': batch, 'max_abs_error': max_error, 'passed': passed})
+            print(f"   batch={batch}: 最大误差 {max_error:.2e} {'✅' if passed else '❌'}")
+        return results
+
+    @torch.no_grad()
+    def time_layers(self, net, batch: int, repeat: int) -> Dict[str, float]:
+        x = torch.randn(batch, 3, 512, 512)
+        net(x, return_rgb=False)  # 预热
+        timer = LayerTimer(net)
+        try:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                net(x, return_rgb=False)
+            total = (time.perf_counter() - start) / repeat
+            layers = {name: seconds / repeat for name, seconds in timer.times.items()}
+        finally:
+            timer.remove()
+        layers['total'] = total
+        return layers
+
+    @staticmethod
+    def group(layers: Dict[str, float]) -> Dict[str, float]:
+        grouped: Dict[str, float] = OrderedDict((g, 0.) for g in dict.fromkeys(LAYER_GROUPS.values()))
+        for name, seconds in layers.items():
+            for prefix, group in LAYER_GROUPS.items():
+                if name == prefix or name.startswith(prefix + '.'):
+                    grouped[group] += seconds
+                    break
+        grouped['total'] = layers['total']
+        return grouped
+
+    def benchmark(self, batch_sizes: List[int], repeat: int, per_layer: bool) -> List[Dict]:
+        results = []
+        for batch in batch_sizes:
+            print(f"\n⏱️ batch={batch} (CPU，torch线程 {torch.get_num_threads()}，重复 {repeat} 次取平均)")
+            stock = self.time_layers(self.stock, batch, repeat)
+            optimized = self.time_layers(self.optimized, batch, repeat)
+            rows = stock if per_layer else self.group(stock)
+            optimized_rows = optimized if per_layer else self.group(optimized)
+            print(f"{'层':<40}{'原版(ms)':>12}{'优化(ms)':>12}{'加速比':>10}")
+            print("-" * 74)
+            for name, seconds in rows.items():
+                fast = optimized_rows.get(name, 0.)
+                speedup = f"{seconds / fast:.2f}x" if fast > 0 else '-'
+                print(f"{name:<40}{seconds * 1000:>12.1f}{fast * 1000:>12.1f}{speedup:>10}")
+            results.append({
+                'batch': batch,
+                'stock_ms': {k: v * 1000 for k, v in stock.items()},
+                'optimized_ms': {k: v * 1000 for k, v in optimized.items()},
+                'speedup': stock['total'] / optimized['total'],
+                'faces_per_sec_stock': batch / stock['total'],
+                'faces_per_sec_optimized': batch / optimized['total']
+            })
+            print(f"🏁 整体: {stock['total'] * 1000:.0f}ms → {optimized['total'] * 1000:.0f}ms "
+                  f"({stock['total'] / optimized['total']:.2f}x，{batch / optimized['total']:.2f} 张人脸/秒)")
+        return results
+
+    def save_results(self, parity: List[Dict], timings: List[Dict],
+                     filename: str = "inference_arch_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'weights': self.weights,
+                'torch_threads': torch.get_num_threads(),
+                'parity': parity,
+                'timings': timings
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='GFPGAN推理优化网络 一致性与分层耗时测试')
+    parser.add_argument('--model-path', default=None,
+                        help='GFPGAN权重（如 models/gfpgan/GFPGANv1.4.pth），默认使用随机权重')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8], help='测试的batch大小')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数')
+    parser.add_argument('--threads', type=int, default=0, help='torch线程数，0表示默认')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='一致性检查的最大绝对误差')
+    parser.add_argument('--per-layer', action='store_true', help='逐层输出（默认按层类型汇总）')
+    args = parser.parse_args()
+
+    tester = InferenceArchTester(args.model_path, args.threads)
+    parity = tester.check_parity(args.batch_sizes, args.tolerance)
+    timings = tester.benchmark(args.batch_sizes, args.repeat, args.per_layer)
+    tester.save_results(parity, timings)
+    if not all(r['passed'] for r in parity):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
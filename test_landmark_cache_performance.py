@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 人脸关键点缓存性能测试脚本
+对比同一图片以不同weight重新增强时，关键点缓存 冷(首次检测) / 热(跳过RetinaFace) 的端到端延迟
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+class LandmarkCacheTester:
+    """人脸关键点缓存性能测试器"""
+
+    def __init__(self, model_path: str = "models/gfpgan/GFPGANv1.4.pth"):
+        from gfpgan import GFPGANer
+
+        self.restorer = GFPGANer(
+            model_path=str(PROJECT_ROOT / model_path),
+            upscale=2,
+            arch='clean',
+            channel_multiplier=2,
+            bg_upsampler=None
+        )
+        self.cache = self.restorer.enable_landmark_cache()
+
+    def load_images(self, limit: int) -> List[Path]:
+        paths = sorted((PROJECT_ROOT / "input").glob("*.jpg"))[:limit]
+        if not paths:
+            raise FileNotFoundError("input/ 中未找到测试图片")
+        return paths
+
+    def enhance(self, img: np.ndarray, weight: float) -> float:
+        start = time.perf_counter()
+        self.restorer.enhance(img, paste_back=True, weight=weight, randomize_noise=False)
+        return time.perf_counter() - start
+
+    def measure_image(self, path: Path, weights: List[float]) -> Dict:
+        """第一个weight为冷缓存（执行人脸检测），其余weight命中缓存"""
+        img = cv2.imread(str(path))
+        self.cache.clear()
+        cold = self.enhance(img, weights[0])
+        warm = [self.enhance(img, weight) for weight in weights[1:]]
+
+        # 热缓存结果必须与重新检测的结果一致
+        self.cache.clear()
+        _, _, expected = self.restorer.enhance(img, paste_back=True, weight=weights[-1], randomize_noise=False)
+        _, _, cached = self.restorer.enhance(img, paste_back=True, weight=weights[-1], randomize_noise=False)
+        identical = np.array_equal(expected, cached)
+
+        return {
+            'image': path.name,
+            'size': f"{img.shape[1]}x{img.shape[0]}",
+            'cold_time': cold,
+            'warm_time': statistics.mean(warm),
+            'saved_time': cold - statistics.mean(warm),
+            'identical': bool(identical)
+        }
+
+    def run(self, num_images: int, weights: List[float]) -> List[Dict]:
+        print("🧪 人脸关键点缓存 冷/热 延迟对比")
+        print("=" * 60)
+
+        # 预热：排除首次推理的初始化开销
+        warmup = cv2.imread(str(self.load_images(1)[0]))
+        self.enhance(warmup, weights[0])
+
+        results = []
+        for path in self.load_images(num_images):
+            result = self.measure_image(path, weights)
+            results.append(result)
+            print(f"📸 {result['image']} ({result['size']}): 冷 {result['cold_time']:.3f}秒 / "
+                  f"热 {result['warm_time']:.3f}秒 / 节省 {result['saved_time']:.3f}秒 "
+                  f"{'✅' if result['identical'] else '❌ 结果不一致'}")
+
+        cold = statistics.mean(r['cold_time'] for r in results)
+        warm = statistics.mean(r['warm_time'] for r in results)
+        print("\n" + "=" * 60)
+        print(f"📊 平均延迟: 冷缓存 {cold:.3f}秒 / 热缓存 {warm:.3f}秒 "
+              f"(降低 {(1 - warm / cold) * 100:.1f}%)")
+        print(f"🗃️ 缓存统计: {self.cache.get_stats()}")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "landmark_cache_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='人脸关键点缓存性能测试')
+    parser.add_argument('--images', type=int, default=5, help='测试图片数量')
+    parser.add_argument('--weights', type=float, nargs='+', default=[0.5, 0.3, 0.7, 1.0],
+                        help='依次使用的fidelity weight，第一个为冷缓存')
+    args = parser.parse_args()
+    if len(args.weights) < 2:
+        parser.error('--weights 至少需要两个值')
+
+    tester = LandmarkCacheTester()
+    results = tester.run(args.images, args.weights)
+    tester.save_results(results)
+    sys.exit(0 if all(r['identical'] for r in results) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 人脸修复噪声模式性能测试脚本
+对比 StyleGAN2 解码器三种噪声模式 (random / fixed / zero) 在原版 GFPGANv1Clean 与推理优化网络上的:
+1. 延迟: 单次前向耗时
+2. 内存分配: 前向过程中分配的总字节数与分配次数，以及生成随机噪声 (aten::normal_) 的次数与耗时
+3. 可复现性: 相同输入连续两次前向的输出是否逐位一致
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+from torch.profiler import ProfilerActivity, profile
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+# 与 gfpgan/utils.py 中 GFPGANer(arch='clean') 的网络参数一致
+ARCH_OPTIONS = dict(
+    out_size=512,
+    num_style_feat=512,
+    channel_multiplier=2,
+    decoder_load_path=None,
+    fix_decoder=False,
+    num_mlp=8,
+    input_is_latent=True,
+    different_w=True,
+    narrow=1,
+    sft_half=True
+)
+
+# 噪声模式 → 前向参数（与 GFPGANer.enhance 的 noise_mode 一致）
+NOISE_MODES = {
+    'random': {'randomize_noise': True},
+    'fixed': {'randomize_noise': False},
+    'zero': {'randomize_noise': False, 'zero_noise': True}
+}
+
+class NoiseModeTester:
+    """噪声模式测试器"""
+
+    def __init__(self, model_path: str = None, threads: int = 0):
+        from gfpgan.archs.gfpganv1_clean_arch import GFPGANv1Clean
+        from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+
+        if threads:
+            torch.set_num_threads(threads)
+        torch.manual_seed(0)
+        stock = GFPGANv1Clean(**ARCH_OPTIONS).eval()
+        if model_path:
+            state = torch.load(str(PROJECT_ROOT / model_path), map_location='cpu')
+            stock.load_state_dict(state['params_ema'] if 'params_ema' in state else state['params'], strict=True)
+        else:
+            # 随机权重：噪声强度初始化为0，随机化后噪声模式才影响输出
+            with torch.no_grad():
+                for param in stock.parameters():
+                    if not param.any():
+                        param.normal_(0, 0.1)
+        optimized = GFPGANv1CleanInference(**ARCH_OPTIONS).eval()
+        optimized.load_state_dict(stock.state_dict(), strict=True)
+        self.nets = {'stock': stock, 'optimized': optimized}
+        self.weights = 'pretrained' if model_path else 'random'
+
+    @staticmethod
+    def supported(net_name: str, mode: str) -> bool:
+        # zero 模式只有推理优化网络支持
+        return mode != 'zero' or net_name == 'optimized'
+
+    @torch.no_grad()
+    def measure(self, net_name: str, mode: str, batch: int, repeat: int) -> Dict:
+        net = self.nets[net_name]
+        options = NOISE_MODES[mode]
+        x = torch.randn(batch, 3, 512, 512)
+
+        first = net(x, return_rgb=False, **options)[0]  # 同时作为预热
+        second = net(x, return_rgb=False, **options)[0]
+        deterministic = torch.equal(first, second)
+        del first, second
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            net(x, return_rgb=False, **options)
+        latency = (time.perf_counter() - start) / repeat
+
+        with profile(activities=[ProfilerActivity.CPU], profile_memory=True) as prof:
+            net(x, return_rgb=False, **options)
+        allocated = 0
+        allocations = 0
+        rng_calls = 0
+        rng_time = 0.
+        for event in prof.events():
+            if event.cpu_memory_usage > 0:
+                allocated += event.cpu_memory_usage
+                allocations += 1
+            if event.name == 'aten::normal_':
+                rng_calls += 1
+                rng_time += event.cpu_time_total / 1e6
+        return {
+            'net': net_name,
+            'mode': mode,
+            'batch': batch,
+            'latency_ms': latency * 1000,
+            'allocated_mb': allocated / 1024 / 1024,
+            'allocations': allocations,
+            'rng_calls': rng_calls,
+            'rng_ms': rng_time * 1000,
+            'deterministic': deterministic
+        }
+
+    def run(self, batch_sizes: List[int], repeat: int) -> List[Dict]:
+        print("🧪 人脸修复噪声模式性能测试 (random / fixed / zero)")
+        print("=" * 96)
+        print(f"⚙️ 权重: {self.weights}，CPU，torch线程 {torch.get_num_threads()}，每项重复 {repeat} 次取平均\n")
+        print(f"{'网络':<11}{'模式':<8}{'batch':>6}{'延迟(ms)':>11}{'分配(MB)':>11}{'分配次数':>9}"
+              f"{'随机噪声次数':>13}{'随机噪声(ms)':>13}{'可复现':>8}")
+        print("-" * 96)
+        results = []
+        for batch in batch_sizes:
+            for net_name in self.nets:
+                for mode in NOISE_MODES:
+                    if not self.supported(net_name, mode):
+                        continue
+                    r = self.measure(net_name, mode, batch, repeat)
+                    results.append(r)
+                    print(f"{r['net']:<11}{r['mode']:<8}{r['batch']:>6}{r['latency_ms']:>11.1f}"
+                          f"{r['allocated_mb']:>11.1f}{r['allocations']:>9}{r['rng_calls']:>13}"
+                          f"{r['rng_ms']:>13.2f}{'✅' if r['deterministic'] else '❌':>8}")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "noise_mode_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'weights': self.weights,
+                'torch_threads': torch.get_num_threads(),
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='人脸修复噪声模式性能测试')
+    parser.add_argument('--model-path', default=None,
+                        help='GFPGAN权重（如 models/gfpgan/GFPGANv1.4.pth），默认使用随机权重')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4], help='测试的batch大小')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数')
+    parser.add_argument('--threads', type=int, default=0, help='torch线程数，0表示默认')
+    args = parser.parse_args()
+
+    tester = NoiseModeTester(args.model_path, args.threads)
+    results = tester.run(args.batch_sizes, args.repeat)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
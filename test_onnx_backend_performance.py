@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 人脸修复 ONNX Runtime 后端测试脚本
+1. 一致性: ONNX Runtime 与 PyTorch (GFPGANv1CleanInference，固定噪声) 输出的最大误差
+2. 吞吐量: batch=1/4/8 时 PyTorch eager (原版 GFPGANv1Clean / 推理优化网络) 与 ONNX Runtime 的延迟与人脸/秒
+需要安装 onnx 与 onnxruntime；未指定 --onnx-path 时先导出到临时文件
+"""
+
+import argparse
+import json
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import torch
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+# 与 gfpgan/utils.py 中 GFPGANer(arch='clean') 的网络参数一致
+ARCH_OPTIONS = dict(
+    out_size=512,
+    num_style_feat=512,
+    channel_multiplier=2,
+    decoder_load_path=None,
+    fix_decoder=False,
+    num_mlp=8,
+    input_is_latent=True,
+    different_w=True,
+    narrow=1,
+    sft_half=True
+)
+
+class OnnxBackendTester:
+    """ONNX Runtime 后端测试器"""
+
+    def __init__(self, model_path: str = None, onnx_path: str = None, intra_op_threads: int = 0,
+                 inter_op_threads: int = 1):
+        from gfpgan.archs.gfpganv1_clean_arch import GFPGANv1Clean
+        from gfpgan.archs.gfpganv1_clean_inference_arch import GFPGANv1CleanInference
+        from gfpgan.onnx_backend import OnnxFaceRestorer, export_onnx
+
+        if intra_op_threads:
+            torch.set_num_threads(intra_op_threads)
+        torch.manual_seed(0)
+        self.stock = GFPGANv1Clean(**ARCH_OPTIONS).eval()
+        if model_path:
+            state = torch.load(str(PROJECT_ROOT / model_path), map_location='cpu')
+            self.stock.load_state_dict(state['params_ema'] if 'params_ema' in state else state['params'], strict=True)
+        else:
+            # 随机权重：噪声强度与偏置初始化为0，随机化后一致性测试才能覆盖这些路径
+            with torch.no_grad():
+                for param in self.stock.parameters():
+                    if not param.any():
+                        param.normal_(0, 0.1)
+        self.optimized = GFPGANv1CleanInference(**ARCH_OPTIONS).eval()
+        self.optimized.load_state_dict(self.stock.state_dict(), strict=True)
+        self.weights = 'pretrained' if model_path else 'random'
+
+        self.workdir = None
+        if onnx_path is None:
+            self.workdir = Path(tempfile.mkdtemp(prefix='photoenhanceai_onnx_'))
+            onnx_path = str(self.workdir / 'gfpgan.onnx')
+            print("📦 导出ONNX模型 (固定噪声，动态batch)...")
+            start = time.perf_counter()
+            export_onnx(self.optimized, onnx_path, noise_mode='fixed')
+            print(f"   导出完成，耗时 {time.perf_counter() - start:.1f}s")
+        self.onnx = OnnxFaceRestorer(onnx_path, intra_op_threads=intra_op_threads, inter_op_threads=inter_op_threads)
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+
+    @torch.no_grad()
+    def check_parity(self, batch_sizes: List[int], tolerance: float) -> List[Dict]:
+        print(f"\n🔍 一致性检查 (权重: {self.weights}，固定噪声，容差 {tolerance:g})")
+        results = []
+        for batch in batch_sizes:
+            x = torch.randn(batch, 3, 512, 512)
+            expected = self.optimized(x, return_rgb=False, randomize_noise=False)[0]
+            actual = self.onnx(x)[0]
+            max_error = (expected - actual).abs().max().item()
+            passed = max_error <= tolerance
+            results.append({'batch': batch, 'max_abs_error': max_error, 'passed': passed})
+            print(f"   batch={batch}: 最大误差 {max_error:.2e} {'✅' if passed else '❌'}")
+        return results
+
+    @staticmethod
+    @torch.no_grad()
+    def time_backend(run, batch: int, repeat: int) -> float:
+        x = torch.randn(batch, 3, 512, 512)
+        run(x)  # 预热
+        start = time.perf_counter()
+        for _ in range(repeat):
+            run(x)
+        return (time.perf_counter() - start) / repeat
+
+    def benchmark(self, batch_sizes: List[int], repeat: int) -> List[Dict]:
+        backends = {
+            'torch_stock': lambda x: self.stock(x, return_rgb=False, randomize_noise=False),
+            'torch_optimized': lambda x: self.optimized(x, return_rgb=False, randomize_noise=False),
+            'onnxruntime': self.onnx
+        }
+        print(f"\n⏱️ 吞吐量 (CPU，torch线程 {torch.get_num_threads()}，ORT intra/inter "
+              f"{self.intra_op_threads or 'auto'}/{self.inter_op_threads}，重复 {repeat} 次取平均)")
+        print(f"{'后端':<18}{'batch':>6}{'延迟(ms)':>12}{'人脸/秒':>10}{'加速比':>8}")
+        print("-" * 54)
+        results = []
+        for batch in batch_sizes:
+            base = None
+            for name, run in backends.items():
+                latency = self.time_backend(run, batch, repeat)
+                base = base or latency
+                results.append({
+                    'backend': name,
+                    'batch': batch,
+                    'latency_ms': latency * 1000,
+                    'faces_per_sec': batch / latency,
+                    'speedup': base / latency
+                })
+                print(f"{name:<18}{batch:>6}{latency * 1000:>12.1f}{batch / latency:>10.2f}{base / latency:>7.2f}x")
+        return results
+
+    def save_results(self, parity: List[Dict], timings: List[Dict], filename: str = "onnx_backend_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'weights': self.weights,
+                'torch_threads': torch.get_num_threads(),
+                'ort_intra_op_threads': self.intra_op_threads,
+                'ort_inter_op_threads': self.inter_op_threads,
+                'parity': parity,
+                'timings': timings
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+    def cleanup(self):
+        if self.workdir is not None:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='人脸修复 ONNX Runtime 后端一致性与吞吐量测试')
+    parser.add_argument('--model-path', default=None,
+                        help='GFPGAN权重（如 models/gfpgan/GFPGANv1.4.pth），默认使用随机权重')
+    parser.add_argument('--onnx-path', default=None, help='已导出的ONNX模型（需与 --model-path 一致），默认临时导出')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 4, 8], help='测试的batch大小')
+    parser.add_argument('--repeat', type=int, default=3, help='计时重复次数')
+    parser.add_argument('--intra-op-threads', type=int, default=0, help='ORT与torch的算子内线程数，0表示默认')
+    parser.add_argument('--inter-op-threads', type=int, default=1, help='ORT算子间线程数')
+    parser.add_argument('--tolerance', type=float, default=1e-3, help='一致性检查的最大绝对误差')
+    args = parser.parse_args()
+
+    tester = OnnxBackendTester(args.model_path, args.onnx_path, args.intra_op_threads, args.inter_op_threads)
+    try:
+        parity = tester.check_parity(args.batch_sizes[:2], args.tolerance)
+        timings = tester.benchmark(args.batch_sizes, args.repeat)
+        tester.save_results(parity, timings)
+    finally:
+        tester.cleanup()
+    if not all(r['passed'] for r in parity):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 输出编码性能测试脚本
+对比 JPEG/PNG/WebP 在不同质量参数下的编码耗时与输出大小（即下载时实际传输的字节数），
+并估算移动网络下的传输时间，用于为移动端选择最省流量/最快的输出格式
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# 添加项目根目录与api目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "api"))
+
+from output_encoder import encode_image
+
+class OutputEncodingTester:
+    """输出编码性能测试器"""
+
+    def __init__(self, image_dir: str = "input", scale: float = 4.0):
+        self.image_dir = PROJECT_ROOT / image_dir
+        self.scale = scale
+
+    def load_images(self, limit: int) -> List[np.ndarray]:
+        """读取测试图片，并按放大倍数缩放到与增强结果相同的尺寸"""
+        images = []
+        for path in sorted(self.image_dir.glob("*.jpg"))[:limit]:
+            img = cv2.imread(str(path))
+            if img is None:
+                continue
+            if self.scale != 1:
+                img = cv2.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_LANCZOS4)
+            images.append(img)
+        if not images:
+            raise FileNotFoundError(f"{self.image_dir} 中未找到测试图片")
+        return images
+
+    def measure(self, images: List[np.ndarray], output_format: str, quality: int, repeat: int) -> Dict:
+        sizes, times = [], []
+        for img in images:
+            for _ in range(repeat):
+                encoded = encode_image(img, output_format, quality)
+                sizes.append(len(encoded))
+                times.append(encoded.encode_time)
+        return {
+            'format': output_format,
+            'quality': quality if output_format != 'png' else None,
+            'avg_size_kb': statistics.mean(sizes) / 1024,
+            'avg_encode_ms': statistics.mean(times) * 1000,
+        }
+
+    def run(self, num_images: int, qualities: List[int], repeat: int, bandwidth_mbps: float) -> List[Dict]:
+        print("🧪 输出编码性能测试")
+        print("=" * 72)
+        images = self.load_images(num_images)
+        h, w = images[0].shape[:2]
+        print(f"📸 {len(images)} 张图片，输出尺寸约 {w}x{h}，移动网络带宽按 {bandwidth_mbps}Mbps 估算\n")
+
+        cases = [('jpeg', q) for q in qualities] + [('webp', q) for q in qualities] + [('png', 0)]
+        results = []
+        print(f"{'格式':<8}{'质量':>6}{'平均大小(KB)':>16}{'编码耗时(ms)':>16}{'传输耗时(s)':>14}")
+        for output_format, quality in cases:
+            result = self.measure(images, output_format, quality, repeat)
+            result['transfer_s'] = result['avg_size_kb'] * 1024 * 8 / (bandwidth_mbps * 1_000_000)
+            result['total_s'] = result['transfer_s'] + result['avg_encode_ms'] / 1000
+            results.append(result)
+            print(f"{output_format:<8}{quality if output_format != 'png' else '-':>6}"
+                  f"{result['avg_size_kb']:>16.1f}{result['avg_encode_ms']:>16.1f}{result['transfer_s']:>14.2f}")
+
+        best = min(results, key=lambda r: r['total_s'])
+        print("\n" + "=" * 72)
+        print(f"🏆 编码+传输总耗时最短: {best['format']} (quality={best['quality']}), "
+              f"{best['avg_size_kb']:.1f}KB, {best['total_s']:.2f}秒")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "output_encoding_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'scale': self.scale,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='输出编码性能测试')
+    parser.add_argument('--images', type=int, default=5, help='测试图片数量')
+    parser.add_argument('--image-dir', default='input', help='测试图片目录')
+    parser.add_argument('--scale', type=float, default=4.0, help='缩放倍数，模拟增强结果尺寸')
+    parser.add_argument('--qualities', type=int, nargs='+', default=[95, 85, 75], help='JPEG/WebP 质量参数')
+    parser.add_argument('--repeat', type=int, default=3, help='每张图片重复编码次数')
+    parser.add_argument('--bandwidth', type=float, default=10.0, help='估算传输时间使用的带宽(Mbps)')
+    args = parser.parse_args()
+
+    tester = OutputEncodingTester(args.image_dir, args.scale)
+    results = tester.run(args.images, args.qualities, args.repeat, args.bandwidth)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 状态推送 vs 轮询 负载测试脚本
+多个客户端同时提交图片，分别用 轮询 /api/v1/status 与 订阅 /api/v1/events (SSE) 等待结果，
+对比服务端收到的状态请求数量、客户端得知结果的延迟(首个结果时间、平均结果时间)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+class PushVsPollingTester:
+    """状态推送与轮询对比测试器"""
+
+    def __init__(self, api_base: str = "http://localhost:8001", source_image: str = "input/test001.jpg"):
+        self.api_base = api_base
+        self.image_bytes = (PROJECT_ROOT / source_image).read_bytes()
+
+    def unique_image(self) -> bytes:
+        """在JPEG结束标记后追加随机字节：图片内容不变，但不会命中结果缓存"""
+        return self.image_bytes + os.urandom(16)
+
+    async def submit(self, session: aiohttp.ClientSession) -> str:
+        form = aiohttp.FormData()
+        form.add_field('file', self.unique_image(), filename='push_test.jpg', content_type='image/jpeg')
+        async with session.post(f"{self.api_base}/api/v1/enhance", data=form) as response:
+            response.raise_for_status()
+            return (await response.json())['task_id']
+
+    async def wait_polling(self, session: aiohttp.ClientSession, task_id: str, interval: float) -> Dict:
+        """轮询状态接口直到任务结束"""
+        requests = 0
+        while True:
+            async with session.get(f"{self.api_base}/api/v1/status/{task_id}") as response:
+                requests += 1
+                status = await response.json()
+            if status['status'] in ('completed', 'failed'):
+                return {'status': status['status'], 'requests': requests, 'events': requests}
+            await asyncio.sleep(interval)
+
+    async def wait_push(self, session: aiohttp.ClientSession, task_id: str) -> Dict:
+        """订阅SSE直到收到结束事件（整个过程只有一个请求）"""
+        events = 0
+        final_status = None
+        async with session.get(f"{self.api_base}/api/v1/events/{task_id}",
+                               timeout=aiohttp.ClientTimeout(total=None, sock_read=None)) as response:
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8').strip()
+                if not line.startswith('data:'):
+                    continue
+                events += 1
+                data = json.loads(line[len('data:'):])
+                if data['status'] in ('completed', 'failed'):
+                    final_status = data['status']
+                    break
+        return {'status': final_status, 'requests': 1, 'events': events}
+
+    async def client(self, session: aiohttp.ClientSession, mode: str, interval: float, start: float) -> Dict:
+        submitted = time.time()
+        task_id = await self.submit(session)
+        if mode == 'polling':
+            result = await self.wait_polling(session, task_id, interval)
+        else:
+            result = await self.wait_push(session, task_id)
+        result['result_time'] = time.time() - start
+        result['latency'] = time.time() - submitted
+        return result
+
+    async def run_mode(self, mode: str, clients: int, interval: float) -> Dict:
+        print(f"\n🚀 {mode}: {clients} 个客户端" + (f"，轮询间隔 {interval}秒" if mode == 'polling' else ""))
+        connector = aiohttp.TCPConnector(limit=clients * 2)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            start = time.time()
+            results = await asyncio.gather(*[self.client(session, mode, interval, start) for _ in range(clients)])
+            total_time = time.time() - start
+
+        summary = {
+            'mode': mode,
+            'clients': clients,
+            'completed': sum(1 for r in results if r['status'] == 'completed'),
+            'status_requests': sum(r['requests'] for r in results),
+            'messages_received': sum(r['events'] for r in results),
+            'first_result_time': min(r['result_time'] for r in results),
+            'avg_result_latency': statistics.mean(r['latency'] for r in results),
+            'total_time': total_time
+        }
+        print(f"   ✅ 完成 {summary['completed']}/{clients}，状态请求 {summary['status_requests']} 次，"
+              f"首个结果 {summary['first_result_time']:.2f}秒，平均结果延迟 {summary['avg_result_latency']:.2f}秒")
+        return summary
+
+    async def run(self, clients: int, interval: float) -> List[Dict]:
+        print("🧪 状态推送(SSE) vs 轮询 负载测试")
+        print("=" * 60)
+        results = [
+            await self.run_mode('polling', clients, interval),
+            await self.run_mode('push', clients, interval)
+        ]
+        polling, push = results
+        print("\n" + "=" * 60)
+        print(f"📊 状态请求数: 轮询 {polling['status_requests']} → 推送 {push['status_requests']}")
+        print(f"📊 平均结果延迟: 轮询 {polling['avg_result_latency']:.2f}秒 → 推送 {push['avg_result_latency']:.2f}秒")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "push_vs_polling_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'api_base': self.api_base,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+async def main():
+    parser = argparse.ArgumentParser(description='状态推送 vs 轮询 负载测试')
+    parser.add_argument('--api-base', default='http://localhost:8001', help='API地址')
+    parser.add_argument('--clients', type=int, default=10, help='并发客户端数量')
+    parser.add_argument('--interval', type=float, default=1.0, help='轮询间隔（秒），示例页面为1-2秒')
+    args = parser.parse_args()
+
+    tester = PushVsPollingTester(args.api_base)
+    results = await tester.run(args.clients, args.interval)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    asyncio.run(main())
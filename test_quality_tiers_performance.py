@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 质量等级(背景处理方式)性能测试脚本
+对每个 quality_level (fast: Lanczos / medium: SRVGG紧凑网络 / high: RealESRGAN x2plus)
+在不同输入分辨率下测量端到端延迟、背景阶段耗时、模型常驻内存与推理峰值内存，输出可直接用于定价的Markdown表格
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import torch
+
+# 添加项目根目录与api目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "api"))
+
+from inference_executor import read_process_rss
+
+# 与 api/model_manager.py 中的 QUALITY_BG_MODELS 一致
+TIERS = {
+    'fast': None,
+    'medium': 'realesr-general-x4v3',
+    'high': 'realesrgan-x2plus'
+}
+
+class PeakMemorySampler:
+    """后台线程采样当前进程RSS，记录峰值"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = read_process_rss(os.getpid()) or 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, read_process_rss(os.getpid()) or 0)
+            time.sleep(self.interval)
+
+class QualityTierTester:
+    """质量等级性能测试器"""
+
+    def __init__(self, image_path: str, model_path: str = "models/gfpgan/GFPGANv1.4.pth",
+                 background_only: bool = False, tile_size: int = 400):
+        from gfpgan import GFPGANer
+
+        self.image = cv2.imread(str(PROJECT_ROOT / image_path))
+        if self.image is None:
+            raise FileNotFoundError(f"无法读取测试图片: {image_path}")
+        self.background_only = background_only
+        self.tile_size = tile_size
+        self.upscale = 4
+        self.restorer = None if background_only else GFPGANer(
+            model_path=str(PROJECT_ROOT / model_path),
+            upscale=self.upscale,
+            arch='clean',
+            channel_multiplier=2,
+            bg_upsampler=None
+        )
+
+    def resize_to(self, long_side: int):
+        h, w = self.image.shape[:2]
+        ratio = long_side / max(h, w)
+        return cv2.resize(self.image, (round(w * ratio), round(h * ratio)), interpolation=cv2.INTER_AREA)
+
+    def load_tier(self, tier: str):
+        """加载背景模型，返回 (upsampler, 模型常驻内存增量MB)"""
+        from gfpgan.tiling import create_bg_upsampler
+
+        name = TIERS[tier]
+        if name is None:
+            return None, 0.0
+        before = read_process_rss(os.getpid()) or 0
+        upsampler = create_bg_upsampler(
+            name, tile_size=self.tile_size, half=torch.cuda.is_available(),
+            num_workers=1 if torch.cuda.is_available() else max(1, min(4, os.cpu_count() or 1))
+        )
+        return upsampler, ((read_process_rss(os.getpid()) or 0) - before) / 1024 / 1024
+
+    def run_once(self, img, upsampler) -> Dict:
+        timings = {}
+        if self.background_only:
+            start = time.perf_counter()
+            if upsampler is None:
+                h, w = img.shape[:2]
+                cv2.resize(img, (w * self.upscale, h * self.upscale), interpolation=cv2.INTER_LANCZOS4)
+            else:
+                upsampler.enhance(img, outscale=self.upscale, tile_size=self.tile_size)
+            timings['background'] = time.perf_counter() - start
+        else:
+            self.restorer.enhance(img, paste_back=True, weight=0.5, timings=timings,
+                                  bg_tile=self.tile_size, bg_upsampler=upsampler)
+        return timings
+
+    def measure(self, tier: str, upsampler, long_side: int, repeat: int) -> Dict:
+        img = self.resize_to(long_side)
+        self.run_once(img, upsampler)  # 预热
+        baseline = read_process_rss(os.getpid()) or 0
+        totals, backgrounds = [], []
+        with PeakMemorySampler() as sampler:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                timings = self.run_once(img, upsampler)
+                totals.append(time.perf_counter() - start)
+                backgrounds.append(timings.get('background', 0.0))
+        return {
+            'tier': tier,
+            'input': f"{img.shape[1]}x{img.shape[0]}",
+            'output': f"{img.shape[1] * self.upscale}x{img.shape[0] * self.upscale}",
+            'latency': statistics.median(totals),
+            'background_time': statistics.median(backgrounds),
+            'peak_extra_mb': max(0, sampler.peak - baseline) / 1024 / 1024
+        }
+
+    def run(self, tiers: List[str], long_sides: List[int], repeat: int) -> List[Dict]:
+        print("🧪 质量等级(背景处理方式) 延迟与内存测试")
+        print("=" * 72)
+        print(f"🖥️ 设备: {'CUDA' if torch.cuda.is_available() else 'CPU'}，torch线程 {torch.get_num_threads()}，"
+              f"{'仅背景阶段' if self.background_only else '端到端(人脸修复 + 背景 + 贴回)'}，放大 {self.upscale}x\n")
+
+        results = []
+        for tier in tiers:
+            upsampler, model_mb = self.load_tier(tier)
+            print(f"🔧 {tier}: {TIERS[tier] or 'Lanczos'}，模型常驻内存 +{model_mb:.0f}MB")
+            for long_side in long_sides:
+                result = self.measure(tier, upsampler, long_side, repeat)
+                result['model_mb'] = model_mb
+                results.append(result)
+                print(f"   {result['input']:>10} → {result['output']:<10} 延迟 {result['latency']:.2f}s "
+                      f"(背景 {result['background_time']:.2f}s)，推理峰值内存 +{result['peak_extra_mb']:.0f}MB")
+        self.print_table(results)
+        return results
+
+    @staticmethod
+    def print_table(results: List[Dict]):
+        print("\n" + "=" * 72)
+        print("| quality_level | 输入 | 输出 | 延迟(s) | 背景(s) | 模型内存(MB) | 推理峰值内存(MB) |")
+        print("|---|---|---|---|---|---|---|")
+        for r in results:
+            print(f"| {r['tier']} | {r['input']} | {r['output']} | {r['latency']:.2f} | {r['background_time']:.2f} "
+                  f"| {r['model_mb']:.0f} | {r['peak_extra_mb']:.0f} |")
+
+    def save_results(self, results: List[Dict], filename: str = "quality_tiers_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'device': 'cuda' if torch.cuda.is_available() else 'cpu',
+                'background_only': self.background_only,
+                'tile_size': self.tile_size,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='质量等级性能测试')
+    parser.add_argument('--image', default='input/test001.jpg', help='测试图片')
+    parser.add_argument('--tiers', nargs='+', default=list(TIERS), choices=list(TIERS), help='测试的质量等级')
+    parser.add_argument('--long-sides', type=int, nargs='+', default=[640, 1280, 1920], help='输入图片长边像素')
+    parser.add_argument('--repeat', type=int, default=3, help='每种配置的重复次数（取中位数）')
+    parser.add_argument('--tile-size', type=int, default=400, help='背景瓦片大小')
+    parser.add_argument('--background-only', action='store_true', help='只测背景阶段（无需GFPGAN模型）')
+    args = parser.parse_args()
+
+    tester = QualityTierTester(args.image, background_only=args.background_only, tile_size=args.tile_size)
+    results = tester.run(args.tiers, args.long_sides, args.repeat)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 人脸修复精度(FP32 / BF16 / 动态INT8)测试脚本
+在 input/ 的图片上检测并对齐人脸，分别以各精度修复，对比:
+1. 质量: 相对FP32输出的 PSNR / SSIM（安装 lpips 时另算LPIPS，越低越接近）
+2. 延迟: 人脸修复阶段每张人脸的耗时
+3. 内存: 网络权重大小、加载后的进程RSS与峰值RSS
+每种精度在独立子进程中运行（原地转换，释放FP32权重），内存数字互不干扰
+"""
+
+import argparse
+import gc
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+# 添加项目根目录与api目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "api"))
+
+PRECISIONS = ['fp32', 'bf16', 'int8']
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+class QuantizedInferenceTester:
+    """人脸修复精度测试器"""
+
+    def __init__(self, model_path: str, input_dir: str = "input", repeat: int = 3, threads: int = 0):
+        self.model_path = model_path
+        self.images = sorted(str(p) for p in (PROJECT_ROOT / input_dir).iterdir()
+                             if p.suffix.lower() in IMAGE_EXTENSIONS)
+        if not self.images:
+            raise FileNotFoundError(f"{input_dir} 中没有测试图片")
+        self.repeat = repeat
+        self.threads = threads
+        self.workdir = Path(tempfile.mkdtemp(prefix='photoenhanceai_precision_'))
+
+    def run_precision(self, precision: str) -> Dict[str, Any]:
+        """在独立子进程中加载并测量一种精度，修复后的人脸保存在 npz 中"""
+        faces_path = self.workdir / f"{precision}.npz"
+        cmd = [sys.executable, __file__, '--measure', precision, '--faces', str(faces_path),
+               '--model-path', self.model_path, '--repeat', str(self.repeat), '--threads', str(self.threads),
+               '--images', *self.images]
+        result = subprocess.run(cmd, capture_output=True, text=True, cwd=str(PROJECT_ROOT))
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "测量失败")
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        with np.load(faces_path) as data:
+            measured['faces'] = [data[key] for key in sorted(data.files, key=lambda k: int(k.split('_')[1]))]
+        return measured
+
+    @staticmethod
+    def compare(faces: List[np.ndarray], reference: List[np.ndarray], lpips_model=None) -> Dict[str, Any]:
+        """与FP32修复结果对比：逐张人脸计算后取平均"""
+        from basicsr.metrics import calculate_ssim
+
+        psnrs, ssims, distances = [], [], []
+        for face, ref in zip(faces, reference):
+            mse = np.mean((face.astype(np.float64) - ref.astype(np.float64)) ** 2)
+            psnrs.append(float('inf') if mse == 0 else 10 * np.log10(255. ** 2 / mse))
+            ssims.append(calculate_ssim(face, ref, crop_border=0))
+            if lpips_model is not None:
+                distances.append(lpips_model(QuantizedInferenceTester.to_lpips(face),
+                                             QuantizedInferenceTester.to_lpips(ref)).item())
+        return {
+            'psnr': float(np.mean(psnrs)) if psnrs else None,
+            'ssim': float(np.mean(ssims)) if ssims else None,
+            'lpips': float(np.mean(distances)) if distances else None
+        }
+
+    @staticmethod
+    def to_lpips(img: np.ndarray):
+        """BGR uint8 图片 → LPIPS 输入 (1, 3, H, W)，RGB，[-1, 1]"""
+        import torch
+
+        return torch.from_numpy(img[:, :, ::-1].copy()).permute(2, 0, 1)[None].float() / 127.5 - 1
+
+    @staticmethod
+    def load_lpips():
+        try:
+            import lpips
+        except ImportError:
+            print("💡 未安装 lpips，只计算 PSNR / SSIM (pip install lpips)")
+            return None
+        return lpips.LPIPS(net='alex', verbose=False).eval().requires_grad_(False)
+
+    def run(self, precisions: List[str]) -> List[Dict[str, Any]]:
+        print("🧪 人脸修复精度测试 (FP32 / BF16 / 动态INT8)")
+        print("=" * 80)
+        print(f"🖼️ 测试图片: {len(self.images)} 张 ({', '.join(Path(p).name for p in self.images)})，"
+              f"噪声模式 fixed，重复 {self.repeat} 次\n")
+
+        measured = {}
+        for precision in ['fp32'] + [p for p in precisions if p != 'fp32']:
+            print(f"🚀 测试 {precision}...")
+            try:
+                measured[precision] = self.run_precision(precision)
+            except Exception as e:
+                print(f"❌ {precision} 测试失败: {e}")
+        if 'fp32' not in measured:
+            raise RuntimeError("FP32基准测试失败，无法对比质量")
+
+        lpips_model = self.load_lpips()
+        reference = measured['fp32']['faces']
+        base_latency = measured['fp32']['face_latency_ms']
+        results = []
+        for precision, m in measured.items():
+            faces = m.pop('faces')
+            if len(faces) != len(reference):
+                print(f"⚠️ {precision} 检测到的人脸数与FP32不一致，跳过质量对比")
+                quality = {'psnr': None, 'ssim': None, 'lpips': None}
+            else:
+                quality = self.compare(faces, reference, lpips_model)
+            results.append({'precision': precision, **m, **quality, 'speedup': base_latency / m['face_latency_ms']})
+        self.print_table(results)
+        return results
+
+    @staticmethod
+    def print_table(results: List[Dict[str, Any]]):
+        def fmt(value, spec):
+            return '-' if value is None else format(value, spec)
+
+        print("\n" + "=" * 80)
+        print("| 精度 | 权重(MB) | RSS(MB) | 峰值RSS(MB) | 人脸延迟(ms) | 加速比 | PSNR(dB) | SSIM | LPIPS |")
+        print("|---|---|---|---|---|---|---|---|---|")
+        for r in results:
+            psnr = '-' if r['precision'] == 'fp32' else fmt(r['psnr'], '.2f')
+            print(f"| {r['precision']} | {r['weights_mb']:.0f} | {r['rss_mb']:.0f} | {r['peak_rss_mb']:.0f} "
+                  f"| {r['face_latency_ms']:.0f} | {r['speedup']:.2f}x | {psnr} | {fmt(r['ssim'], '.4f')} "
+                  f"| {fmt(r['lpips'], '.4f')} |")
+        print("\n💡 质量指标均相对FP32输出；RSS为加载模型并完成推理后的进程常驻内存")
+
+    def save_results(self, results: List[Dict[str, Any]], filename: str = "quantized_inference_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'model_path': self.model_path,
+                'images': self.images,
+                'repeat': self.repeat,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+    def cleanup(self):
+        for path in self.workdir.glob('*.npz'):
+            path.unlink()
+        self.workdir.rmdir()
+
+def measure(precision: str, model_path: str, images: List[str], repeat: int, threads: int,
+            faces_path: str) -> Dict[str, Any]:
+    """加载一种精度的人脸修复网络并测量（由子进程调用）"""
+    import cv2
+    import torch
+    from gfpgan import GFPGANer
+    from gfpgan.quantized import model_size_mb
+    from inference_executor import read_process_rss
+
+    if threads:
+        torch.set_num_threads(threads)
+    restorer = GFPGANer(model_path=str(PROJECT_ROOT / model_path), upscale=1, arch='clean', channel_multiplier=2,
+                        bg_upsampler=None)
+    if precision != 'fp32':
+        restorer.enable_precision(precision, replace=True)
+    gc.collect()
+    weights_mb = model_size_mb(restorer.gfpgan)
+
+    restored, latencies = [], []
+    for image in images:
+        img = cv2.imread(image)
+        cropped_faces, restored_faces, _ = restorer.enhance(img, paste_back=False, noise_mode='fixed')
+        restored += restored_faces
+        if not cropped_faces:
+            continue
+        for _ in range(repeat):
+            start = time.perf_counter()
+            restorer.restore_faces(cropped_faces, randomize_noise=False)
+            latencies.append((time.perf_counter() - start) / len(cropped_faces))
+    if not latencies:
+        raise ValueError("测试图片中没有检测到人脸")
+    np.savez(faces_path, **{f'face_{idx}': face for idx, face in enumerate(restored)})
+    return {
+        'weights_mb': weights_mb,
+        'rss_mb': (read_process_rss(os.getpid()) or 0) / 1024 / 1024,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'faces': len(restored),
+        'face_latency_ms': float(np.median(latencies)) * 1000,
+        'torch_threads': torch.get_num_threads()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='人脸修复精度(FP32/BF16/INT8)质量、延迟与内存测试')
+    parser.add_argument('--model-path', default='models/gfpgan/GFPGANv1.4.pth', help='GFPGAN权重')
+    parser.add_argument('--input-dir', default='input', help='测试图片目录')
+    parser.add_argument('--precisions', nargs='+', default=PRECISIONS, choices=PRECISIONS, help='测试的精度')
+    parser.add_argument('--repeat', type=int, default=3, help='每张图片人脸修复的计时次数（取中位数）')
+    parser.add_argument('--threads', type=int, default=0, help='torch线程数，0表示默认')
+    parser.add_argument('--measure', choices=PRECISIONS, default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--faces', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--images', nargs='+', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(json.dumps(measure(args.measure, args.model_path, args.images, args.repeat, args.threads, args.faces)))
+        return
+
+    tester = QuantizedInferenceTester(args.model_path, args.input_dir, args.repeat, args.threads)
+    try:
+        results = tester.run(args.precisions)
+        tester.save_results(results)
+    finally:
+        tester.cleanup()
+
+if __name__ == "__main__":
+    main()
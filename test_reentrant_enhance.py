@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI GFPGANer 可重入压力测试脚本
+多个线程共享同一个GFPGANer并发处理不同图片，验证输出与串行处理逐位一致
+"""
+
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import cv2
+import numpy as np
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+class ReentrantEnhanceTester:
+    """GFPGANer 可重入压力测试器"""
+    
+    def __init__(self, model_path: str = "models/gfpgan/GFPGANv1.4.pth"):
+        from gfpgan import GFPGANer
+        
+        # 不使用动态批处理：不同batch大小的卷积结果不保证逐位一致
+        self.restorer = GFPGANer(
+            model_path=str(PROJECT_ROOT / model_path),
+            upscale=2,
+            arch='clean',
+            channel_multiplier=2,
+            bg_upsampler=None
+        )
+    
+    def build_images(self, count: int) -> List[np.ndarray]:
+        """由 input/ 中的样例图片生成互不相同的测试图片（缩放、翻转、裁剪）"""
+        sources = [cv2.imread(str(p)) for p in sorted((PROJECT_ROOT / "input").glob("*.jpg"))]
+        sources = [img for img in sources if img is not None]
+        if not sources:
+            raise FileNotFoundError("input/ 中未找到测试图片")
+        
+        images = []
+        for i in range(count):
+            img = sources[i % len(sources)]
+            scale = 0.6 + 0.1 * (i % 5)
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            if i % 2:
+                img = cv2.flip(img, 1)
+            h, w = img.shape[:2]
+            offset = (i * 7) % max(1, min(h, w) // 10)
+            images.append(np.ascontiguousarray(img[offset:, offset:]))
+        return images
+    
+    def enhance(self, img: np.ndarray):
+        # 使用固定噪声，使每次处理结果可复现
+        return self.restorer.enhance(img, paste_back=True, weight=0.5, randomize_noise=False)
+    
+    def run(self, num_images: int = 8, num_threads: int = 4, rounds: int = 3) -> bool:
+        print("🧪 GFPGANer 可重入压力测试")
+        print("=" * 60)
+        images = self.build_images(num_images)
+        
+        print(f"📊 串行处理 {len(images)} 张图片，生成参考结果...")
+        start = time.time()
+        expected = [self.enhance(img) for img in images]
+        serial_time = time.time() - start
+        
+        mismatches = 0
+        for round_idx in range(rounds):
+            print(f"🚀 第 {round_idx + 1} 轮: {num_threads} 线程并发处理...")
+            start = time.time()
+            with ThreadPoolExecutor(max_workers=num_threads) as pool:
+                # 打乱提交顺序，让不同图片交错执行
+                order = list(range(len(images)))
+                random.Random(round_idx).shuffle(order)
+                futures = {idx: pool.submit(self.enhance, images[idx]) for idx in order}
+                results = {idx: future.result() for idx, future in futures.items()}
+            concurrent_time = time.time() - start
+            
+            for idx, (cropped, restored, restored_img) in results.items():
+                exp_cropped, exp_restored, exp_img = expected[idx]
+                same = (
+                    len(cropped) == len(exp_cropped) and len(restored) == len(exp_restored)
+                    and all(np.array_equal(a, b) for a, b in zip(cropped, exp_cropped))
+                    and all(np.array_equal(a, b) for a, b in zip(restored, exp_restored))
+                    and np.array_equal(restored_img, exp_img)
+                )
+                if not same:
+                    mismatches += 1
+                    print(f"   ❌ 图片 {idx} 的并发结果与串行结果不一致")
+            print(f"   ⏱️ 串行 {serial_time:.2f}秒 / 并发 {concurrent_time:.2f}秒")
+        
+        if mismatches == 0:
+            print(f"\n✅ {rounds} 轮并发处理结果与串行结果逐位一致")
+            return True
+        print(f"\n❌ 共 {mismatches} 个结果不一致")
+        return False
+
+def main():
+    parser = argparse.ArgumentParser(description='GFPGANer 可重入压力测试')
+    parser.add_argument('--images', type=int, default=8, help='测试图片数量')
+    parser.add_argument('--threads', type=int, default=4, help='并发线程数')
+    parser.add_argument('--rounds', type=int, default=3, help='并发测试轮数')
+    args = parser.parse_args()
+    
+    tester = ReentrantEnhanceTester()
+    success = tester.run(args.images, args.threads, args.rounds)
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 分块并行背景超分性能测试脚本
+在多核CPU上对比不同 瓦片大小 × 并行瓦片数 的背景超分吞吐量(百万像素/秒)，
+每种并行度下 torch 线程数 = CPU核数 / 并行瓦片数，并验证输出与并行度无关
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import cv2
+import numpy as np
+import torch
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+
+REALESRGAN_X2_URL = 'https://github.com/xinntao/Real-ESRGAN/releases/download/v0.2.1/RealESRGAN_x2plus.pth'
+
+class TiledUpsamplerTester:
+    """分块并行背景超分性能测试器"""
+
+    def __init__(self, image_path: str, random_weights: bool = False):
+        from basicsr.archs.rrdbnet_arch import RRDBNet
+
+        self.image = cv2.imread(str(PROJECT_ROOT / image_path))
+        if self.image is None:
+            raise FileNotFoundError(f"无法读取测试图片: {image_path}")
+        # 随机权重的计算量与真实权重相同，可在没有下载模型时测试吞吐量
+        self.model = RRDBNet(num_in_ch=3, num_out_ch=3, num_feat=64, num_block=23, num_grow_ch=32, scale=2)
+        self.model_path = None if random_weights else REALESRGAN_X2_URL
+        self.cpu_count = os.cpu_count() or 1
+
+    def create_upsampler(self, workers: int, model_path):
+        from gfpgan.tiling import TiledUpsampler
+
+        return TiledUpsampler(
+            scale=2, model_path=model_path, model=self.model, tile_pad=10, overlap=16,
+            device=torch.device('cpu'), num_workers=workers
+        )
+
+    def measure(self, tile_size: int, workers: int, repeat: int) -> Dict:
+        torch.set_num_threads(max(1, self.cpu_count // workers))
+        upsampler = self.create_upsampler(workers, None)
+        upsampler.enhance(self.image, outscale=2, tile_size=tile_size)  # 预热
+        times = []
+        output = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            output, _ = upsampler.enhance(self.image, outscale=2, tile_size=tile_size)
+            times.append(time.perf_counter() - start)
+        elapsed = min(times)
+        megapixels = self.image.shape[0] * self.image.shape[1] / 1e6
+        return {
+            'tile_size': tile_size,
+            'workers': workers,
+            'torch_threads': torch.get_num_threads(),
+            'time': elapsed,
+            'mpix_per_sec': megapixels / elapsed,
+            'output': output
+        }
+
+    def run(self, tile_sizes: List[int], worker_counts: List[int], repeat: int) -> List[Dict]:
+        print("🧪 分块并行背景超分 吞吐量测试 (RealESRGAN x2, CPU)")
+        print("=" * 72)
+        print(f"🖼️ 图片 {self.image.shape[1]}x{self.image.shape[0]}，CPU核数 {self.cpu_count}\n")
+        # 先加载一次权重（之后各配置共享同一个模型）
+        self.create_upsampler(1, self.model_path)
+        print(f"{'瓦片':>6}{'并行瓦片':>10}{'torch线程':>12}{'耗时(s)':>10}{'吞吐(MP/s)':>14}{'输出一致':>10}")
+
+        results = []
+        for tile_size in tile_sizes:
+            reference = None
+            for workers in worker_counts:
+                result = self.measure(tile_size, workers, repeat)
+                output = result.pop('output')
+                if reference is None:
+                    reference = output
+                result['identical'] = bool(np.array_equal(reference, output))
+                results.append(result)
+                print(f"{tile_size:>6}{workers:>10}{result['torch_threads']:>12}{result['time']:>10.2f}"
+                      f"{result['mpix_per_sec']:>14.3f}{'✅' if result['identical'] else '❌':>10}")
+
+        best = max(results, key=lambda r: r['mpix_per_sec'])
+        serial = [r for r in results if r['workers'] == worker_counts[0] and r['tile_size'] == best['tile_size']][0]
+        print("\n" + "=" * 72)
+        print(f"🏆 最佳配置: tile_size={best['tile_size']}, BG_TILE_WORKERS={best['workers']} "
+              f"({best['mpix_per_sec']:.3f} MP/s，比 {worker_counts[0]} 个并行瓦片快 "
+              f"{serial['time'] / best['time']:.2f}x)")
+        return results
+
+    def save_results(self, results: List[Dict], filename: str = "tiled_upsampler_results.json"):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({
+                'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'image_size': f"{self.image.shape[1]}x{self.image.shape[0]}",
+                'cpu_count': self.cpu_count,
+                'results': results
+            }, f, ensure_ascii=False, indent=2)
+        print(f"💾 测试结果已保存到: {filename}")
+
+def main():
+    parser = argparse.ArgumentParser(description='分块并行背景超分性能测试')
+    parser.add_argument('--image', default='input/test001.jpg', help='测试图片')
+    parser.add_argument('--tile-sizes', type=int, nargs='+', default=[256, 400, 512], help='测试的瓦片大小')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8], help='测试的并行瓦片数')
+    parser.add_argument('--repeat', type=int, default=2, help='每种配置的重复次数（取最快一次）')
+    parser.add_argument('--random-weights', action='store_true', help='使用随机权重（无需下载模型）')
+    args = parser.parse_args()
+
+    tester = TiledUpsamplerTester(args.image, args.random_weights)
+    results = tester.run(args.tile_sizes, args.workers, args.repeat)
+    tester.save_results(results)
+
+if __name__ == "__main__":
+    main()
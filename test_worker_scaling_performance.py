@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+PhotoEnhanceAI 多进程推理扩展性测试脚本
+测量进程池模式下 1~N 个工作进程的吞吐量（张/秒）以及每个工作进程的内存占用（RSS/PSS）
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# 添加项目根目录到路径
+PROJECT_ROOT = Path(__file__).parent
+sys.path.append(str(PROJECT_ROOT))
+sys.path.append(str(PROJECT_ROOT / "api"))
+
+class WorkerScalingTester:
+    """多进程推理扩展性测试器"""
+    
+    def __init__(self, max_workers: int, images_per_worker: int = 4):
+        self.max_workers = max_workers
+        self.images_per_worker = images_per_worker
+        self.results: Dict[int, Dict[str, Any]] = {}
+    
+    def run_worker_count(self, workers: int) -> Dict[str, Any]:
+        """在独立子进程中以指定工作进程数运行一次测量（配置在导入时读取）"""
+        env = dict(os.environ, INFERENCE_EXECUTOR='process', INFERENCE_WORKERS=str(workers))
+        cmd = [sys.executable, __file__, '--measure', '--images', str(workers * self.images_per_worker)]
+        result = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=str(PROJECT_ROOT))
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "测量失败")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+    
+    def run(self):
+        print("🧪 PhotoEnhanceAI 多进程推理扩展性测试")
+        print("=" * 80)
+        for workers in range(1, self.max_workers + 1):
+            print(f"🚀 测试 {workers} 个工作进程...")
+            try:
+                self.results[workers] = self.run_worker_count(workers)
+            except Exception as e:
+                print(f"❌ {workers} 个工作进程测试失败: {e}")
+                self.results[workers] = {'error': str(e)}
+        self.print_results()
+        self.save_results()
+    
+    def print_results(self):
+        valid = {k: v for k, v in self.results.items() if 'error' not in v}
+        if not valid:
+            print("❌ 没有有效的测试结果")
+            return
+        base = valid[min(valid)]['images_per_sec']
+        print(f"\n{'进程数':<8} {'张/秒':<10} {'加速比':<8} {'主进程RSS(MB)':<15} {'单进程RSS(MB)':<15} {'单进程PSS(MB)':<15}")
+        print("-" * 75)
+        for workers, r in sorted(valid.items()):
+            worker_rss = [w['rss_mb'] for w in r['workers'] if w['rss_mb'] is not None]
+            worker_pss = [w['pss_mb'] for w in r['workers'] if w['pss_mb'] is not None]
+            avg_rss = sum(worker_rss) / len(worker_rss) if worker_rss else 0.0
+            avg_pss = sum(worker_pss) / len(worker_pss) if worker_pss else 0.0
+            print(f"{workers:<8} {r['images_per_sec']:<10.3f} {r['images_per_sec'] / base:<8.2f} "
+                  f"{r['main_process']['rss_mb'] or 0:<15.1f} {avg_rss:<15.1f} {avg_pss:<15.1f}")
+        print("\n💡 PSS按共享页面比例分摊；共享权重生效时，单进程PSS应明显低于RSS")
+    
+    def save_results(self):
+        results_file = PROJECT_ROOT / "worker_scaling_results.json"
+        with open(results_file, 'w', encoding='utf-8') as f:
+            json.dump(self.results, f, indent=2, ensure_ascii=False)
+        print(f"\n💾 详细结果已保存到: {results_file}")
+
+async def measure(num_images: int, image: str = "input/test001.jpg") -> Dict[str, Any]:
+    """在当前进程配置下测量吞吐量与内存（由子进程调用）"""
+    import cv2
+    from model_manager import model_manager
+    from inference_executor import read_process_memory
+    
+    img = cv2.imread(str(PROJECT_ROOT / image))
+    if img is None:
+        raise FileNotFoundError(f"测试图片不存在: {image}")
+    
+    start = time.time()
+    await model_manager.initialize()
+    load_time = time.time() - start
+    
+    # 预热：每个工作进程至少处理一张
+    workers = model_manager.executor.max_workers
+    await asyncio.gather(*[model_manager.enhance_array(img) for _ in range(workers)])
+    
+    start = time.time()
+    await asyncio.gather(*[model_manager.enhance_array(img) for _ in range(num_images)])
+    elapsed = time.time() - start
+    
+    result = {
+        'workers': model_manager.executor.get_worker_memory(),
+        'main_process': read_process_memory(os.getpid()),
+        'share_weights': model_manager.share_weights,
+        'load_time': load_time,
+        'images': num_images,
+        'elapsed': elapsed,
+        'images_per_sec': num_images / elapsed
+    }
+    model_manager.shutdown()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='多进程推理扩展性测试')
+    parser.add_argument('--max-workers', type=int, default=os.cpu_count() or 1, help='最大工作进程数')
+    parser.add_argument('--images-per-worker', type=int, default=4, help='每个工作进程处理的图片数')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--images', type=int, default=4, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.measure:
+        print(json.dumps(asyncio.run(measure(args.images))))
+        return
+    
+    WorkerScalingTester(args.max_workers, args.images_per_worker).run()
+
+if __name__ == "__main__":
+    main()
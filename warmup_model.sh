@@ -37,75 +37,49 @@ cd /root/PhotoEnhanceAI
 # 激活虚拟环境
 source gfpgan_env/bin/activate
 
-# 检查预热图片是否存在
-TEST_IMAGE="/root/PhotoEnhanceAI/input/warmup.jpg"
-if [ ! -f "$TEST_IMAGE" ]; then
-    echo "⚠️  预热图片不存在: $TEST_IMAGE"
-    echo "🔧 尝试查找其他测试图片..."
-    
-    # 查找其他测试图片
-    TEST_IMAGE=$(find /root/PhotoEnhanceAI/input -name "*.jpg" -o -name "*.jpeg" -o -name "*.png" | head -1)
-    
-    if [ -z "$TEST_IMAGE" ]; then
-        echo "❌ 未找到任何测试图片"
-        echo "📁 请在 /root/PhotoEnhanceAI/input/ 目录下放置预热图片"
-        exit 1
+# 预热运行中的API服务：模型在服务进程内常驻，单独启动一个进程加载模型不会让服务变快
+API_URL="http://localhost:${API_PORT:-8000}"
+WAIT_SECONDS=${WARMUP_WAIT_SECONDS:-300}
+
+echo "⏳ 等待API服务就绪: $API_URL (最长 ${WAIT_SECONDS}s)..."
+for ((i = 0; i < WAIT_SECONDS; i += 2)); do
+    if curl -sf "$API_URL/health" > /dev/null 2>&1; then
+        break
     fi
+    sleep 2
+done
+if ! curl -sf "$API_URL/health" > /dev/null 2>&1; then
+    echo "❌ API服务未就绪，无法预热"
+    exit 1
 fi
 
-echo "✅ 使用预热图片: $TEST_IMAGE"
-
-# 创建输出目录
-OUTPUT_DIR="/root/PhotoEnhanceAI/output"
-mkdir -p "$OUTPUT_DIR"
-
-# 生成预热输出文件名
-TIMESTAMP=$(date +"%Y%m%d_%H%M%S")
-OUTPUT_FILE="$OUTPUT_DIR/warmup_${TIMESTAMP}.jpg"
-
-echo "📝 预热输出文件: $OUTPUT_FILE"
-echo ""
-
-# 执行模型预热
-echo "🚀 开始AI模型预热..."
-echo "⏳ 正在加载GFPGAN模型到内存..."
-
-# 运行GFPGAN处理
-python /root/PhotoEnhanceAI/gfpgan_core.py \
-    --input "$TEST_IMAGE" \
-    --output "$OUTPUT_FILE" \
-    --scale 4
-
-# 检查预热是否成功
-if [ $? -eq 0 ] && [ -f "$OUTPUT_FILE" ]; then
-    echo ""
-    echo "✅ AI模型预热成功！"
-    echo "🎯 GFPGAN模型已加载到内存"
-    echo "⚡ 后续请求将获得更快的响应速度"
-    echo "📁 预热输出文件: $OUTPUT_FILE"
-    
-    # 显示文件大小信息
-    INPUT_SIZE=$(du -h "$TEST_IMAGE" | cut -f1)
-    OUTPUT_SIZE=$(du -h "$OUTPUT_FILE" | cut -f1)
-    echo "📊 文件大小对比:"
-    echo "   输入: $INPUT_SIZE"
-    echo "   输出: $OUTPUT_SIZE"
-    
-    # 清理预热输出文件（可选）
-    echo ""
-    echo "🗑️  清理预热输出文件..."
-    rm -f "$OUTPUT_FILE"
-    echo "✅ 预热文件已清理"
-    
-else
+# 按 COMPILE_BATCH_BUCKETS 中的每个batch大小运行人脸修复网络，按 COMPILE_DETECTOR_SIZES 运行人脸检测；
+# COMPILE_MODE=trace/compile 时服务启动时已编译，这里报告编译耗时与稳态加速比
+echo "🚀 开始AI模型预热 (每个batch分桶)..."
+REPORT=$(curl -sf -X POST "$API_URL/api/v1/warmup")
+if [ $? -ne 0 ] || [ -z "$REPORT" ]; then
     echo ""
     echo "❌ AI模型预热失败"
     echo "🔧 请检查模型文件和配置"
     exit 1
 fi
 
+WARMUP_REPORT="$REPORT" python - <<'PYEOF'
+import json
+import os
+
+report = json.loads(os.environ['WARMUP_REPORT'])
+print(f"🔧 编译模式: {report['compile_mode']}，人脸修复后端: {report['face_backend']}")
+print(f"{'模型':<12}{'输入':<12}{'状态':<10}{'编译(s)':>9}{'eager(ms)':>11}{'编译后(ms)':>12}{'加速比':>8}")
+for r in report['buckets']:
+    compiled = f"{r['compiled_ms']:.0f}" if r['compiled_ms'] is not None else '-'
+    speedup = f"{r['speedup']:.2f}x" if r['speedup'] is not None else '-'
+    print(f"{r['model']:<12}{r['shape']:<12}{r['status']:<10}{r['compile_s']:>9.1f}{r['eager_ms']:>11.0f}"
+          f"{compiled:>12}{speedup:>8}")
+PYEOF
+
 echo ""
 echo "=========================================="
 echo "🎉 AI模型预热完成！"
-echo "💾 模型已常驻内存，准备接受请求"
+echo "💾 每个batch分桶均已运行，首个请求不再承担延迟初始化与编译开销"
 echo "=========================================="